@@ -0,0 +1,9 @@
+"""
+    Benchmarks of FreeSync protocol, run from repository root (e.g. python -m Benchmarks --help).
+    They don't need KiCAD or FreeCAD: payloads are synthetic data models with same structure as PcbScanner output.
+    Data model lookups by KIID: python -m Benchmarks.kiid_index
+    Deleted item detection in PcbScanner: python -m Benchmarks.removal
+    pcbnew object lookups in PcbUpdater: python -m Benchmarks.board_index
+    pcbnew calls per board scan: python -m Benchmarks.scan_calls
+    Replay of captured sync session: python -m Benchmarks.replay <capture file>
+"""
@@ -0,0 +1,6 @@
+"""
+    Run loopback protocol benchmark: python -m Benchmarks [options]
+"""
+from Benchmarks.transport import main
+
+main()
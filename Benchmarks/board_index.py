@@ -0,0 +1,120 @@
+"""
+    Benchmark of pcbnew object lookups by KIID in PcbUpdater, when diff from FreeCAD is applied to board.
+
+    Previous implementation (utils.get_footprint_by_kiid / get_drawing_by_kiid) walked the board for every changed
+    entry, so a diff with n entries cost n board walks. BoardIndex walks board once per update cycle.
+    Board is a stand-in with pcbnew interface (GetFootprints, m_Uuid.AsString()), which counts board walks and
+    AsString calls (calls through pcbnew bindings).
+
+    Run: python -m Benchmarks.board_index [--footprints 1000 ... 20000] [--changed 1000]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# BoardIndex is imported from KiCAD plugin (API_scripts of KiCAD plugin don't need pcbnew for it)
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+from API_scripts.kiid_index import BoardIndex  # noqa: E402
+from Benchmarks.payloads import make_pcb  # noqa: E402
+from Benchmarks.removal import _BoardItem, _Uuid  # noqa: E402
+from Benchmarks.transport import git_revision  # noqa: E402
+
+FOOTPRINT_COUNTS = [1000, 5000, 10000, 20000]
+CHANGED = 1000
+
+
+class _Board:
+    """ Stand-in for pcbnew.BOARD (only footprints). """
+
+    def __init__(self, footprints: list):
+        self.footprints = footprints
+        self.walks = 0
+
+    def GetFootprints(self) -> list:
+        self.walks += 1
+        return self.footprints
+
+
+def lookup_walk(brd: _Board, kiids: list) -> int:
+    """ Previous implementation: utils.get_footprint_by_kiid for every changed entry. """
+    found = 0
+    for kiid in kiids:
+        for fp in brd.GetFootprints():
+            if fp.m_Uuid.AsString() == kiid:
+                found += 1
+                break
+    return found
+
+
+def lookup_index(brd: _Board, kiids: list) -> int:
+    """ Current implementation: one BoardIndex per update cycle. """
+    board_index = BoardIndex(brd)
+    return sum(board_index.footprint(kiid) is not None for kiid in kiids)
+
+
+def run(function, brd: _Board, kiids: list) -> tuple:
+    """ Return duration (best of three), board walks and AsString calls of one run. """
+    duration = None
+    for _ in range(3):
+        brd.walks = 0
+        _Uuid.calls = 0
+        start = time.perf_counter()
+        found = function(brd, kiids)
+        run_duration = time.perf_counter() - start
+        duration = run_duration if duration is None else min(duration, run_duration)
+    assert found == len(kiids)
+    return duration, brd.walks, _Uuid.calls
+
+
+def run_case(footprints: int, changed: int) -> dict:
+    pcb = make_pcb(footprints, drawing_count=1)
+    brd = _Board([_BoardItem(footprint["kiid"]) for footprint in pcb["footprints"]])
+    kiids = [footprint["kiid"] for footprint in random.Random(1).sample(pcb["footprints"], min(changed, footprints))]
+    walk_s, walk_walks, walk_calls = run(lookup_walk, brd, kiids)
+    index_s, index_walks, index_calls = run(lookup_index, brd, kiids)
+    return {"footprints": footprints, "changed": len(kiids),
+            "walk_ms": walk_s * 1000, "walk_board_walks": walk_walks, "walk_calls": walk_calls,
+            "index_ms": index_s * 1000, "index_board_walks": index_walks, "index_calls": index_calls}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.board_index",
+                                     description="Benchmark of pcbnew object lookups by KIID (board walk vs index).")
+    parser.add_argument("--footprints", nargs="+", type=int, default=FOOTPRINT_COUNTS)
+    parser.add_argument("--changed", type=int, default=CHANGED, help="Number of changed footprints in diff")
+    parser.add_argument("--output", default=None,
+                        help="JSON result file (default: Benchmarks/results/board_index-<time>.json)")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'fps':>7}{'changed':>9}{'walk ms':>10}{'walks':>7}{'walk calls':>12}"
+          f"{'index ms':>10}{'walks':>7}{'index calls':>13}")
+    for footprints in args.footprints:
+        result = run_case(footprints, args.changed)
+        results.append(result)
+        print(f"{result['footprints']:>7}{result['changed']:>9}{result['walk_ms']:>10.1f}"
+              f"{result['walk_board_walks']:>7}{result['walk_calls']:>12}{result['index_ms']:>10.2f}"
+              f"{result['index_board_walks']:>7}{result['index_calls']:>13}", flush=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"board_index-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"benchmark": "board_index",
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "revision": git_revision(),
+                   "python": sys.version,
+                   "platform": platform.platform(),
+                   "results": results}, f, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
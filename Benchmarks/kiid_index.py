@@ -0,0 +1,128 @@
+"""
+    Benchmark of data model lookups by KIID, as done by PcbScanner.get_diff (every board item is looked up in data
+    model) and PcbUpdater (every changed entry is looked up).
+
+    List search (previous implementation: list of KIIDs for membership, linear search for entry) is compared with
+    KiidIndex. Board items are taken from data model in shuffled order (board order differs from data model order
+    after items were added or removed). Only data model side is measured, pcbnew calls are not included.
+
+    Run: python -m Benchmarks.kiid_index [--footprints 10000 ...]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# KiidIndex is imported from KiCAD plugin (API_scripts of KiCAD plugin don't need pcbnew for it)
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+from API_scripts.kiid_index import KiidIndex  # noqa: E402
+from Benchmarks.payloads import make_diff, make_pcb  # noqa: E402
+from Benchmarks.transport import git_revision  # noqa: E402
+
+FOOTPRINT_COUNTS = [1000, 10000]
+
+
+def list_search(list_of_entries: list, kiid: str) -> dict:
+    """ Linear search, same as utils.get_dict_entry_by_kiid. """
+    for entry in list_of_entries:
+        if entry.get("kiid") and entry["kiid"] == kiid:
+            return entry
+    return None
+
+
+def scan_with_list(pcb: dict, board_kiids: list) -> int:
+    """ Data model side of get_footprints: membership check and entry lookup for every board footprint. """
+    list_of_ids = [f["kiid"] for f in pcb["footprints"]]
+    found = 0
+    for kiid in board_kiids:
+        if kiid in list_of_ids:
+            found += list_search(pcb["footprints"], kiid) is not None
+    return found
+
+
+def scan_with_index(pcb: dict, board_kiids: list) -> int:
+    # Scanner builds index if none is kept next to data model
+    index = KiidIndex(pcb)
+    found = 0
+    for kiid in board_kiids:
+        if index.contains("footprints", kiid):
+            found += index.get("footprints", kiid) is not None
+    return found
+
+
+def update_with_list(pcb: dict, changed: list) -> int:
+    """ Data model side of update_footprints: entry lookup for every changed footprint. """
+    return sum(list_search(pcb["footprints"], next(iter(entry))) is not None for entry in changed)
+
+
+def update_with_index(pcb: dict, changed: list, index: KiidIndex) -> int:
+    return sum(index.get("footprints", next(iter(entry))) is not None for entry in changed)
+
+
+def measure(function, *args) -> float:
+    """ Best of three runs in seconds. """
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        function(*args)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def run_case(footprints: int) -> dict:
+    pcb = make_pcb(footprints)
+    board_kiids = [footprint["kiid"] for footprint in pcb["footprints"]]
+    random.Random(1).shuffle(board_kiids)
+    changed = make_diff(pcb)["footprints"]["changed"]
+    assert scan_with_list(pcb, board_kiids) == scan_with_index(pcb, board_kiids) == footprints
+
+    index = KiidIndex(pcb)
+    return {"footprints": footprints,
+            "changed": len(changed),
+            "scan_list_ms": measure(scan_with_list, pcb, board_kiids) * 1000,
+            "scan_index_ms": measure(scan_with_index, pcb, board_kiids) * 1000,
+            "update_list_ms": measure(update_with_list, pcb, changed) * 1000,
+            "update_index_ms": measure(update_with_index, pcb, changed, index) * 1000,
+            "build_index_ms": measure(KiidIndex, pcb) * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.kiid_index",
+                                     description="Benchmark of data model lookups by KIID (list search vs index).")
+    parser.add_argument("--footprints", nargs="+", type=int, default=FOOTPRINT_COUNTS)
+    parser.add_argument("--output", default=None,
+                        help="JSON result file (default: Benchmarks/results/kiid_index-<time>.json)")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'fps':>7}{'changed':>9}{'scan list ms':>14}{'scan index ms':>15}{'update list ms':>16}"
+          f"{'update index ms':>17}{'build ms':>10}")
+    for footprints in args.footprints:
+        result = run_case(footprints)
+        results.append(result)
+        print(f"{result['footprints']:>7}{result['changed']:>9}{result['scan_list_ms']:>14.1f}"
+              f"{result['scan_index_ms']:>15.2f}{result['update_list_ms']:>16.1f}{result['update_index_ms']:>17.3f}"
+              f"{result['build_index_ms']:>10.2f}", flush=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"kiid_index-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"benchmark": "kiid_index",
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "revision": git_revision(),
+                   "python": sys.version,
+                   "platform": platform.platform(),
+                   "results": results}, f, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
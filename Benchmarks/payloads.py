@@ -0,0 +1,76 @@
+"""
+    Synthetic data models and diffs with same structure as PcbScanner.get_pcb / get_diff output.
+"""
+import hashlib
+import random
+import uuid
+
+# Footprint libraries used for generated footprints (mostly passives, some mounting holes)
+FOOTPRINT_IDS = ["Resistor_SMD:R_0603_1608Metric", "Capacitor_SMD:C_0402_1005Metric",
+                 "Package_SO:SOIC-8_3.9x4.9mm_P1.27mm", "Connector_PinHeader_2.54mm:PinHeader_1x04_P2.54mm_Vertical",
+                 "MountingHole:MountingHole_3.2mm_M3_Pad"]
+
+
+def make_footprint(rng: random.Random, index: int) -> dict:
+    """ Return footprint dictionary as returned by PcbScanner.get_fp_data, with hash, ID and KIID. """
+    fp_id = FOOTPRINT_IDS[index % len(FOOTPRINT_IDS)]
+    footprint = {"id": fp_id,
+                 "ref": f"R{index + 1}",
+                 "pos": [rng.randint(0, 200000000), rng.randint(0, 150000000)],
+                 "rot": rng.choice([0.0, 90.0, 180.0, -90.0, 45.0]),
+                 "layer": rng.choice(["Top", "Bot"])}
+    if fp_id.startswith("MountingHole"):
+        pad_hole = {"pos_delta": [0, 0], "hole_size": [3200000, 3200000]}
+        pad_hole.update({"hash": hash(str(pad_hole))})
+        pad_hole.update({"kiid": str(uuid.UUID(int=rng.getrandbits(128)))})
+        footprint.update({"pads_pth": [pad_hole]})
+    library, name = fp_id.split(":")
+    footprint.update({"3d_models": [{"model_id": "000",
+                                     "filename": f"/{library}.3dshapes/{name}",
+                                     "absolute_path": f"/usr/share/kicad/3dmodels/{library}.3dshapes/{name}.wrl",
+                                     "offset": [0.0, 0.0, 0.0],
+                                     "scale": [1.0, 1.0, 1.0],
+                                     "rot": [0.0, 0.0, 0.0]}]})
+    footprint.update({"hash": hashlib.md5(str(footprint).encode()).hexdigest()})
+    footprint.update({"ID": index + 1})
+    footprint.update({"kiid": str(uuid.UUID(int=rng.getrandbits(128)))})
+    return footprint
+
+
+def make_drawing(rng: random.Random, index: int) -> dict:
+    """ Return drawing dictionary (board outline segment) as returned by PcbScanner. """
+    drawing = {"shape": "Line",
+               "start": [rng.randint(0, 200000000), rng.randint(0, 150000000)],
+               "end": [rng.randint(0, 200000000), rng.randint(0, 150000000)]}
+    drawing.update({"hash": hashlib.md5(str(drawing).encode()).hexdigest()})
+    drawing.update({"ID": index + 1})
+    drawing.update({"kiid": str(uuid.UUID(int=rng.getrandbits(128)))})
+    return drawing
+
+
+def make_pcb(footprint_count: int, drawing_count: int = 100, seed: int = 0) -> dict:
+    """ Return data model with given number of footprints (same seed gives same data model). """
+    rng = random.Random(seed)
+    return {"general": {"pcb_name": f"benchmark_{footprint_count}",
+                        "pcb_id": "ab12",
+                        "kiid": str(uuid.UUID(int=rng.getrandbits(128))),
+                        "thickness": 1600000,
+                        "file_directory": "/tmp"},
+            "drawings": [make_drawing(rng, i) for i in range(drawing_count)],
+            "footprints": [make_footprint(rng, i) for i in range(footprint_count)]}
+
+
+def make_diff(pcb: dict, changed_ratio: float = 0.1, seed: int = 0) -> dict:
+    """ Return diff where given share of footprints was moved (DIF message). """
+    rng = random.Random(seed)
+    footprints = pcb["footprints"]
+    changed = []
+    for footprint in rng.sample(footprints, max(1, int(len(footprints) * changed_ratio))):
+        changed.append({footprint["kiid"]: {"pos": [footprint["pos"][0] + 100000, footprint["pos"][1]],
+                                            "rot": 90.0}})
+    return {"footprints": {"changed": changed}}
+
+
+def make_reply(diff: dict, pcb: dict) -> dict:
+    """ Return diff reply with hash of data model (REP message). """
+    return {"diff": diff, "hash": hashlib.md5(str(pcb).encode()).hexdigest()}
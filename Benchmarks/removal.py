@@ -0,0 +1,153 @@
+"""
+    Benchmark of deleted item detection in PcbScanner.get_footprints / get_vias / get_pcb_drawings.
+
+    Previous implementation looped over every data model entry and, inside that, over every board item, comparing
+    m_Uuid.AsString() (O(n*m) pcbnew calls), and removed entries from the list it was iterating. Current
+    implementation collects KIIDs of board items into a set in the pass which is done anyway (one AsString call per
+    item) and removes missing entries with KiidIndex.remove_missing (set difference, one pass over list).
+
+    Board items are stand-ins with the m_Uuid.AsString() interface of pcbnew objects, which count the calls (every call
+    is a call through pcbnew bindings). Nested loop is only run up to --max-nested items, it is quadratic.
+
+    Run: python -m Benchmarks.removal [--items 1000 ... 20000]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# KiidIndex is imported from KiCAD plugin (API_scripts of KiCAD plugin don't need pcbnew for it)
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+from API_scripts.kiid_index import KiidIndex  # noqa: E402
+from Benchmarks.payloads import make_pcb  # noqa: E402
+from Benchmarks.transport import git_revision  # noqa: E402
+
+ITEM_COUNTS = [1000, 2000, 5000, 10000, 20000]
+# Share of data model entries which were deleted on board
+REMOVED_RATIO = 0.01
+MAX_NESTED = 5000
+
+
+class _Uuid:
+
+    calls = 0
+
+    def __init__(self, kiid: str):
+        self._kiid = kiid
+
+    def AsString(self) -> str:
+        _Uuid.calls += 1
+        return self._kiid
+
+
+class _BoardItem:
+    """ Stand-in for pcbnew board item (only UUID is used). """
+
+    def __init__(self, kiid: str):
+        self.m_Uuid = _Uuid(kiid)
+
+
+def make_case(items: int) -> tuple:
+    """ Return data model and board items (data model entries without deleted ones, in shuffled order). """
+    pcb = make_pcb(items, drawing_count=1)
+    rng = random.Random(1)
+    deleted = set(rng.sample(range(items), max(1, int(items * REMOVED_RATIO))))
+    board = [_BoardItem(footprint["kiid"]) for i, footprint in enumerate(pcb["footprints"]) if i not in deleted]
+    rng.shuffle(board)
+    return pcb, board
+
+
+def removed_nested(pcb: dict, board: list) -> list:
+    """ Previous implementation (nested loops, list.remove while iterating the same list). """
+    index = KiidIndex(pcb)
+    removed = []
+    for footprint_old in pcb["footprints"]:
+        found_match = False
+        for fp in board:
+            if fp.m_Uuid.AsString() == footprint_old["kiid"]:
+                found_match = True
+        if not found_match:
+            removed.append(footprint_old["kiid"])
+            index.remove("footprints", footprint_old)
+    return removed
+
+
+def removed_set(pcb: dict, board: list) -> list:
+    """ Current implementation: KIID set from pass over board, set difference with data model. """
+    index = KiidIndex(pcb)
+    board_kiids = set()
+    for fp in board:
+        board_kiids.add(fp.m_Uuid.AsString())
+    return index.remove_missing("footprints", board_kiids)
+
+
+def run(function, items: int) -> tuple:
+    """ Return duration (best of three, fresh data model every run), pcbnew calls and number of removed entries. """
+    duration = None
+    for _ in range(3):
+        pcb, board = make_case(items)
+        _Uuid.calls = 0
+        start = time.perf_counter()
+        removed = function(pcb, board)
+        run_duration = time.perf_counter() - start
+        duration = run_duration if duration is None else min(duration, run_duration)
+    return duration, _Uuid.calls, len(removed)
+
+
+def run_case(items: int, max_nested: int) -> dict:
+    result = {"items": items, "deleted": max(1, int(items * REMOVED_RATIO))}
+    set_s, set_calls, set_removed = run(removed_set, items)
+    assert set_removed == result["deleted"]
+    result.update({"set_ms": set_s * 1000, "set_us_per_item": set_s * 1e6 / items,
+                   "set_calls": set_calls, "set_removed": set_removed})
+    if items <= max_nested:
+        nested_s, nested_calls, nested_removed = run(removed_nested, items)
+        result.update({"nested_ms": nested_s * 1000, "nested_us_per_item": nested_s * 1e6 / items,
+                       "nested_calls": nested_calls, "nested_removed": nested_removed})
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.removal",
+                                     description="Benchmark of deleted item detection (nested loops vs KIID set).")
+    parser.add_argument("--items", nargs="+", type=int, default=ITEM_COUNTS)
+    parser.add_argument("--max-nested", type=int, default=MAX_NESTED,
+                        help="Largest board on which nested loop implementation is run")
+    parser.add_argument("--output", default=None,
+                        help="JSON result file (default: Benchmarks/results/removal-<time>.json)")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'items':>7}{'deleted':>9}{'nested ms':>12}{'nested calls':>14}{'found':>7}"
+          f"{'set ms':>9}{'set us/item':>13}{'set calls':>11}{'found':>7}")
+    for items in args.items:
+        result = run_case(items, args.max_nested)
+        results.append(result)
+        if "nested_ms" in result:
+            nested = f"{result['nested_ms']:>12.1f}{result['nested_calls']:>14}{result['nested_removed']:>7}"
+        else:
+            nested = f"{'-':>12}{'-':>14}{'-':>7}"
+        print(f"{result['items']:>7}{result['deleted']:>9}{nested}{result['set_ms']:>9.2f}"
+              f"{result['set_us_per_item']:>13.3f}{result['set_calls']:>11}{result['set_removed']:>7}", flush=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"removal-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"benchmark": "removal",
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "revision": git_revision(),
+                   "python": sys.version,
+                   "platform": platform.platform(),
+                   "results": results}, f, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
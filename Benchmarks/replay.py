@@ -0,0 +1,609 @@
+"""
+    Replay of captured sync sessions (see Socket/capture.py) through sync logic of either side, without the peer
+    application, KiCAD or FreeCAD.
+
+    KiCAD capture: received requests are passed to KcSync.on_message. Board is a stand-in which returns data models
+    and board changes as they were sent in capture (StandInPcbScanner), diffs are applied to data model like PcbUpdater
+    applies them (StandInPcbUpdater).
+    FreeCAD capture: sync sequences are started where capture starts them, received replies are routed to SyncSequence
+    callbacks by request ID. Document is a stand-in which returns changes recovered from sent diffs
+    (StandInPartScanner), diffs are applied to data model like FcPartUpdater applies them (StandInPartUpdater).
+
+    Messages sent by sync logic are compared with sent messages of capture (message type, request ID and data), handler
+    time is measured per received message type. Replay starts without data model, so capture has to start with
+    connection (as recorded by ConnectionHandler). Heartbeats and disconnect messages are not compared.
+
+    LoopbackSession connects both sides with stand-ins in one process, so captures can be recorded without KiCAD and
+    FreeCAD (used by tests).
+
+    Run: python -m Benchmarks.replay <capture file> [--side kicad|freecad] [--realtime]
+"""
+import argparse
+import collections
+import copy
+import functools
+import hashlib
+import itertools
+import json
+import os
+import sys
+import types
+import uuid
+
+# KiCAD side is imported from KiCAD plugin, FreeCAD sync sequence from FreeCAD macro (Socket modules are shared)
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+sys.path.append(os.path.join(REPOSITORY_DIRECTORY, "FCmacro"))
+
+try:
+    import pcbnew
+except ImportError:
+    pcbnew = types.ModuleType("pcbnew")
+    pcbnew.BOARD = pcbnew.FOOTPRINT = pcbnew.PCB_SHAPE = pcbnew.PCB_VIA = pcbnew.VECTOR2I = object
+    pcbnew.Edge_Cuts, pcbnew.F_SilkS = 44, 37
+    sys.modules["pcbnew"] = pcbnew
+
+from API_scripts.kiid_index import KiidIndex  # noqa: E402
+from API_scripts.pcb_scanner import PcbScanner  # noqa: E402
+from Main.kc_sync import KcSync  # noqa: E402
+from Socket.capture import RECEIVED, SENT, decode_records, replay_capture  # noqa: E402
+from Socket.dispatcher import NO_REQUEST, RequestDispatcher  # noqa: E402
+from Socket.framing import FrameParser, decode_message, encode_frame  # noqa: E402
+from sync_sequence import SyncSequence  # noqa: E402
+
+KICAD = "kicad"
+FREECAD = "freecad"
+# Handled by ConnectionHandler, not by sync logic
+CONNECTION_TYPES = ("PING", "PONG", "!DIS")
+
+
+def apply_changes(index: KiidIndex, key: str, changes: dict, clear_hash: bool):
+    """
+    Apply one section of diff (removed KIIDs, added and changed entries) to data model. Changed entries are hashed
+    again like updaters hash them (clear_hash) or like scanners do (hash of previous state is part of hashed string).
+    """
+    for kiid in changes.get("removed") or ():
+        entry = index.get(key, kiid)
+        if entry is not None:
+            index.remove(key, entry)
+    for entry in changes.get("added") or ():
+        index.pcb.setdefault(key, [])
+        index.append(key, entry)
+    for change in changes.get("changed") or ():
+        for kiid, properties in change.items():
+            entry = index.get(key, kiid)
+            if entry is None:
+                continue
+            entry.update(properties)
+            if clear_hash:
+                entry.update({"hash": ""})
+            entry.update({"hash": hashlib.md5(str(entry).encode()).hexdigest()})
+
+
+def parse_frame(parser: FrameParser, header: bytes, body: bytes) -> tuple:
+    """ Feed frame to parser as if it was received from socket, return (message type, request ID, decoded data). """
+    decoded = None
+    for view in (memoryview(header), memoryview(body)):
+        while view:
+            buffer = parser.get_buffer()
+            length = min(len(buffer), len(view))
+            buffer[:length] = view[:length]
+            view = view[length:]
+            decoded = parser.buffer_updated(length) or decoded
+    msg_type, request_id, data_raw = decoded
+    return msg_type, request_id, decode_message(msg_type, data_raw)
+
+
+# ------------------------------------| KiCAD side |------------------------------------------ #
+
+class StandInBoard:
+    """
+    Board of KiCAD side: data models returned by full scans (in order, last one is returned again), changes returned
+    by next scan and KIIDs KiCAD assigns to drawings added in FreeCAD (random ones if there are none left).
+    :param pcbs: list of data models
+    :param kiids: list of str
+    """
+
+    def __init__(self, pcbs: list, kiids: list = None):
+        self.pcbs = collections.deque(pcbs)
+        self.kiids = collections.deque(kiids or ())
+        self.edits = collections.deque()
+        # Modification counter, incremented by every edit
+        self.stamp = 0
+        self.pcb = None
+
+    def scan(self) -> dict:
+        self.pcb = self.pcbs.popleft() if len(self.pcbs) > 1 else self.pcbs[0]
+        return copy.deepcopy(self.pcb)
+
+    def edit(self, changes: dict):
+        """ Modify board: changes (same format as scanner diff) are returned by next scan. """
+        self.edits.append(copy.deepcopy(changes))
+        self.stamp += 1
+
+    def new_kiid(self) -> str:
+        return self.kiids.popleft() if self.kiids else str(uuid.uuid4())
+
+
+class StandInFootprintScan:
+    """ FootprintScan of stand-in board: footprints of last scanned data model, batch by batch. """
+
+    def __init__(self, footprints: list):
+        self.footprints = footprints
+        self.scanned = set()
+
+    def next_batch(self, size: int) -> list:
+        batch = copy.deepcopy(self.footprints[len(self.scanned):len(self.scanned) + size])
+        self.scanned.update(footprint.get("kiid") for footprint in batch)
+        return batch
+
+
+class StandInPcbScanner(PcbScanner):
+    """
+    PcbScanner of stand-in board: data models and changes are taken from board, changes are applied to data model like
+    scanner applies them. Diff bookkeeping (update_diff_dict) is inherited.
+    """
+
+    def __init__(self, board: StandInBoard):
+        self.board = board
+
+    def get_board(self) -> StandInBoard:
+        return self.board
+
+    # noinspection PyMethodOverriding
+    def get_pcb(self, brd: StandInBoard, footprints: bool = True) -> dict:
+        pcb = brd.scan()
+        if not footprints:
+            pcb.update({"footprints": []})
+        return pcb
+
+    # noinspection PyMethodOverriding
+    def get_diff(self, brd: StandInBoard, pcb: dict, diff: dict, index: KiidIndex = None) -> dict:
+        index = KiidIndex.of(pcb, index)
+        while brd.edits:
+            changes = brd.edits.popleft()
+            for key in ("footprints", "drawings"):
+                if changes.get(key):
+                    apply_changes(index, key, changes[key], clear_hash=False)
+                    self.update_diff_dict(key=key, value=changes[key], diff=diff)
+        return diff
+
+    # noinspection PyMethodOverriding
+    def footprint_scan(self, brd: StandInBoard) -> StandInFootprintScan:
+        return StandInFootprintScan(brd.pcb.get("footprints"))
+
+    # noinspection PyMethodOverriding
+    def board_timestamp(self, brd: StandInBoard) -> int:
+        return brd.stamp
+
+
+class StandInPcbUpdater:
+    """ PcbUpdater of stand-in board: diff is applied to data model like PcbUpdater applies it. """
+
+    # noinspection PyUnusedLocal
+    @staticmethod
+    def update_footprints(brd, pcb: dict, footprints: dict, index: KiidIndex = None, board_index=None):
+        apply_changes(KiidIndex.of(pcb, index), "footprints", {"changed": footprints.get("changed")}, clear_hash=True)
+
+    # noinspection PyUnusedLocal
+    @staticmethod
+    def update_drawings(brd, pcb: dict, changed: list, index: KiidIndex = None, board_index=None):
+        apply_changes(KiidIndex.of(pcb, index), "drawings", {"changed": changed}, clear_hash=True)
+
+    # noinspection PyUnusedLocal
+    @staticmethod
+    def remove_drawings(brd, pcb: dict, removed: list, index: KiidIndex = None, board_index=None):
+        apply_changes(KiidIndex.of(pcb, index), "drawings", {"removed": removed}, clear_hash=True)
+
+    # noinspection PyUnusedLocal
+    @staticmethod
+    def add_drawing(brd: StandInBoard, drawing: dict, board_index=None) -> str:
+        return brd.new_kiid()
+
+    @staticmethod
+    def refresh():
+        pass
+
+
+class ReplayKcSync(KcSync):
+    """ KcSync which starts sessions with IDs of capture (KcSync generates random IDs). """
+
+    def __init__(self, *args, session_ids: list = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_ids = collections.deque(session_ids)
+
+    def start_session(self):
+        super().start_session()
+        if self.session_ids:
+            self.session_id = self.session_ids.popleft()
+
+
+# ------------------------------------| FreeCAD side |---------------------------------------- #
+
+class StandInDocument:
+    """
+    FreeCAD document: changes returned by next part scan (same format as scanner diff). Every edit is reported to
+    registered observers (DocumentChangeCounter), like FreeCAD reports changed objects.
+    """
+
+    def __init__(self):
+        self.edits = collections.deque()
+        self.observers = []
+
+    def edit(self, changes: dict):
+        self.edits.append(copy.deepcopy(changes))
+        for observer in self.observers:
+            observer.slotChangedObject(None, None)
+
+
+class StandInPartScanner:
+    """ FcPartScanner of stand-in document: changes are applied to data model like scanner applies them. """
+
+    # noinspection PyUnusedLocal
+    def __init__(self, doc: StandInDocument, pcb: dict, diff: dict, config, progress_bar=None):
+        self.doc = doc
+        self.pcb = pcb
+        self.diff = diff
+
+    def run(self) -> dict:
+        index = KiidIndex(self.pcb)
+        while self.doc.edits:
+            changes = self.doc.edits.popleft()
+            for key in ("drawings", "footprints"):
+                if changes.get(key):
+                    apply_changes(index, key, changes[key], clear_hash=False)
+                    PcbScanner.update_diff_dict(key=key, value=changes[key], diff=self.diff)
+        return self.diff
+
+
+class StandInPartUpdater:
+    """ FcPartUpdater of stand-in document: diff is applied to data model like updater applies it. """
+
+    # noinspection PyUnusedLocal
+    def __init__(self, doc: StandInDocument, pcb: dict, diff: dict, models_path: dict, progress_bar=None):
+        self.pcb = pcb
+        self.diff = diff
+
+    def run(self) -> dict:
+        index = KiidIndex(self.pcb)
+        for key in ("footprints", "drawings"):
+            if self.diff.get(key):
+                apply_changes(index, key, self.diff[key], clear_hash=True)
+        return self.pcb
+
+
+class StandInBoardSync(SyncSequence):
+    """ BoardSync of stand-in document: document change counter is registered in document instead of FreeCAD. """
+
+    def __init__(self, kiid: str, config):
+        super().__init__(kiid, config, part_scanner=StandInPartScanner, part_updater=StandInPartUpdater)
+
+    def observe_document(self, observe: bool):
+        if observe == self.observing:
+            return
+        if observe:
+            self.doc.observers.append(self.document_changes)
+        else:
+            self.doc.observers.remove(self.document_changes)
+        self.observing = observe
+
+
+def local_changes(merged: dict, kc_diff: dict) -> dict:
+    """
+    Changes found by part scanner, recovered from merged diff FreeCAD sent and KiCAD diff it was merged with (see
+    SyncSequence.on_received_diff). Drawings removed in FreeCAD are lost if KiCAD added drawings (merge replaces them
+    with KIIDs of added drawings), footprints removed in FreeCAD are never merged.
+    """
+    changes = {}
+    drawings = merged.get("drawings")
+    kc_drawings = kc_diff.get("drawings")
+    if drawings and drawings != kc_drawings:
+        if kc_drawings and kc_drawings.get("added"):
+            drawings = {name: value for name, value in drawings.items() if name != "removed"}
+        changes.update({"drawings": drawings})
+    kc_changed = (kc_diff.get("footprints") or {}).get("changed") or []
+    changed = []
+    for entry in (merged.get("footprints") or {}).get("changed") or []:
+        # KiCAD entries are merged before conflicting FreeCAD entries and appended after all of them
+        if entry not in kc_changed and entry not in changed:
+            changed.append(entry)
+    if changed:
+        changes.update({"footprints": {"changed": changed}})
+    return changes
+
+
+# ------------------------------------| Connections |----------------------------------------- #
+
+class StandInConnection:
+    """
+    ConnectionHandler without socket: messages are encoded to frames (json payload, not compressed) and passed to
+    on_frame. Requests are registered in RequestDispatcher, like in ConnectionHandler of FreeCAD side.
+    :param on_frame: function(header: bytes, body: bytes)
+    :param streaming: bool (negotiated streaming transfer of data model)
+    """
+
+    def __init__(self, on_frame, streaming: bool = False):
+        self.on_frame = on_frame
+        self.streaming = streaming
+        self.dispatcher = RequestDispatcher()
+        self.closed = False
+
+    def send_request(self, msg: str, msg_type: str, callback, final_types: tuple) -> int:
+        request_id = self.dispatcher.register(callback, final_types)
+        self.send_message(msg, msg_type=msg_type, request_id=request_id)
+        return request_id
+
+    def send_message(self, msg: str, msg_type: str = "!DIS", request_id: int = NO_REQUEST):
+        self.on_frame(*encode_frame(msg_type, msg.encode(), request_id=request_id))
+
+    def send_data_model(self, data: dict, msg_type: str, request_id: int = NO_REQUEST):
+        self.send_message(json.dumps(data), msg_type=msg_type, request_id=request_id)
+
+    def abort(self):
+        self.closed = True
+
+
+class LoopbackSession:
+    """
+    KiCAD side and FreeCAD side with stand-in board and document, connected in one process. Frames sent by one side
+    are recorded to capture of both sides and handled by the other side in order of sending (after current handler
+    returns, like event loops of both applications would).
+    :param pcb: dict (data model of board)
+    :param kc_capture: CaptureWriter of KiCAD side or None
+    :param fc_capture: CaptureWriter of FreeCAD side or None
+    :param pcb_chunk_size: int (footprints per streamed batch, 0: data model is sent in one message)
+    """
+
+    def __init__(self, pcb: dict, kc_capture=None, fc_capture=None, pcb_chunk_size: int = 0):
+        self.queue = collections.deque()
+        self.captures = (kc_capture, fc_capture)
+        self.board = StandInBoard([pcb])
+        self.document = StandInDocument()
+        config = types.SimpleNamespace(pcb_chunk_size=pcb_chunk_size, models_path={})
+        self.kc_sync = KcSync(config, scanner=StandInPcbScanner(self.board), updater=StandInPcbUpdater,
+                              schedule=self.schedule)
+        self.fc_sync = StandInBoardSync(pcb.get("general").get("kiid"), config)
+        kc_connection = StandInConnection(functools.partial(self.transfer, kc_capture, fc_capture, FrameParser("utf-8"),
+                                                            self.on_fc_frame),
+                                          streaming=pcb_chunk_size > 0)
+        fc_connection = StandInConnection(functools.partial(self.transfer, fc_capture, kc_capture, FrameParser("utf-8"),
+                                                            self.on_kc_frame))
+        self.kc_sync.connection = kc_connection
+        self.fc_sync.attach(fc_connection, "loopback", self.document, None)
+        self.run()
+
+    def schedule(self, callback, *args):
+        """ Call callback after queued frames are handled (wx.CallAfter). """
+        self.queue.append(functools.partial(callback, *args))
+
+    def transfer(self, sender_capture, receiver_capture, parser: FrameParser, handler, header: bytes, body: bytes):
+        if sender_capture is not None:
+            sender_capture.record(SENT, header, body)
+        self.queue.append(functools.partial(self.deliver, receiver_capture, parser, handler, header, body))
+
+    @staticmethod
+    def deliver(capture, parser: FrameParser, handler, header: bytes, body: bytes):
+        if capture is not None:
+            capture.record(RECEIVED, header, body)
+        handler(*parse_frame(parser, header, body))
+
+    def on_kc_frame(self, msg_type: str, request_id: int, data):
+        if msg_type not in CONNECTION_TYPES:
+            self.kc_sync.on_message(msg_type, request_id, data)
+
+    def on_fc_frame(self, msg_type: str, request_id: int, data):
+        if msg_type not in CONNECTION_TYPES and self.fc_sync.connection.dispatcher.is_pending(request_id):
+            self.fc_sync.on_received_reply(request_id, msg_type, data)
+
+    def run(self):
+        """ Handle queued frames and scheduled calls until both sides are idle. """
+        while self.queue:
+            self.queue.popleft()()
+
+    def sync(self):
+        """ Press SYNC button in FreeCAD and wait until sync sequence is finished. """
+        self.fc_sync.start_sync_sequence(self.document, None)
+        self.run()
+
+    def close(self):
+        self.kc_sync.end_session_if_pending()
+        self.fc_sync.on_connection_handler_finished()
+        for capture in self.captures:
+            if capture is not None:
+                capture.close()
+
+
+# ------------------------------------| Replay |---------------------------------------------- #
+
+class ReplayResult:
+    """
+    Messages sent by sync logic and sent messages of capture, as tuples (message type, request ID, decoded data).
+    Durations are handler times per received message type (see replay_capture).
+    """
+
+    def __init__(self, side: str, expected: list, sent: list, durations: dict):
+        self.side = side
+        self.expected = expected
+        self.sent = sent
+        self.durations = durations
+
+    @property
+    def mismatches(self) -> list:
+        """ List of (position, expected message, sent message), missing message is None. """
+        return [(position, expected, sent)
+                for position, (expected, sent) in enumerate(itertools.zip_longest(self.expected, self.sent))
+                if expected != sent]
+
+
+def _messages(records: list, direction: bytes) -> list:
+    return [(msg_type, request_id, data) for record_direction, msg_type, request_id, data in records
+            if record_direction == direction]
+
+
+def _read_records(path: str) -> list:
+    """ Decoded messages of sync logic: (direction, message type, request ID, data). """
+    return [(direction, msg_type, request_id, decode_message(msg_type, data_raw))
+            for direction, _, msg_type, request_id, data_raw in decode_records(path)
+            if msg_type not in CONNECTION_TYPES]
+
+
+def _sent_messages(sent: list):
+    """ Return on_frame function of StandInConnection which decodes frames into sent list. """
+    parser = FrameParser("utf-8")
+
+    def on_frame(header: bytes, body: bytes):
+        message = parse_frame(parser, header, body)
+        if message[0] not in CONNECTION_TYPES:
+            sent.append(message)
+    return on_frame
+
+
+def capture_side(path: str) -> str | None:
+    """ Side which recorded capture: FreeCAD sends requests, KiCAD receives them. """
+    for direction, _, msg_type, _, _ in decode_records(path):
+        if msg_type.startswith("REQ"):
+            return FREECAD if direction == SENT else KICAD
+    return None
+
+
+def replay_kicad(path: str, realtime: bool = False) -> ReplayResult:
+    """ Pass received requests of KiCAD capture to KcSync, board returns data models and changes sent in capture. """
+    expected = _messages(_read_records(path), SENT)
+    pcbs, kiids, session_ids, edits = [], [], [], {}
+    streaming = False
+    pcb_chunk_size = 0
+    for msg_type, request_id, data in expected:
+        if msg_type in ("PCB", "PCBGEN"):
+            pcbs.append(copy.deepcopy(data))
+            streaming = msg_type == "PCBGEN"
+        elif msg_type == "PCBFPS":
+            pcbs[-1]["footprints"].extend(copy.deepcopy(data.get("footprints")))
+            pcb_chunk_size = pcb_chunk_size or len(data.get("footprints"))
+        elif msg_type == "DIF" and data:
+            # Changes on board, returned by scan requested by REQDIF with same ID
+            edits[request_id] = data
+        elif msg_type == "REP":
+            kiids.extend(drawing.get("kiid") for drawing in (data.get("diff").get("drawings") or {}).get("added") or ())
+        elif msg_type == "SES" and data.get("id") and data.get("id") not in session_ids:
+            session_ids.append(data.get("id"))
+
+    board = StandInBoard(pcbs or [{}], kiids)
+    scheduled = collections.deque()
+    config = types.SimpleNamespace(pcb_chunk_size=pcb_chunk_size, models_path={})
+    kc_sync = ReplayKcSync(config, scanner=StandInPcbScanner(board), updater=StandInPcbUpdater,
+                           schedule=lambda callback, *args: scheduled.append(functools.partial(callback, *args)),
+                           session_ids=session_ids)
+    sent = []
+    kc_sync.connection = StandInConnection(_sent_messages(sent), streaming=streaming)
+
+    def handler(msg_type: str, request_id: int, data_raw):
+        if msg_type in CONNECTION_TYPES:
+            return
+        if msg_type == "REQDIF" and request_id in edits:
+            board.edit(edits.pop(request_id))
+        kc_sync.on_message(msg_type, request_id, decode_message(msg_type, data_raw))
+        # Footprint batches are sent before next frame is handled
+        while scheduled:
+            scheduled.popleft()()
+
+    durations = replay_capture(path, handler, direction=RECEIVED, realtime=realtime)
+    return ReplayResult(KICAD, expected, sent, durations)
+
+
+def _document_changes(records: list, position: int) -> dict:
+    """ Changes of document scanned in sync started by REQDIF at position: KiCAD diff is merged with them into DIF. """
+    request_id = records[position][2]
+    for reply_position in range(position + 1, len(records)):
+        direction, msg_type, reply_id, kc_diff = records[reply_position]
+        if direction == RECEIVED and reply_id == request_id:
+            break
+    else:
+        return {}
+    if msg_type != "DIF":
+        return {}
+    for direction, msg_type, _, merged in records[reply_position + 1:]:
+        if direction == SENT and msg_type == "DIF":
+            return local_changes(merged, kc_diff)
+    return {}
+
+
+def replay_freecad(path: str, realtime: bool = False) -> ReplayResult:
+    """
+    Start sync sequences of FreeCAD capture (before reply to their request is handled) and route received replies
+    to their callbacks. Document is edited before every sync which scanned it.
+    """
+    records = _read_records(path)
+    expected = _messages(records, SENT)
+    # Syncs started by user: (request ID, document changes or None if document wasn't changed)
+    syncs = collections.deque()
+    for position, (direction, msg_type, request_id, data) in enumerate(records):
+        if direction != SENT or msg_type not in ("REQPCB", "REQDIF"):
+            continue
+        changes = None
+        if msg_type == "REQDIF" and "hash" not in data:
+            changes = _document_changes(records, position)
+        syncs.append((request_id, changes))
+
+    config = types.SimpleNamespace(pcb_chunk_size=0, models_path={})
+    document = StandInDocument()
+    board_sync = StandInBoardSync("replay", config)
+    sent = []
+    connection = StandInConnection(_sent_messages(sent))
+    board_sync.attach(connection, "replay", document, None)
+
+    def start_syncs(request_id: int):
+        while syncs and syncs[0][0] <= request_id:
+            _, changes = syncs.popleft()
+            if changes is not None:
+                document.edit(changes)
+            board_sync.start_sync_sequence(document, None)
+
+    def handler(msg_type: str, request_id: int, data_raw):
+        if msg_type in CONNECTION_TYPES:
+            return
+        start_syncs(request_id)
+        if connection.dispatcher.is_pending(request_id):
+            board_sync.on_received_reply(request_id, msg_type, decode_message(msg_type, data_raw))
+
+    durations = replay_capture(path, handler, direction=RECEIVED, realtime=realtime)
+    # Syncs which weren't replied to before connection was closed
+    if syncs:
+        start_syncs(syncs[-1][0])
+    return ReplayResult(FREECAD, expected, sent, durations)
+
+
+REPLAY = {KICAD: replay_kicad, FREECAD: replay_freecad}
+
+
+def _describe(message: tuple) -> str:
+    return "nothing" if message is None else f"{message[0]} (request {message[1]})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.replay",
+                                     description="Replay captured sync session through sync logic of one side.")
+    parser.add_argument("capture", help="Capture file (see Socket/capture.py)")
+    parser.add_argument("--side", choices=list(REPLAY), default=None,
+                        help="Side which recorded capture (default: detected from first request)")
+    parser.add_argument("--realtime", action="store_true", help="Keep original spacing between received frames")
+    args = parser.parse_args(argv)
+
+    side = args.side or capture_side(args.capture)
+    if side is None:
+        parser.error("capture contains no requests, side can't be detected")
+    result = REPLAY[side](args.capture, realtime=args.realtime)
+
+    print(f"Replayed {side} capture {args.capture}")
+    print(f"{'message':>8}{'count':>7}{'total ms':>10}{'max ms':>9}")
+    for msg_type, (count, total, longest) in sorted(result.durations.items()):
+        print(f"{msg_type:>8}{count:>7}{total * 1000:>10.2f}{longest * 1000:>9.2f}")
+    mismatches = result.mismatches
+    print(f"{len(result.expected)} messages in capture, {len(result.sent)} sent, {len(mismatches)} mismatches")
+    for position, expected, sent in mismatches[:10]:
+        difference = "data differs" if expected and sent and expected[:2] == sent[:2] else ""
+        print(f"  #{position}: expected {_describe(expected)}, sent {_describe(sent)} {difference}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
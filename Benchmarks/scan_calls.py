@@ -0,0 +1,563 @@
+"""
+    Benchmark of pcbnew calls made by PcbScanner per scan: full scan (get_pcb) and scan of unchanged board (get_diff).
+
+    Every call of a pcbnew object method, attribute getter or vector index is a call through pcbnew bindings. Board is
+    a stand-in with the pcbnew interface used by scanner, which counts these calls (footprints from synthetic data
+    model, Edge.Cuts drawings of all shapes and the same number of silkscreen drawings). Scanner of current tree is
+    compared with BaselineScanner, a copy of previous per-item extraction: board invariants (design settings, aux
+    origin, layer name) read again for every item, repeated getter and vector index calls inside entry dictionaries.
+
+    pcbnew is only used by scanner for type annotations and layer IDs: if it can't be imported (outside of KiCAD
+    python), a module with these names is registered instead.
+
+    Run: python -m Benchmarks.scan_calls [--footprints 1000 10000]
+"""
+import argparse
+import collections
+import datetime
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+import types
+
+# Scanner is imported from KiCAD plugin
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+try:
+    import pcbnew
+except ImportError:
+    pcbnew = types.ModuleType("pcbnew")
+    pcbnew.BOARD = pcbnew.FOOTPRINT = pcbnew.PCB_SHAPE = pcbnew.PCB_VIA = pcbnew.VECTOR2I = object
+    pcbnew.Edge_Cuts, pcbnew.F_SilkS = 44, 37
+    sys.modules["pcbnew"] = pcbnew
+
+from API_scripts.kiid_index import KiidIndex  # noqa: E402
+from API_scripts.pcb_scanner import PcbScanner  # noqa: E402
+from API_scripts.utils import get_model_path, relative_model_path  # noqa: E402
+from Benchmarks.payloads import make_pcb  # noqa: E402
+from Benchmarks.transport import git_revision  # noqa: E402
+
+FOOTPRINT_COUNTS = [1000, 10000]
+DRAWING_SHAPES = ["Line", "Circle", "Arc", "Rect"]
+
+# Calls through pcbnew bindings, by method / attribute name
+CALLS = collections.Counter()
+
+
+def _binding(function):
+    """ Count calls of stand-in method. """
+    name = function.__name__
+
+    def wrapper(*args):
+        CALLS[name] += 1
+        return function(*args)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _attribute(name: str):
+    """ Counted attribute getter (attributes of pcbnew objects are read through bindings). """
+    def getter(self):
+        CALLS[name] += 1
+        return self.__dict__["_" + name]
+    return property(getter)
+
+
+class _Vector:
+
+    def __init__(self, *values):
+        self._values = values
+
+    @_binding
+    def __getitem__(self, i):
+        return self._values[i]
+
+
+class _Uuid:
+
+    def __init__(self, kiid: str):
+        self._kiid = kiid
+
+    @_binding
+    def AsString(self) -> str:
+        return self._kiid
+
+
+class _Item:
+    """ Board item with UUID. """
+
+    m_Uuid = _attribute("m_Uuid")
+
+    def __init__(self, kiid: str):
+        self._m_Uuid = _Uuid(kiid)
+
+
+class _Model:
+
+    m_Filename = _attribute("m_Filename")
+    m_Offset = _attribute("m_Offset")
+    m_Scale = _attribute("m_Scale")
+    m_Rotation = _attribute("m_Rotation")
+
+    def __init__(self, model: dict):
+        self._m_Filename = "${KICAD8_3DMODEL_DIR}" + model["filename"] + ".wrl"
+        self._m_Offset = _Vector(*model["offset"])
+        self._m_Scale = _Vector(*model["scale"])
+        self._m_Rotation = _Vector(*model["rot"])
+
+
+class _Pad(_Item):
+
+    def __init__(self, pad: dict, fp_position: list):
+        super().__init__(pad["kiid"])
+        self._position = [fp_position[0] + pad["pos_delta"][0], fp_position[1] + pad["pos_delta"][1]]
+        self._drill = _Vector(*pad["hole_size"])
+
+    @_binding
+    def GetX(self):
+        return self._position[0]
+
+    @_binding
+    def GetY(self):
+        return self._position[1]
+
+    @_binding
+    def GetDrillSize(self):
+        return self._drill
+
+
+class _Footprint(_Item):
+
+    def __init__(self, footprint: dict):
+        super().__init__(footprint["kiid"])
+        self._data = footprint
+        self._pads = [_Pad(pad, footprint["pos"]) for pad in footprint.get("pads_pth", [])]
+        self._models = [_Model(model) for model in footprint["3d_models"]]
+
+    @_binding
+    def GetFPIDAsString(self):
+        return self._data["id"]
+
+    @_binding
+    def GetReference(self):
+        return self._data["ref"]
+
+    @_binding
+    def GetX(self):
+        return self._data["pos"][0]
+
+    @_binding
+    def GetY(self):
+        return self._data["pos"][1]
+
+    @_binding
+    def GetOrientationDegrees(self):
+        return self._data["rot"]
+
+    @_binding
+    def GetLayer(self):
+        return 31 if self._data["layer"] == "Bot" else 0
+
+    @_binding
+    def HasThroughHolePads(self):
+        return bool(self._pads)
+
+    @_binding
+    def Pads(self):
+        return self._pads
+
+    @_binding
+    def Models(self):
+        return self._models
+
+
+class _Drawing(_Item):
+
+    def __init__(self, drawing: dict, shape: str, layer: int):
+        super().__init__(drawing["kiid"])
+        self._shape = shape
+        self._layer = layer
+        self._start = _Vector(*drawing["start"])
+        self._end = _Vector(*drawing["end"])
+
+    @_binding
+    def ShowShape(self):
+        return self._shape
+
+    @_binding
+    def GetLayer(self):
+        return self._layer
+
+    @_binding
+    def GetLayerName(self):
+        return "Edge.Cuts" if self._layer == pcbnew.Edge_Cuts else "F.Silkscreen"
+
+    @_binding
+    def GetStart(self):
+        return self._start
+
+    @_binding
+    def GetEnd(self):
+        return self._end
+
+    @_binding
+    def GetCenter(self):
+        return self._start
+
+    @_binding
+    def GetArcMid(self):
+        return self._end
+
+    @_binding
+    def GetRadius(self):
+        return 1000000
+
+    @_binding
+    def GetCorners(self):
+        return [self._start, self._end]
+
+
+class _DesignSettings:
+
+    @_binding
+    def GetAuxOrigin(self):
+        return _Vector(10000000, 10000000)
+
+    @_binding
+    def GetBoardThickness(self):
+        return 1600000
+
+
+class _Board(_Item):
+
+    def __init__(self, pcb: dict):
+        super().__init__(pcb["general"]["kiid"])
+        self._footprints = [_Footprint(footprint) for footprint in pcb["footprints"]]
+        self._drawings = []
+        for i, drawing in enumerate(pcb["drawings"]):
+            shape = DRAWING_SHAPES[i % len(DRAWING_SHAPES)]
+            self._drawings.append(_Drawing(drawing, shape, pcbnew.Edge_Cuts))
+            self._drawings.append(_Drawing(dict(drawing, kiid=drawing["kiid"] + "-silk"), shape, pcbnew.F_SilkS))
+
+    @_binding
+    def GetFileName(self):
+        return "/tmp/benchmark.kicad_pcb"
+
+    @_binding
+    def GetDesignSettings(self):
+        return _DesignSettings()
+
+    @_binding
+    def GetFootprints(self):
+        return self._footprints
+
+    @_binding
+    def GetDrawings(self):
+        return self._drawings
+
+
+class BaselineScanner:
+    """
+    Previous per-item extraction of PcbScanner (full scan and diff of footprints and drawings), kept as it was:
+    design settings and aux origin are read for every item, drawings are filtered by layer name.
+    """
+
+    @staticmethod
+    def get_pcb(brd, pcb: dict = None) -> dict:
+        file_name = brd.GetFileName()
+        general_data = {"pcb_name": os.path.basename(file_name).split(".")[0],
+                        "pcb_id": "ab12",
+                        "kiid": brd.m_Uuid.AsString(),
+                        "thickness": brd.GetDesignSettings().GetBoardThickness(),
+                        "file_directory": os.path.dirname(file_name)}
+        pcb = {"general": general_data,
+               "drawings": BaselineScanner.get_pcb_drawings(brd, pcb).get("added"),
+               "footprints": BaselineScanner.get_footprints(brd, pcb).get("added")}
+        return pcb
+
+    @staticmethod
+    def get_diff(brd, pcb: dict, diff: dict, index: KiidIndex = None) -> dict:
+        index = KiidIndex.of(pcb, index)
+        PcbScanner.update_diff_dict(key="footprints", value=BaselineScanner.get_footprints(brd, pcb, index),
+                                    diff=diff)
+        PcbScanner.update_diff_dict(key="drawings", value=BaselineScanner.get_pcb_drawings(brd, pcb, index),
+                                    diff=diff)
+        return diff
+
+    @staticmethod
+    def _compare(entry_new: dict, entry_old: dict) -> dict:
+        """ Update old entry with changed values and its hash, return changes (empty if hash is the same). """
+        if hashlib.md5(str(entry_new).encode()).hexdigest() == entry_old["hash"]:
+            return {}
+        diffs = {}
+        for key, value in entry_new.items():
+            if value == entry_old[key]:
+                continue
+            diffs.update({key: value})
+            entry_old.update({key: value})
+        if diffs:
+            entry_old.update({"hash": hashlib.md5(str(entry_old).encode()).hexdigest()})
+        return diffs
+
+    @staticmethod
+    def _result(added: list, changed: list, removed: list) -> dict:
+        result = {}
+        if added:
+            result.update({"added": added})
+        if changed:
+            result.update({"changed": changed})
+        if removed:
+            result.update({"removed": removed})
+        return result
+
+    @staticmethod
+    def get_pcb_drawings(brd, pcb: dict, index: KiidIndex = None) -> dict:
+        added, removed, changed = [], [], []
+        index = KiidIndex.of(pcb, index)
+        try:
+            latest_nr = pcb["drawings"][-1]["ID"]
+        except (TypeError, IndexError):
+            latest_nr = 0
+
+        board_kiids = set()
+        for i, drw in enumerate(brd.GetDrawings()):
+            if drw.GetLayerName() == "Edge.Cuts":
+                drw_id = drw.m_Uuid.AsString()
+                board_kiids.add(drw_id)
+                if not index.contains("drawings", drw_id):
+                    drawing = BaselineScanner.get_drawings_data(drw,
+                                                                board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                    drawing.update({"hash": hashlib.md5(str(drawing).encode()).hexdigest()})
+                    drawing.update({"ID": (latest_nr + i + 1)})
+                    drawing.update({"kiid": drw_id})
+                    added.append(drawing)
+                    if pcb and pcb.get("drawings") is not None:
+                        index.append("drawings", drawing)
+                else:
+                    drawing_old = index.get("drawings", drw_id)
+                    if not drawing_old:
+                        continue
+                    drawing_new = BaselineScanner.get_drawings_data(
+                        drw, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                    drawing_diffs = BaselineScanner._compare(drawing_new, drawing_old)
+                    if drawing_diffs:
+                        changed.append({drawing_old["kiid"]: drawing_diffs})
+
+        if type(pcb) is dict and pcb.get("drawings"):
+            removed = index.remove_missing("drawings", board_kiids)
+        return BaselineScanner._result(added, changed, removed)
+
+    @staticmethod
+    def get_footprints(brd, pcb: dict, index: KiidIndex = None) -> dict:
+        added, removed, changed = [], [], []
+        index = KiidIndex.of(pcb, index)
+        try:
+            latest_nr = pcb["footprints"][-1]["ID"]
+        except (TypeError, IndexError):
+            latest_nr = 0
+
+        board_kiids = set()
+        for i, fp in enumerate(brd.GetFootprints()):
+            fp_id = fp.m_Uuid.AsString()
+            board_kiids.add(fp_id)
+            if not index.contains("footprints", fp_id):
+                footprint = BaselineScanner.get_fp_data(fp, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                footprint.update({"hash": hashlib.md5(str(footprint).encode()).hexdigest()})
+                footprint.update({"ID": (latest_nr + i + 1)})
+                footprint.update({"kiid": fp_id})
+                added.append(footprint)
+                if pcb:
+                    index.append("footprints", footprint)
+            else:
+                footprint_old = index.get("footprints", fp_id)
+                footprint_new = BaselineScanner.get_fp_data(fp, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                fp_diffs = BaselineScanner._compare(footprint_new, footprint_old)
+                if fp_diffs:
+                    changed.append({footprint_old["kiid"]: fp_diffs})
+
+        if type(pcb) is dict:
+            removed = index.remove_missing("footprints", board_kiids)
+        return BaselineScanner._result(added, changed, removed)
+
+    @staticmethod
+    def get_drawings_data(drw, board_origin) -> dict:
+        drawing = None
+        geometry_type = drw.ShowShape()
+
+        if geometry_type == "Line":
+            drawing = {
+                "shape": drw.ShowShape(),
+                "start": [
+                    drw.GetStart()[0] - board_origin[0],
+                    drw.GetStart()[1] - board_origin[1]
+                ],
+                "end": [
+                    drw.GetEnd()[0] - board_origin[0],
+                    drw.GetEnd()[1] - board_origin[1]
+                ]
+            }
+
+        elif (geometry_type == "Rect") or (geometry_type == "Polygon"):
+            drawing = {
+                "shape": drw.ShowShape(),
+                "points": [[c[0] - board_origin[0], c[1] - board_origin[1]] for c in drw.GetCorners()]
+            }
+
+        elif geometry_type == "Circle":
+            drawing = {
+                "shape": drw.ShowShape(),
+                "center": [
+                    drw.GetCenter()[0] - board_origin[0],
+                    drw.GetCenter()[1] - board_origin[1]
+                ],
+                "radius": drw.GetRadius()
+            }
+
+        elif geometry_type == "Arc":
+            drawing = {
+                "shape": drw.ShowShape(),
+                "points": [
+                    [
+                        drw.GetStart()[0] - board_origin[0],
+                        drw.GetStart()[1] - board_origin[1]
+                    ],
+                    [
+                        drw.GetArcMid()[0] - board_origin[0],
+                        drw.GetArcMid()[1] - board_origin[1]
+                    ],
+                    [
+                        drw.GetEnd()[0] - board_origin[0],
+                        drw.GetEnd()[1] - board_origin[1]
+                    ]
+                ]
+            }
+
+        if drawing:
+            return drawing
+
+    @staticmethod
+    def get_fp_data(fp, board_origin) -> dict:
+        footprint = {
+            "id": fp.GetFPIDAsString(),
+            "ref": fp.GetReference(),
+            "pos": [
+                fp.GetX() - board_origin[0],
+                fp.GetY() - board_origin[1]
+            ],
+            "rot": fp.GetOrientationDegrees()
+        }
+
+        layer = fp.GetLayer()
+        if layer == 31:
+            footprint.update({"layer": "Bot"})
+        else:
+            footprint.update({"layer": "Top"})
+
+        if fp.HasThroughHolePads() and (len(fp.Pads()) == 1):
+            pads_list = []
+            for pad in fp.Pads():
+                pad_hole = {
+                    "pos_delta": [
+                        pad.GetX() - fp.GetX(),
+                        pad.GetY() - fp.GetY()
+                    ],
+                    "hole_size": [
+                        pad.GetDrillSize()[0],
+                        pad.GetDrillSize()[0]
+                    ]
+                }
+                pad_hole.update({"hash": hash(str(pad_hole))})
+                pad_hole.update({"kiid": pad.m_Uuid.AsString()})
+                pads_list.append(pad_hole)
+            footprint.update({"pads_pth": pads_list})
+
+        model_list = []
+        if fp.Models():
+            for ii, model in enumerate(fp.Models()):
+                model_list.append(
+                    {
+                        "model_id": f"{ii:03d}",
+                        "filename": relative_model_path(model.m_Filename),
+                        "absolute_path": get_model_path(model.m_Filename),
+                        "offset": [
+                            model.m_Offset[0],
+                            model.m_Offset[1],
+                            model.m_Offset[2]
+                        ],
+                        "scale": [
+                            model.m_Scale[0],
+                            model.m_Scale[1],
+                            model.m_Scale[2]
+                        ],
+                        "rot": [
+                            model.m_Rotation[0],
+                            model.m_Rotation[1],
+                            model.m_Rotation[2]
+                        ]
+                    }
+                )
+        footprint.update({"3d_models": model_list})
+
+        return footprint
+
+
+def count(function, *args) -> tuple:
+    """ Return result, number of pcbnew calls and duration of one call of function. """
+    CALLS.clear()
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+    return result, sum(CALLS.values()), duration
+
+
+def scan(scanner, footprints: int, drawings: int) -> dict:
+    brd = _Board(make_pcb(footprints, drawing_count=drawings))
+    pcb, full_calls, full_s = count(scanner.get_pcb, brd)
+    diff, idle_calls, idle_s = count(scanner.get_diff, brd, pcb, {})
+    assert diff == {}, "Unchanged board must give empty diff"
+    items = footprints + drawings
+    return {"full_calls": full_calls, "full_calls_per_item": full_calls / items, "full_ms": full_s * 1000,
+            "idle_calls": idle_calls, "idle_calls_per_item": idle_calls / items, "idle_ms": idle_s * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks.scan_calls",
+                                     description="Benchmark of pcbnew calls per board scan.")
+    parser.add_argument("--footprints", nargs="+", type=int, default=FOOTPRINT_COUNTS)
+    parser.add_argument("--drawings", type=int, default=200, help="Number of Edge.Cuts drawings")
+    parser.add_argument("--output", default=None,
+                        help="JSON result file (default: Benchmarks/results/scan_calls-<time>.json)")
+    args = parser.parse_args(argv)
+
+    scanners = {"baseline": BaselineScanner, "current": PcbScanner}
+    results = []
+    print(f"{'fps':>7}{'scanner':>10}{'full calls':>12}{'per item':>10}{'full ms':>9}"
+          f"{'idle calls':>12}{'per item':>10}{'idle ms':>9}")
+    for footprints in args.footprints:
+        for name, scanner in scanners.items():
+            result = {"footprints": footprints, "drawings": args.drawings, "scanner": name}
+            result.update(scan(scanner, footprints, args.drawings))
+            results.append(result)
+            print(f"{footprints:>7}{name:>10}{result['full_calls']:>12}{result['full_calls_per_item']:>10.1f}"
+                  f"{result['full_ms']:>9.1f}{result['idle_calls']:>12}{result['idle_calls_per_item']:>10.1f}"
+                  f"{result['idle_ms']:>9.1f}", flush=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"scan_calls-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"benchmark": "scan_calls",
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "revision": git_revision(),
+                   "python": sys.version,
+                   "platform": platform.platform(),
+                   "results": results}, f, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
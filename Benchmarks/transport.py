@@ -0,0 +1,266 @@
+"""
+    Loopback throughput benchmark of the protocol framing.
+
+    KiCAD side encodes messages (json or columnar, compressed with codec) and sends them with FrameWriter, same as
+    KiCAD ConnectionHandler. FreeCAD side receives them on an asyncio event loop thread into FrameParser buffer and
+    decodes them, same as FrameProtocol/ConnectionHandler.on_frame, then acknowledges every frame. Latency of
+    a message is time from start of encoding to received acknowledgement.
+
+    Every case (message type, board size, codec, transport, payload format) runs in its own process, so peak RSS is
+    measured per case (it includes both sides). Results are printed as a table and written to a JSON file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Shared Socket modules are imported from KiCAD plugin (FrameWriter is only used on KiCAD side)
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+from Benchmarks.payloads import make_diff, make_pcb, make_reply  # noqa: E402
+from Socket.columnar import encode_pcb  # noqa: E402
+from Socket.framing import HEADER, FrameParser, FrameReader, encode_frame  # noqa: E402
+from Socket.writer import FrameWriter  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+FOOTPRINT_COUNTS = [100, 1000, 10000, 50000]
+MESSAGE_TYPES = ["PCB", "DIF", "REP"]
+CODECS = ["none", "zlib", "lzma"]
+TRANSPORTS = ["tcp", "unix"] if hasattr(socket, "AF_UNIX") else ["tcp"]
+FORMATS = ["json", "columnar"]
+# Same as default config
+COMPRESSION_THRESHOLD = 4096
+# Messages in flight at once (sender waits for acknowledgements when window is full)
+WINDOW = 8
+
+
+class ReceiverProtocol(asyncio.BufferedProtocol):
+    """ FreeCAD side: receive directly into parser buffer, decode payload, acknowledge frame with its request ID. """
+
+    def __init__(self):
+        self.parser = FrameParser("utf-8")
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self.parser.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        frame = self.parser.buffer_updated(nbytes)
+        if frame is None:
+            return
+        msg_type, request_id, data_raw = frame
+        # Columnar payload is decoded by parser, json is decoded by ConnectionHandler
+        if not isinstance(data_raw, dict):
+            json.loads(data_raw)
+        self.transport.writelines(encode_frame("ACK", b"", request_id=request_id))
+
+
+def start_receiver(transport: str, directory: str):
+    """
+    Start FreeCAD side on event loop thread.
+    :return: tuple (event loop, server, address for connecting)
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    if transport == "unix":
+        path = os.path.join(directory, "benchmark.sock")
+        coroutine = loop.create_unix_server(ReceiverProtocol, path=path)
+        address = path
+    else:
+        coroutine = loop.create_server(ReceiverProtocol, host="127.0.0.1", port=0)
+        address = None
+    server = asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+    if address is None:
+        address = server.sockets[0].getsockname()[:2]
+    return loop, server, address
+
+
+def build_payload(msg_type: str, footprint_count: int) -> dict:
+    """ Return data sent in message of given type for board with given number of footprints. """
+    pcb = make_pcb(footprint_count)
+    if msg_type == "PCB":
+        return pcb
+    diff = make_diff(pcb)
+    if msg_type == "DIF":
+        return diff
+    return make_reply(diff, pcb)
+
+
+def percentile(values: list, share: float) -> float:
+    """ Nearest rank percentile of sorted list. """
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    """ Peak resident set size of this process in MB (None if not available). """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(case: dict) -> dict:
+    """ Send messages of one case and measure it. Runs in a separate process. """
+    data = build_payload(case["msg_type"], case["footprints"])
+    if case["format"] == "columnar":
+        def encode():
+            return encode_pcb(data)
+    else:
+        def encode():
+            return json.dumps(data).encode("utf-8")
+    payload_length = len(encode())
+    messages = case["messages"] or max(3, min(500, int(case["target_mb"] * 1024 * 1024 / payload_length)))
+
+    directory = tempfile.mkdtemp(prefix="freesync-benchmark-")
+    loop, server, address = start_receiver(case["transport"], directory)
+    family = socket.AF_UNIX if case["transport"] == "unix" else socket.AF_INET
+    connection_socket = socket.socket(family, socket.SOCK_STREAM)
+    connection_socket.connect(address)
+
+    writer = FrameWriter(connection_socket, max_queue=WINDOW + 1)
+    writer.start()
+    window = threading.Semaphore(WINDOW)
+    sent_at = {}
+    latencies = []
+
+    def receive_acknowledgements():
+        reader = FrameReader(connection_socket, "utf-8", buffer_size=1024)
+        for _ in range(messages):
+            _, request_id, _ = reader.read_frame()
+            latencies.append(time.perf_counter() - sent_at.pop(request_id))
+            window.release()
+
+    receiver = threading.Thread(target=receive_acknowledgements)
+    receiver.start()
+    wire_bytes = 0
+    start = time.perf_counter()
+    for request_id in range(1, messages + 1):
+        window.acquire()
+        sent_at[request_id] = time.perf_counter()
+        header, body = encode_frame(case["msg_type"],
+                                    encode(),
+                                    codec=case["codec"],
+                                    threshold=COMPRESSION_THRESHOLD,
+                                    payload_format=case["format"],
+                                    request_id=request_id)
+        wire_bytes += len(header) + len(body)
+        writer.enqueue(header, body)
+    receiver.join()
+    elapsed = time.perf_counter() - start
+
+    writer.stop()
+    connection_socket.close()
+    loop.call_soon_threadsafe(server.close)
+    loop.call_soon_threadsafe(loop.stop)
+    if case["transport"] == "unix":
+        os.unlink(address)
+    os.rmdir(directory)
+
+    latencies.sort()
+    return dict(case,
+                messages=messages,
+                payload_bytes=payload_length,
+                wire_bytes_per_message=wire_bytes // messages,
+                seconds=elapsed,
+                messages_per_s=messages / elapsed,
+                mb_per_s=payload_length * messages / elapsed / (1024 * 1024),
+                latency_p50_ms=percentile(latencies, 0.50) * 1000,
+                latency_p99_ms=percentile(latencies, 0.99) * 1000,
+                peak_rss_mb=peak_rss_mb())
+
+
+def build_cases(args) -> list:
+    cases = []
+    for msg_type in args.types:
+        for footprints in args.footprints:
+            for codec in args.codecs:
+                for transport in args.transports:
+                    # Only data model is sent in columnar format
+                    for payload_format in (args.formats if msg_type == "PCB" else ["json"]):
+                        cases.append({"msg_type": msg_type,
+                                      "footprints": footprints,
+                                      "codec": codec,
+                                      "transport": transport,
+                                      "format": payload_format,
+                                      "messages": args.messages,
+                                      "target_mb": args.target_mb})
+    return cases
+
+
+def git_revision():
+    """ Commit of repository, so results can be matched to code. """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_DIRECTORY,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Benchmarks",
+                                     description="Loopback throughput benchmark of FreeSync protocol framing.")
+    parser.add_argument("--types", nargs="+", default=MESSAGE_TYPES, choices=MESSAGE_TYPES)
+    parser.add_argument("--footprints", nargs="+", type=int, default=FOOTPRINT_COUNTS)
+    parser.add_argument("--codecs", nargs="+", default=CODECS, choices=CODECS)
+    parser.add_argument("--transports", nargs="+", default=TRANSPORTS, choices=TRANSPORTS)
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--messages", type=int, default=0,
+                        help="messages per case (default: as many as fit in --target-mb, 3 to 500)")
+    parser.add_argument("--target-mb", type=float, default=64.0, help="payload volume per case in MB")
+    parser.add_argument("--quick", action="store_true",
+                        help="small boards (100 and 1000 footprints) and 4 MB per case, for checking changes quickly")
+    parser.add_argument("--output", default=None,
+                        help="JSON result file (default: Benchmarks/results/transport-<time>.json)")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.footprints = [count for count in args.footprints if count <= 1000] or [100]
+        args.target_mb = min(args.target_mb, 4.0)
+
+    results = []
+    print(f"{'type':<5}{'fps':>7} {'codec':<6}{'transport':<10}{'format':<9}{'msg':>5}{'msg/s':>10}{'MB/s':>9}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    # New process for every case: peak RSS of one case isn't hidden by previous (larger) cases
+    context = multiprocessing.get_context("spawn")
+    for case in build_cases(args):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case,))
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{result['msg_type']:<5}{result['footprints']:>7} {result['codec']:<6}{result['transport']:<10}"
+              f"{result['format']:<9}{result['messages']:>5}{result['messages_per_s']:>10.1f}"
+              f"{result['mb_per_s']:>9.1f}{result['latency_p50_ms']:>10.2f}{result['latency_p99_ms']:>10.2f}"
+              f"{rss:>9}", flush=True)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         f"transport-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"benchmark": "transport",
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "revision": git_revision(),
+                   "python": sys.version,
+                   "platform": platform.platform(),
+                   "header_size": HEADER.size,
+                   "window": WINDOW,
+                   "compression_threshold": COMPRESSION_THRESHOLD,
+                   "results": results}, f, indent=4)
+    print(f"Results written to {output}")
@@ -34,14 +34,26 @@ class FcPartDrawer:
         self.MODELS_PATH = models_path
         self.pcb_thickness = self.pcb["general"]["thickness"]
         self.progress_bar = progress_bar
+        # Footprint containers are created when first footprint is added
+        self.footprints_part = None
 
     def run(self):
         """ Main method which is called when Drawer is started. """
+        pcb_part = self.draw_board()
+        self.add_footprints(self.pcb.get("footprints"))
+        return pcb_part
 
+    def draw_board(self):
+        """
+        Draw board outline (drawings and vias) and extrude it. Footprints are added separately with add_footprints,
+        so board can be shown before all footprints are received (streaming transfer).
+        :return: board part
+        """
         # Create parent part
         self.pcb_id = self.pcb["general"]["pcb_id"]
         pcb_name = self.pcb["general"]["pcb_name"]
         pcb_part = self.doc.addObject("App::Part", f"{pcb_name}_{self.pcb_id}")
+        self.pcb_part = pcb_part
         # Attach hashed filepath as attribute (used when linking existing parts to KiCAD)
         pcb_part.addProperty("App::PropertyString", "KIID", "Data")
         pcb_part.KIID = self.pcb["general"]["kiid"]
@@ -101,34 +113,6 @@ class FcPartDrawer:
                             drawing=via,
                             container=vias_part)
 
-        # ------------------------------------| Footprints |--------------------------------------------- #
-        footprints = self.pcb.get("footprints")
-
-        if footprints:
-            # Create Footprint container and add it to PCB Part
-            footprints_part = self.doc.addObject("App::Part", f"Footprints_{self.pcb_id}")
-            pcb_part.addObject(footprints_part)
-            # Create Top and Bot containers and add them to Footprints container
-            fps_top_part = self.doc.addObject("App::Part", f"Top_{self.pcb_id}")
-            fps_bot_part = self.doc.addObject("App::Part", f"Bot_{self.pcb_id}")
-            footprints_part.addObject(fps_top_part)
-            footprints_part.addObject(fps_bot_part)
-            # Set up progress bar before adding all the drawings
-            self.progress_bar.setRange(0, len(footprints))
-            self.progress_bar.show()
-            for i, footprint in enumerate(footprints):
-                # Update progress bar
-                self.progress_bar.setValue(i)
-                self.progress_bar.setFormat("Adding footprints: %p%")
-                add_footprint(doc=self.doc,
-                              pcb=self.pcb,
-                              footprint=footprint,
-                              sketch=self.sketch,
-                              models_path=self.MODELS_PATH)
-
-            self.progress_bar.reset()
-            self.progress_bar.hide()
-
         # ------------------------------------| Extrude |--------------------------------------------- #
         # Copied from KiCadStepUpMod
         pcb_extr = self.doc.addObject("Part::Extrusion", f"Board_{self.pcb_id}")
@@ -162,6 +146,40 @@ class FcPartDrawer:
 
         return pcb_part
 
+    def add_footprints(self, footprints: list):
+        """
+        Add footprints to board part drawn by draw_board. Can be called multiple times (once per received batch).
+        :param footprints: list of footprint dictionaries
+        """
+        if not footprints:
+            return
+
+        if self.footprints_part is None:
+            # Create Footprint container and add it to PCB Part
+            self.footprints_part = self.doc.addObject("App::Part", f"Footprints_{self.pcb_id}")
+            self.pcb_part.addObject(self.footprints_part)
+            # Create Top and Bot containers and add them to Footprints container
+            fps_top_part = self.doc.addObject("App::Part", f"Top_{self.pcb_id}")
+            fps_bot_part = self.doc.addObject("App::Part", f"Bot_{self.pcb_id}")
+            self.footprints_part.addObject(fps_top_part)
+            self.footprints_part.addObject(fps_bot_part)
+
+        # Set up progress bar before adding all the footprints
+        self.progress_bar.setRange(0, len(footprints))
+        self.progress_bar.show()
+        for i, footprint in enumerate(footprints):
+            # Update progress bar
+            self.progress_bar.setValue(i)
+            self.progress_bar.setFormat("Adding footprints: %p%")
+            add_footprint(doc=self.doc,
+                          pcb=self.pcb,
+                          footprint=footprint,
+                          sketch=self.sketch,
+                          models_path=self.MODELS_PATH)
+
+        self.progress_bar.reset()
+        self.progress_bar.hide()
+
 
 def add_drawing(doc: type(App.Document), pcb: dict, sketch: type(Sketcher.Sketch),
                 drawing: dict, container: type(App.Part), shape="Circle"):
@@ -0,0 +1,108 @@
+"""
+    Module contains functions for passing large payloads through memory-mapped files: payload is written to a file
+    and only a small descriptor (file name, length, checksum) is sent over socket. Receiver decodes payload directly
+    from mapped file. Used only when both plugins run on same machine as same user (Unix domain socket connection).
+    Same module is used on KiCAD and FreeCAD side.
+"""
+import contextlib
+import getpass
+import logging
+import mmap
+import os
+import tempfile
+import uuid
+import zlib
+
+logger_bulk = logging.getLogger("BULK")
+
+
+def bulk_directory() -> str:
+    """ Return per-user directory for payload files: memory backed /dev/shm if available (created if missing). """
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = "user"
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    directory = os.path.join(base, f"freesync-{user}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return directory
+
+
+def new_bulk_prefix() -> str:
+    """ Return prefix of payload file names of one connection (process ID and random part, fixed length). """
+    return f"{os.getpid()}.{uuid.uuid4().hex[:8]}"
+
+
+def write_bulk(data: bytes, prefix: str = None) -> dict:
+    """
+    Write payload to new file, readable only by current user.
+    :param prefix: str (prefix of connection, see new_bulk_prefix), process ID if None
+    :return: dict (descriptor: name, length, crc32)
+    """
+    # Prefix in name, so files that were never read can be removed by sender (remove_bulk_files)
+    name = f"{prefix or os.getpid()}-{uuid.uuid4().hex}.bin"
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    with os.fdopen(os.open(os.path.join(bulk_directory(), name), flags, 0o600), "wb") as f:
+        f.write(data)
+    return {"name": name, "length": len(data), "crc32": zlib.crc32(data)}
+
+
+@contextlib.contextmanager
+def read_bulk(descriptor: dict):
+    """
+    Map payload file and yield memoryview of it. File is removed afterwards.
+    Decoded data must not keep references to the view (it is released when context exits).
+    :param descriptor: dict (as returned by write_bulk)
+    """
+    # Only a file name is accepted, not a path
+    path = os.path.join(bulk_directory(), os.path.basename(descriptor["name"]))
+    length = descriptor["length"]
+    try:
+        with open(path, "rb") as f:
+            # Empty file can't be mapped
+            mapped = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ) if length else None
+        view = memoryview(mapped if mapped is not None else b"")
+        try:
+            if zlib.crc32(view) != descriptor["crc32"]:
+                raise ValueError(f"Checksum mismatch in payload file {descriptor['name']}")
+            yield view
+        finally:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def copy_bulk(descriptor: dict) -> bytes:
+    """
+    Return copy of payload, file is kept for receiver (used for recording sent frames, see capture.py).
+    Raises OSError if file doesn't exist anymore.
+    """
+    with open(os.path.join(bulk_directory(), os.path.basename(descriptor["name"])), "rb") as f:
+        data = f.read(descriptor["length"])
+    if len(data) != descriptor["length"] or zlib.crc32(data) != descriptor["crc32"]:
+        raise ValueError(f"Payload file {descriptor['name']} doesn't match descriptor")
+    return data
+
+
+def remove_bulk_files(prefix: str):
+    """
+    Remove payload files written with given prefix that peer didn't read (e.g. connection was closed). Files of other
+    connections (other prefixes) are kept.
+    """
+    prefix = f"{prefix}-"
+    try:
+        names = os.listdir(bulk_directory())
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                os.unlink(os.path.join(bulk_directory(), name))
+                logger_bulk.debug(f"Removed unread payload file {name}")
+            except OSError:
+                pass
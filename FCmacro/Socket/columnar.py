@@ -0,0 +1,436 @@
+"""
+    Compact binary columnar encoding of the pcb data model (used for PCB messages instead of JSON).
+    Same module is used on KiCAD and FreeCAD side.
+
+    Footprints and drawings are stored as columns: coordinates as int64 nanometres, angles as float64,
+    strings (references, FPIDs, model filenames) as indexes into a string table where every distinct string is stored
+    only once. KIIDs (UUIDs) and md5 hashes are stored as 16 raw bytes, 3d model offset/scale/rotation vectors as
+    indexes into a table of distinct vectors.
+    Decoding returns exactly the same dictionaries (same key order, same int/float types) as json.loads would, so
+    the hash of decoded data model matches the hash on the sending side.
+    Entries with unexpected keys or types are not forced into columns: they are stored as JSON next to the columns
+    and put back to the same index when decoding.
+"""
+import json
+import re
+import struct
+import sys
+from array import array
+
+MAGIC = b"FSC1"
+# Placeholder in string index columns for None (e.g. model absolute path that couldn't be resolved)
+NONE_INDEX = 0xFFFFFFFF
+# Placeholder in pad count column when footprint has no "pads_pth" key
+NO_PADS = -1
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+FOOTPRINT_KEYS = ["id", "ref", "pos", "rot", "layer", "3d_models", "hash", "ID", "kiid"]
+FOOTPRINT_KEYS_WITH_PADS = ["id", "ref", "pos", "rot", "layer", "pads_pth", "3d_models", "hash", "ID", "kiid"]
+MODEL_KEYS = ["model_id", "filename", "absolute_path", "offset", "scale", "rot"]
+PAD_KEYS = ["pos_delta", "hole_size", "hash", "kiid"]
+LAYERS = ["Top", "Bot"]
+# Shape name -> (shape code, keys of drawing dictionary)
+DRAWING_KEYS = {"Line": (0, ["shape", "start", "end", "hash", "ID", "kiid"]),
+                "Rect": (1, ["shape", "points", "hash", "ID", "kiid"]),
+                "Polygon": (2, ["shape", "points", "hash", "ID", "kiid"]),
+                "Circle": (3, ["shape", "center", "radius", "hash", "ID", "kiid"]),
+                "Arc": (4, ["shape", "points", "hash", "ID", "kiid"])}
+SHAPES = {code: shape for shape, (code, keys) in DRAWING_KEYS.items()}
+
+# Identifiers (hashes, KIIDs) that can be stored as 16 raw bytes
+MD5_PATTERN = re.compile(r"[0-9a-f]{32}")
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+class _Table:
+    """ Collect distinct values (strings or float vectors), return their index. """
+
+    def __init__(self):
+        self.values = []
+        self._indexes = {}
+
+    def index(self, value) -> int:
+        index = self._indexes.get(value)
+        if index is None:
+            index = len(self.values)
+            self._indexes[value] = index
+            self.values.append(value)
+        return index
+
+
+class _Tables:
+    """ String table and vector table shared by all sections. """
+
+    def __init__(self):
+        self.strings = _Table()
+        self.vectors = _Table()
+
+    def string(self, value, nullable: bool = False) -> int:
+        """ Return index of string. Raise TypeError if value is not a string. """
+        if value is None and nullable:
+            return NONE_INDEX
+        # Null character is used as a separator in string table
+        if type(value) is not str or "\0" in value:
+            raise TypeError
+        return self.strings.index(value)
+
+    def vector(self, value) -> int:
+        """ Return index of three float vector. Raise TypeError if value is not a list of three floats. """
+        if not (type(value) is list and len(value) == 3 and all(type(v) is float for v in value)):
+            raise TypeError
+        return self.vectors.index(tuple(value))
+
+
+def _is_point(value) -> bool:
+    """ Two element list of ints (coordinates in nanometres). """
+    return (type(value) is list and len(value) == 2 and type(value[0]) is int and type(value[1]) is int
+            and INT_MIN <= value[0] <= INT_MAX and INT_MIN <= value[1] <= INT_MAX)
+
+
+def _is_int(value) -> bool:
+    return type(value) is int and INT_MIN <= value <= INT_MAX
+
+
+def _id_column(identifiers: list, tables: _Tables) -> tuple:
+    """ Pack list of identifier strings (KIIDs or hashes) as raw bytes if possible, else as string indexes. """
+    if all(MD5_PATTERN.fullmatch(i) for i in identifiers):
+        return b"m", len(identifiers), bytes.fromhex("".join(identifiers))
+    if all(UUID_PATTERN.fullmatch(i) for i in identifiers):
+        return b"u", len(identifiers), bytes.fromhex("".join(identifiers).replace("-", ""))
+    return b"s", len(identifiers), array("I", [tables.string(i) for i in identifiers]).tobytes()
+
+
+class _FootprintColumns:
+    """ Footprint properties split into columns. """
+
+    def __init__(self):
+        self.fpid, self.ref, self.x, self.y = array("I"), array("I"), array("q"), array("q")
+        self.rot, self.layer, self.number = array("d"), array("B"), array("q")
+        self.model_count, self.pad_count = array("I"), array("i")
+        # Identifiers are collected as strings and packed at the end (see _id_column)
+        self.hash, self.kiid = [], []
+        # Model columns (all models of all footprints, in order)
+        self.model_id, self.filename, self.absolute_path, self.model_vectors = array("I"), array("I"), array("I"), \
+            array("I")
+        # Pad columns (all pads of all footprints, in order)
+        self.pad_ints, self.pad_kiid = array("q"), array("I")
+
+    def append(self, footprint: dict, tables: _Tables):
+        """ Append footprint to columns. Raise TypeError if footprint doesn't match the expected structure. """
+        keys = list(footprint.keys())
+        if keys != FOOTPRINT_KEYS and keys != FOOTPRINT_KEYS_WITH_PADS:
+            raise TypeError
+        if not (_is_point(footprint["pos"]) and type(footprint["rot"]) is float
+                and footprint["layer"] in LAYERS and _is_int(footprint["ID"])
+                and type(footprint["3d_models"]) is list
+                and type(footprint["hash"]) is str and type(footprint["kiid"]) is str):
+            raise TypeError
+
+        # Validate everything (and get table indexes) before appending, so columns stay aligned when raising
+        models = []
+        for model in footprint["3d_models"]:
+            if type(model) is not dict or list(model.keys()) != MODEL_KEYS:
+                raise TypeError
+            models.append((tables.string(model["model_id"]),
+                           tables.string(model["filename"]),
+                           tables.string(model["absolute_path"], nullable=True),
+                           tables.vector(model["offset"]),
+                           tables.vector(model["scale"]),
+                           tables.vector(model["rot"])))
+        pads = None
+        if "pads_pth" in footprint:
+            if type(footprint["pads_pth"]) is not list:
+                raise TypeError
+            pads = []
+            for pad in footprint["pads_pth"]:
+                if (type(pad) is not dict or list(pad.keys()) != PAD_KEYS or not _is_point(pad["pos_delta"])
+                        or not _is_point(pad["hole_size"]) or not _is_int(pad["hash"])):
+                    raise TypeError
+                pads.append((pad["pos_delta"] + pad["hole_size"] + [pad["hash"]], tables.string(pad["kiid"])))
+        fpid, ref = tables.string(footprint["id"]), tables.string(footprint["ref"])
+
+        self.fpid.append(fpid)
+        self.ref.append(ref)
+        self.x.append(footprint["pos"][0])
+        self.y.append(footprint["pos"][1])
+        self.rot.append(footprint["rot"])
+        self.layer.append(LAYERS.index(footprint["layer"]))
+        self.hash.append(footprint["hash"])
+        self.number.append(footprint["ID"])
+        self.kiid.append(footprint["kiid"])
+
+        self.model_count.append(len(models))
+        for model_id, filename, absolute_path, offset, scale, rot in models:
+            self.model_id.append(model_id)
+            self.filename.append(filename)
+            self.absolute_path.append(absolute_path)
+            self.model_vectors.extend((offset, scale, rot))
+
+        if pads is None:
+            self.pad_count.append(NO_PADS)
+        else:
+            self.pad_count.append(len(pads))
+            for pad_ints, pad_kiid in pads:
+                self.pad_ints.extend(pad_ints)
+                self.pad_kiid.append(pad_kiid)
+
+    def columns(self, tables: _Tables) -> list:
+        return [self.fpid, self.ref, self.x, self.y, self.rot, self.layer, _id_column(self.hash, tables),
+                self.number, _id_column(self.kiid, tables), self.model_count, self.pad_count, self.model_id,
+                self.filename, self.absolute_path, self.model_vectors, self.pad_ints, self.pad_kiid]
+
+
+class _DrawingColumns:
+    """ Drawing properties split into columns. """
+
+    def __init__(self):
+        self.shape, self.number = array("B"), array("q")
+        self.point_count, self.points, self.radius = array("I"), array("q"), array("q")
+        self.hash, self.kiid = [], []
+
+    def append(self, drawing: dict, tables: _Tables):
+        """ Append drawing to columns. Raise TypeError if drawing doesn't match the expected structure. """
+        shape_keys = DRAWING_KEYS.get(drawing.get("shape"))
+        if (shape_keys is None or list(drawing.keys()) != shape_keys[1] or not _is_int(drawing["ID"])
+                or type(drawing["hash"]) is not str or type(drawing["kiid"]) is not str):
+            raise TypeError
+
+        shape = drawing["shape"]
+        if shape == "Line":
+            points = [drawing["start"], drawing["end"]]
+        elif shape == "Circle":
+            points = [drawing["center"]]
+            if not _is_int(drawing["radius"]):
+                raise TypeError
+        else:
+            points = drawing["points"]
+            if type(points) is not list:
+                raise TypeError
+        if not all(_is_point(point) for point in points):
+            raise TypeError
+
+        self.shape.append(shape_keys[0])
+        self.hash.append(drawing["hash"])
+        self.number.append(drawing["ID"])
+        self.kiid.append(drawing["kiid"])
+        self.point_count.append(len(points))
+        for point in points:
+            self.points.extend(point)
+        self.radius.append(drawing["radius"] if shape == "Circle" else 0)
+
+    def columns(self, tables: _Tables) -> list:
+        return [self.shape, _id_column(self.hash, tables), self.number, _id_column(self.kiid, tables),
+                self.point_count, self.points, self.radius]
+
+
+def _pack_section(entries: list, columns_object, tables: _Tables, overflow: dict) -> list:
+    """ Append entries to columns, collect entries which don't fit into overflow dictionary (index -> entry). """
+    for i, entry in enumerate(entries):
+        try:
+            columns_object.append(entry, tables)
+        except (TypeError, KeyError, AttributeError):
+            overflow[i] = entry
+    return columns_object.columns(tables)
+
+
+def encode_pcb(pcb: dict) -> bytes:
+    """
+    Encode pcb data model to bytes.
+    :param pcb: dict (data model with "general", "drawings" and "footprints" keys)
+    :return: bytes
+    """
+    tables = _Tables()
+    # Everything that is not stored in columns: order of top level keys, general data, non-list sections,
+    # entries that don't match the structure
+    extra = {"order": list(pcb.keys()), "values": {}, "overflow": {"footprints": {}, "drawings": {}}}
+    sections = {}
+    for key, value in pcb.items():
+        if key == "footprints" and type(value) is list:
+            sections[key] = (len(value), _pack_section(value, _FootprintColumns(), tables,
+                                                       extra["overflow"]["footprints"]))
+        elif key == "drawings" and type(value) is list:
+            sections[key] = (len(value), _pack_section(value, _DrawingColumns(), tables,
+                                                       extra["overflow"]["drawings"]))
+        else:
+            extra["values"][key] = value
+
+    # Tables are complete only after all sections are packed
+    string_blob = "\0".join(tables.strings.values).encode("utf-8")
+    vector_blob = array("d", [v for vector in tables.vectors.values for v in vector]).tobytes()
+    extra_blob = json.dumps(extra).encode("utf-8")
+
+    parts = [MAGIC, b"<" if sys.byteorder == "little" else b">",
+             struct.pack("<IIII", len(extra_blob), len(string_blob), len(tables.strings.values),
+                         len(tables.vectors.values)),
+             extra_blob, string_blob, vector_blob]
+    for key in ("footprints", "drawings"):
+        count, columns = sections.get(key, (0, []))
+        parts.append(struct.pack("<II", count, len(columns)))
+        for column in columns:
+            if isinstance(column, array):
+                column = (column.typecode.encode("ascii"), len(column), column.tobytes())
+            # Column header: type code and number of items
+            parts.append(struct.pack("<cI", column[0], column[1]))
+            parts.append(column[2])
+
+    return b"".join(parts)
+
+
+def _read_columns(data, offset: int, swap: bool, strings: list) -> tuple:
+    """ Read section columns starting at offset. Return (number of entries, list of lists, new offset). """
+    count, number_of_columns = struct.unpack_from("<II", data, offset)
+    offset += 8
+    columns = []
+    for _ in range(number_of_columns):
+        typecode, length = struct.unpack_from("<cI", data, offset)
+        offset += 5
+        if typecode in (b"m", b"u"):
+            # Raw 16 byte identifiers: convert whole column to hex at once, then slice
+            hex_string = bytes(data[offset:offset + 16 * length]).hex()
+            offset += 16 * length
+            if typecode == b"m":
+                columns.append([hex_string[i:i + 32] for i in range(0, 32 * length, 32)])
+            else:
+                columns.append([f"{hex_string[i:i + 8]}-{hex_string[i + 8:i + 12]}-{hex_string[i + 12:i + 16]}-"
+                                f"{hex_string[i + 16:i + 20]}-{hex_string[i + 20:i + 32]}"
+                                for i in range(0, 32 * length, 32)])
+            continue
+
+        column = array("I" if typecode == b"s" else typecode.decode("ascii"))
+        size = length * column.itemsize
+        column.frombytes(data[offset:offset + size])
+        if swap:
+            column.byteswap()
+        offset += size
+        # Identifiers stored in string table are resolved right away
+        columns.append([strings[i] for i in column] if typecode == b"s" else column.tolist())
+    return count, columns, offset
+
+
+def _decode_footprints(count: int, columns: list, strings: list, vectors: list, overflow: dict) -> list:
+    """ Build list of footprint dictionaries from columns. """
+    if not columns:
+        return [overflow[str(i)] for i in range(count)]
+    (fpid, ref, x, y, rot, layer, hashes, number, kiid, model_count, pad_count, model_id, filename,
+     absolute_path, model_vectors, pad_ints, pad_kiid) = columns
+
+    footprints = []
+    row, model_row, pad_row = 0, 0, 0
+    for i in range(count):
+        entry = overflow.get(str(i))
+        if entry is not None:
+            footprints.append(entry)
+            continue
+
+        models = []
+        for m in range(model_row, model_row + model_count[row]):
+            v = 3 * m
+            models.append({"model_id": strings[model_id[m]],
+                           "filename": strings[filename[m]],
+                           "absolute_path": None if absolute_path[m] == NONE_INDEX else strings[absolute_path[m]],
+                           # New list for every model: data model entries are edited in place
+                           "offset": list(vectors[model_vectors[v]]),
+                           "scale": list(vectors[model_vectors[v + 1]]),
+                           "rot": list(vectors[model_vectors[v + 2]])})
+        model_row += model_count[row]
+
+        footprint = {"id": strings[fpid[row]],
+                     "ref": strings[ref[row]],
+                     "pos": [x[row], y[row]],
+                     "rot": rot[row],
+                     "layer": LAYERS[layer[row]]}
+        if pad_count[row] != NO_PADS:
+            pads = []
+            for p in range(pad_row, pad_row + pad_count[row]):
+                f = 5 * p
+                pads.append({"pos_delta": pad_ints[f:f + 2],
+                             "hole_size": pad_ints[f + 2:f + 4],
+                             "hash": pad_ints[f + 4],
+                             "kiid": strings[pad_kiid[p]]})
+            pad_row += pad_count[row]
+            footprint["pads_pth"] = pads
+        footprint["3d_models"] = models
+        footprint["hash"] = hashes[row]
+        footprint["ID"] = number[row]
+        footprint["kiid"] = kiid[row]
+
+        footprints.append(footprint)
+        row += 1
+
+    return footprints
+
+
+def _decode_drawings(count: int, columns: list, overflow: dict) -> list:
+    """ Build list of drawing dictionaries from columns. """
+    if not columns:
+        return [overflow[str(i)] for i in range(count)]
+    shape, hashes, number, kiid, point_count, points, radius = columns
+
+    drawings = []
+    row, point_row = 0, 0
+    for i in range(count):
+        entry = overflow.get(str(i))
+        if entry is not None:
+            drawings.append(entry)
+            continue
+
+        shape_name = SHAPES[shape[row]]
+        first = 2 * point_row
+        drawing_points = [points[p:p + 2] for p in range(first, first + 2 * point_count[row], 2)]
+        point_row += point_count[row]
+
+        if shape_name == "Line":
+            drawing = {"shape": shape_name, "start": drawing_points[0], "end": drawing_points[1]}
+        elif shape_name == "Circle":
+            drawing = {"shape": shape_name, "center": drawing_points[0], "radius": radius[row]}
+        else:
+            drawing = {"shape": shape_name, "points": drawing_points}
+        drawing["hash"] = hashes[row]
+        drawing["ID"] = number[row]
+        drawing["kiid"] = kiid[row]
+
+        drawings.append(drawing)
+        row += 1
+
+    return drawings
+
+
+def decode_pcb(data) -> dict:
+    """
+    Decode bytes-like object (bytes or memoryview of receive buffer) to pcb data model.
+    :param data: bytes-like object produced by encode_pcb
+    :return: dict
+    """
+    if bytes(data[:4]) != MAGIC:
+        raise ValueError("Invalid columnar payload")
+    # Columns are written in byte order of sender
+    swap = bytes(data[4:5]) != (b"<" if sys.byteorder == "little" else b">")
+    extra_length, strings_length, number_of_strings, number_of_vectors = struct.unpack_from("<IIII", data, 5)
+    offset = 21
+    extra = json.loads(str(data[offset:offset + extra_length], "utf-8"))
+    offset += extra_length
+    strings = str(data[offset:offset + strings_length], "utf-8").split("\0") if number_of_strings else []
+    offset += strings_length
+    vector_floats = array("d")
+    vector_floats.frombytes(data[offset:offset + 24 * number_of_vectors])
+    if swap:
+        vector_floats.byteswap()
+    offset += 24 * number_of_vectors
+    vectors = [tuple(vector_floats[i:i + 3]) for i in range(0, len(vector_floats), 3)]
+
+    footprint_count, footprint_columns, offset = _read_columns(data, offset, swap, strings)
+    drawing_count, drawing_columns, offset = _read_columns(data, offset, swap, strings)
+
+    # JSON object keys are strings: overflow indexes are stored as strings
+    overflow = extra["overflow"]
+    pcb = {}
+    for key in extra["order"]:
+        if key in extra["values"]:
+            pcb[key] = extra["values"][key]
+        elif key == "footprints":
+            pcb[key] = _decode_footprints(footprint_count, footprint_columns, strings, vectors,
+                                          overflow["footprints"])
+        elif key == "drawings":
+            pcb[key] = _decode_drawings(drawing_count, drawing_columns, overflow["drawings"])
+
+    return pcb
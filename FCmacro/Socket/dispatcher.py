@@ -0,0 +1,70 @@
+"""
+    Module contains class for matching replies to requests by request ID (sent in frame header).
+    Only FreeCAD sends requests, so request IDs are allocated on FreeCAD side only. KiCAD copies ID of request to
+    header of its replies (module is shared for NO_REQUEST).
+"""
+import logging
+import threading
+
+logger_dispatcher = logging.getLogger("DISPATCHER")
+
+# Request ID of messages that neither are a request nor reply to one (e.g. !DIS)
+NO_REQUEST = 0
+# IDs stay in signed 32-bit range, so they can be passed through Qt signals as int
+MAX_REQUEST_ID = 0x7FFFFFFF
+
+
+class RequestDispatcher:
+    """
+    Keep track of requests waiting for reply. Every request gets a unique ID, which peer copies to header of
+    its reply(s). Multiple requests can be in flight at once and replies are routed to callback of matching request
+    regardless of order of arrival.
+    A request can receive multiple replies (e.g. streamed PCB): callback is removed when message of final type arrives.
+    Requests are registered and dispatched in main thread, is_pending is called from ConnectionHandler thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_id = NO_REQUEST
+        self._pending = {}
+
+    def register(self, callback, final_types: tuple) -> int:
+        """
+        Store callback for new request.
+        :param callback: function(msg_type: str, data)
+        :param final_types: tuple of message types that complete the request
+        :return: int (request ID to send in header)
+        """
+        with self._lock:
+            # Wrap around, 0 is reserved
+            self._last_id = self._last_id % MAX_REQUEST_ID + 1
+            self._pending[self._last_id] = (callback, final_types)
+            return self._last_id
+
+    def is_pending(self, request_id: int) -> bool:
+        """ Return True if message with this ID is a reply to own request. """
+        with self._lock:
+            return request_id in self._pending
+
+    def dispatch(self, request_id: int, msg_type: str, data) -> bool:
+        """
+        Call callback of request with given ID.
+        :return: bool (False if there is no such request)
+        """
+        with self._lock:
+            entry = self._pending.get(request_id)
+            if entry is None:
+                logger_dispatcher.warning(f"No pending request with ID {request_id} for {msg_type}")
+                return False
+            callback, final_types = entry
+            if msg_type in final_types:
+                del self._pending[request_id]
+        callback(msg_type, data)
+        return True
+
+    def cancel_all(self) -> int:
+        """ Forget all pending requests (e.g. when connection is closed), return number of dropped requests. """
+        with self._lock:
+            count = len(self._pending)
+            self._pending.clear()
+        return count
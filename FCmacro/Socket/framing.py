@@ -0,0 +1,542 @@
+"""
+    Module contains functions and classes for sending and receiving complete messages (frames) via socket.
+    Same module is used on KiCAD and FreeCAD side.
+
+    Frame is a fixed length binary header followed by the body:
+        header: message type (6 ASCII characters, e.g. REQPCB, DIF, !DIS), codec ID, payload format, request ID,
+                body length
+        body: json encoded string or columnar encoded data model (see columnar.py), compressed with codec from header
+    Large payloads can be passed through memory-mapped file (see bulk.py): body is then descriptor of the file and
+    BULK_FLAG is set in payload format.
+    Large json bodies are decoded incrementally while they are being received (see jsonstream.py), they are passed
+    to handler as decoded dictionary instead of string.
+    If fragments are negotiated, body larger than fragment size is sent as several frames with FRAGMENT_FLAG (last one
+    also with FINAL_FLAG). Frames of PRIORITY_TYPES are sent between fragments (never fragmented themselves), so
+    disconnect or a new request doesn't wait behind a large data model. Receiver reassembles fragments.
+"""
+import json
+import logging
+import socket
+import struct
+import time
+
+from Socket.bulk import read_bulk, write_bulk
+from Socket.columnar import decode_pcb
+from Socket.compression import CODECS, CODEC_NAMES, compress, decompress, negotiate
+from Socket.jsonstream import BodyStream
+
+logger_framing = logging.getLogger("FRAMING")
+
+# Type, codec, payload format, request ID, length -> 16 bytes
+HEADER = struct.Struct("!6sBBII")
+# Payload format IDs
+FORMATS = {"json": 0, "columnar": 1}
+# Set in payload format when payload is in memory-mapped file
+BULK_FLAG = 0x80
+# Set in payload format of every fragment of a fragmented message, final fragment also has FINAL_FLAG
+FRAGMENT_FLAG = 0x40
+FINAL_FLAG = 0x20
+# Small control messages which are sent ahead of queued data messages (between fragments)
+PRIORITY_TYPES = frozenset(("!DIS", "PING", "PONG", "REQPCB", "REQDIF", "REQSES", "REQSYN"))
+# Seconds to wait for reply when negotiating connection parameters
+HANDSHAKE_TIMEOUT = 5.0
+# Handshake frame is a small json dictionary, longer first frame doesn't come from FreeSync peer
+MAX_HELLO_LENGTH = 4096
+# Longest body (or reassembled message) accepted after handshake, receive buffer never grows beyond it
+MAX_FRAME_LENGTH = 512 * 1024 * 1024
+# Json bodies at least this long (on wire) are decoded incrementally, in chunks of STREAM_CHUNK_SIZE bytes
+STREAM_THRESHOLD = 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+# Messages whose body is not json (request and end of streamed data model carry placeholder text only)
+NO_DATA_TYPES = frozenset(("REQPCB", "PCBEND"))
+
+
+class PeerClosedError(ConnectionError):
+    """ Raised when peer closes the socket while a frame is being received. """
+
+
+class FrameTooLargeError(ValueError):
+    """ Raised when header announces body longer than parser accepts (garbage or not a FreeSync peer). """
+
+
+class TransferStats:
+    """
+    Bytes on wire and encode/decode time per message type, used for comparing compression codecs.
+    Every entry is: [number of messages, payload bytes, bytes on wire, encode/decode time in seconds]
+    """
+
+    def __init__(self):
+        self.sent = {}
+        self.received = {}
+
+    def record(self, direction: dict, msg_type: str, raw_length: int, wire_length: int, duration: float):
+        """ Add message to statistics of given direction (self.sent or self.received). """
+        entry = direction.setdefault(msg_type, [0, 0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += raw_length
+        entry[2] += wire_length
+        entry[3] += duration
+
+    def summary(self) -> str:
+        """ Return table of statistics for logging. """
+        lines = []
+        for name, direction in (("sent", self.sent), ("received", self.received)):
+            for msg_type, (count, raw_length, wire_length, duration) in direction.items():
+                ratio = wire_length / raw_length if raw_length else 1.0
+                lines.append(f"{name} {msg_type}: {count} messages, {raw_length} B payload, {wire_length} B on wire "
+                             f"({ratio:.1%}), {duration * 1000:.1f} ms codec time")
+        return "\n".join(lines)
+
+
+def encode_frame(msg_type: str, data: bytes, codec: str = "none", threshold: int = 0,
+                 stats: TransferStats = None, payload_format: str = "json", request_id: int = 0,
+                 bulk_threshold: int = 0, bulk_prefix: str = None) -> tuple:
+    """
+    Compress data (if large enough) and build header. Data larger than bulk_threshold is written to memory-mapped file
+    instead (not compressed).
+    :param msg_type: str (max. 6 characters)
+    :param data: bytes (encoded message)
+    :param codec: str (negotiated codec name)
+    :param threshold: int (messages smaller than this are not compressed)
+    :param stats: TransferStats object or None
+    :param payload_format: str (json or columnar)
+    :param request_id: int (ID of request this message is or replies to, 0 if none)
+    :param bulk_threshold: int (0 if bulk transfer wasn't negotiated)
+    :param bulk_prefix: str (payload file name prefix of connection, see bulk.new_bulk_prefix)
+    :return: tuple (header bytes, body bytes)
+    """
+    start = time.perf_counter()
+    format_id = FORMATS[payload_format]
+    if bulk_threshold and len(data) >= bulk_threshold:
+        codec = "none"
+        body = json.dumps(write_bulk(data, prefix=bulk_prefix)).encode("ascii")
+        format_id |= BULK_FLAG
+    # Small messages (requests, disconnect) are cheaper to send uncompressed
+    elif codec == "none" or len(data) < threshold:
+        codec = "none"
+        body = data
+    else:
+        body = compress(data, codec)
+    duration = time.perf_counter() - start
+
+    header = HEADER.pack(msg_type.encode("ascii"), CODECS[codec], format_id, request_id, len(body))
+    if stats is not None:
+        stats.record(stats.sent, msg_type, len(data), HEADER.size + len(body), duration)
+    if codec != "none":
+        logger_framing.debug(f"Encoded {msg_type}: {len(data)} B -> {len(body)} B ({codec}, "
+                             f"{duration * 1000:.1f} ms)")
+    return header, body
+
+
+def frame_type(header: bytes) -> str:
+    """ Return message type from encoded header. """
+    return bytes(header[:6]).rstrip(b"\0").decode("ascii")
+
+
+def is_priority(header: bytes) -> bool:
+    """ Frame is a control message which is sent before queued data messages. """
+    return frame_type(header) in PRIORITY_TYPES
+
+
+def decode_message(msg_type: str, data_raw):
+    """
+    Decode body of received request or reply: json text is loaded, columnar payloads and large json bodies are
+    already decoded by parser, messages without data are None.
+    """
+    if not isinstance(data_raw, str):
+        return data_raw
+    if msg_type in NO_DATA_TYPES:
+        return None
+    return json.loads(data_raw)
+
+
+def fragment_frame(header: bytes, body: bytes, fragment_size: int) -> list:
+    """
+    Split encoded frame into fragments with body of at most fragment_size bytes (no copies, fragments are views of
+    body). Frames of PRIORITY_TYPES and frames that fit are not split.
+    :return: list of tuples (header, body)
+    """
+    if fragment_size <= 0 or len(body) <= fragment_size or is_priority(header):
+        return [(header, body)]
+    msg_type, codec_id, payload_format, request_id, _ = HEADER.unpack(header)
+    view = memoryview(body)
+    fragments = []
+    for start in range(0, len(body), fragment_size):
+        piece = view[start:start + fragment_size]
+        flags = FRAGMENT_FLAG | (FINAL_FLAG if start + fragment_size >= len(body) else 0)
+        fragments.append((HEADER.pack(msg_type, codec_id, payload_format | flags, request_id, len(piece)), piece))
+    return fragments
+
+
+class _Reassembly:
+    """
+    Body of fragmented message which is being received. Json is decoded incrementally as fragments arrive,
+    columnar payload is collected and decoded after final fragment.
+    """
+
+    def __init__(self, header: tuple, encoding: str, on_entry=None):
+        msg_type, codec_id, payload_format, request_id, _ = header
+        self.msg_type = msg_type.rstrip(b"\0").decode("ascii")
+        self.codec_id = codec_id
+        self.payload_format = payload_format & ~(FRAGMENT_FLAG | FINAL_FLAG)
+        self.request_id = request_id
+        self.wire_length = 0
+        self.duration = 0.0
+        if self.payload_format == FORMATS["json"]:
+            self.stream = BodyStream(codec_id, encoding, on_entry)
+            self.parts = None
+        else:
+            self.stream = None
+            self.parts = bytearray()
+
+    def matches(self, header: tuple) -> bool:
+        return header[0].rstrip(b"\0").decode("ascii") == self.msg_type and header[3] == self.request_id
+
+    def feed(self, body):
+        start = time.perf_counter()
+        self.wire_length += HEADER.size + len(body)
+        if self.stream is not None:
+            self.stream.feed(body)
+        else:
+            self.parts += body
+        self.duration += time.perf_counter() - start
+
+    def close(self) -> tuple:
+        """ Return decoded body and its decompressed length. """
+        start = time.perf_counter()
+        if self.stream is not None:
+            data, length = self.stream.close(), self.stream.length
+        else:
+            data = decompress(self.parts, self.codec_id)
+            length = len(data)
+            data = decode_pcb(data)
+        self.duration += time.perf_counter() - start
+        return data, length
+
+
+class FrameParser:
+    """
+    Sans-IO frame parser: it doesn't read from socket itself, so it can be driven by a blocking socket (FrameReader),
+    by asyncio (BufferedProtocol has the same get_buffer/buffer_updated interface) or by a selector.
+    Caller receives bytes into view returned by get_buffer and reports number of received bytes with buffer_updated.
+    View always covers only the rest of current header or body, so frames never have to be split or joined.
+    Receive buffer is allocated once and reused for all messages: it only grows when a bigger message arrives.
+    Json bodies of stream_threshold bytes or more are received in chunks and decoded incrementally instead, so receive
+    buffer never grows beyond STREAM_CHUNK_SIZE for them.
+    Fragments of a fragmented message are collected until final fragment, other frames received in between (control
+    messages) are returned right away.
+    :param encoding: str (format used for decoding body)
+    :param stats: TransferStats object or None
+    :param buffer_size: int (initial size of receive buffer in bytes)
+    :param stream_threshold: int (0 disables incremental decoding)
+    :param on_entry: function(msg_type, path, entry) or None, called for every entry of incrementally decoded body
+                     as soon as it is complete (see jsonstream.py)
+    :param max_length: int (longest accepted body, MAX_HELLO_LENGTH until handshake is done). Longer frame raises
+                       FrameTooLargeError before receive buffer is grown, connection has to be dropped then.
+    """
+
+    def __init__(self, encoding: str, stats: TransferStats = None, buffer_size: int = 65536,
+                 stream_threshold: int = STREAM_THRESHOLD, on_entry=None, max_length: int = MAX_FRAME_LENGTH):
+        self.encoding = encoding
+        self.stats = stats
+        self.stream_threshold = stream_threshold
+        self.on_entry = on_entry
+        self.max_length = max_length
+        self._header_buffer = memoryview(bytearray(HEADER.size))
+        self._buffer = memoryview(bytearray(buffer_size))
+        # View which is being filled (header or body) and number of bytes already received into it
+        self._target = self._header_buffer
+        self._received = 0
+        # Unpacked header of frame whose body is being received
+        self._header = None
+        # Incremental decoder of current body and number of body bytes not received yet (streamed bodies only)
+        self._stream = None
+        self._stream_remaining = 0
+        self._stream_duration = 0.0
+        # Fragmented message being received
+        self._reassembly = None
+        # CaptureWriter (see capture.py) or None: received frames are recorded before decoding
+        self.capture = None
+
+    @property
+    def pending(self) -> tuple:
+        """ Number of bytes received and expected for current header or body (for error messages). """
+        return self._received, len(self._target)
+
+    def _reserve(self, length: int) -> memoryview:
+        """ Return view of receive buffer with given length, grow buffer if message doesn't fit. """
+        if length > len(self._buffer):
+            # At least double the size to avoid frequent resizing, release old view so the old buffer can be freed
+            new_size = max(length, 2 * len(self._buffer))
+            self._buffer.release()
+            self._buffer = memoryview(bytearray(new_size))
+        return self._buffer[:length]
+
+    def get_buffer(self, sizehint: int = -1) -> memoryview:
+        """ Return (never empty) view to receive next bytes into. """
+        return self._target[self._received:]
+
+    def buffer_updated(self, nbytes: int):
+        """
+        Process bytes received into view returned by get_buffer.
+        :return: tuple (message type, request ID, decoded body) if frame is complete, None otherwise
+        """
+        self._received += nbytes
+        if self._received < len(self._target):
+            return None
+
+        if self._header is None:
+            # Header is type, codec, payload format, request ID and length of body
+            header = HEADER.unpack(self._header_buffer)
+            if header[4] > self.max_length:
+                self._received = 0
+                raise FrameTooLargeError(f"Frame {header[0]!r} announces {header[4]} B body "
+                                         f"(at most {self.max_length} B accepted)")
+            self._header = header
+            if self._is_streamed(self._header):
+                self._start_stream(self._header)
+            else:
+                self._target = self._reserve(self._header[4])
+            self._received = 0
+            # Messages without body are complete right away
+            if self._header[4] > 0:
+                return None
+
+        if self._stream is not None:
+            return self._stream_chunk()
+
+        if self.capture is not None:
+            self.capture.record(b"R", self._header_buffer, self._target)
+        if self._header[2] & FRAGMENT_FLAG:
+            frame = self._add_fragment(self._header, self._target)
+        else:
+            frame = self._decode(self._header, self._target)
+        self._target.release()
+        self._target = self._header_buffer
+        self._received = 0
+        self._header = None
+        return frame
+
+    def _is_streamed(self, header: tuple) -> bool:
+        """
+        Large json body (not bulk, not fragment) is decoded incrementally. Captured frames are recorded whole,
+        not streamed. Fragments are always received whole (their size is limited by sender).
+        """
+        return (self.stream_threshold > 0 and header[4] >= self.stream_threshold and header[2] == FORMATS["json"]
+                and self.capture is None)
+
+    def _add_fragment(self, header: tuple, body: memoryview):
+        """ Add fragment to message being reassembled, return frame after final fragment. """
+        if self._reassembly is None:
+            self._reassembly = _Reassembly(header, self.encoding, self._entry_callback(header))
+        elif not self._reassembly.matches(header):
+            raise ValueError(f"Fragment of {header[0]!r} received while {self._reassembly.msg_type} is incomplete")
+        reassembly = self._reassembly
+        if reassembly.wire_length + len(body) > self.max_length:
+            self._reassembly = None
+            raise FrameTooLargeError(f"Fragmented {reassembly.msg_type} is longer than {self.max_length} B")
+        reassembly.feed(body)
+        if not header[2] & FINAL_FLAG:
+            return None
+
+        self._reassembly = None
+        data, length = reassembly.close()
+        if self.stats is not None:
+            self.stats.record(self.stats.received, reassembly.msg_type, length, reassembly.wire_length,
+                              reassembly.duration)
+        logger_framing.debug(f"Reassembled {reassembly.msg_type}: {reassembly.wire_length} B -> {length} B "
+                             f"({CODEC_NAMES[reassembly.codec_id]}, {reassembly.duration * 1000:.1f} ms)")
+        return reassembly.msg_type, reassembly.request_id, data
+
+    def _entry_callback(self, header: tuple):
+        """ Return on_entry callback of body decoder (adds message type), or None. """
+        if self.on_entry is None:
+            return None
+        msg_type = header[0].rstrip(b"\0").decode("ascii")
+
+        def on_entry(path, entry):
+            self.on_entry(msg_type, path, entry)
+        return on_entry
+
+    def _start_stream(self, header: tuple):
+        self._stream = BodyStream(header[1], self.encoding, self._entry_callback(header))
+        self._stream_remaining = header[4]
+        self._stream_duration = 0.0
+        self._target = self._reserve(min(header[4], STREAM_CHUNK_SIZE))
+
+    def _stream_chunk(self):
+        """ Decode received chunk of streamed body, return frame when last chunk is decoded. """
+        start = time.perf_counter()
+        self._stream.feed(self._target)
+        self._stream_remaining -= len(self._target)
+        self._target.release()
+        self._received = 0
+        if self._stream_remaining > 0:
+            self._stream_duration += time.perf_counter() - start
+            self._target = self._reserve(min(self._stream_remaining, STREAM_CHUNK_SIZE))
+            return None
+
+        msg_type, codec_id, payload_format, request_id, msg_length = self._header
+        msg_type = msg_type.rstrip(b"\0").decode("ascii")
+        data = self._stream.close()
+        duration = self._stream_duration + time.perf_counter() - start
+        if self.stats is not None:
+            self.stats.record(self.stats.received, msg_type, self._stream.length, HEADER.size + msg_length, duration)
+        logger_framing.debug(f"Decoded {msg_type} incrementally: {msg_length} B -> {self._stream.length} B "
+                             f"({CODEC_NAMES[codec_id]}, {duration * 1000:.1f} ms)")
+        self._stream = None
+        self._target = self._header_buffer
+        self._header = None
+        return msg_type, request_id, data
+
+    def _decode(self, header: tuple, body: memoryview) -> tuple:
+        """ Decompress and decode body directly from receive buffer (no intermediate bytes object). """
+        msg_type, codec_id, payload_format, request_id, msg_length = header
+        msg_type = msg_type.rstrip(b"\0").decode("ascii")
+
+        start = time.perf_counter()
+        if payload_format & BULK_FLAG:
+            # Body is descriptor of memory-mapped file, payload is decoded directly from mapped file
+            with read_bulk(json.loads(str(body, "ascii"))) as data:
+                data_length = len(data)
+                data_raw = self._decode_payload(payload_format & ~BULK_FLAG, data)
+        else:
+            data = decompress(body, codec_id)
+            data_length = len(data)
+            data_raw = self._decode_payload(payload_format, data)
+        duration = time.perf_counter() - start
+
+        if self.stats is not None:
+            self.stats.record(self.stats.received, msg_type, data_length, HEADER.size + msg_length, duration)
+        if codec_id != CODECS["none"]:
+            logger_framing.debug(f"Decoded {msg_type}: {msg_length} B -> {data_length} B ({CODEC_NAMES[codec_id]}, "
+                                 f"{duration * 1000:.1f} ms)")
+
+        return msg_type, request_id, data_raw
+
+    def _decode_payload(self, payload_format: int, data):
+        """ Decode bytes-like payload: columnar to dictionary, json to string. """
+        if payload_format == FORMATS["columnar"]:
+            return decode_pcb(data)
+        return str(data, self.encoding)
+
+
+class FrameReader:
+    """
+    Receive complete frames (fixed length header + body) from a blocking socket.
+    socket.recv(n) returns at most n bytes, so a large message (e.g. PCB data model of a big board) arrives in multiple
+    pieces. Frame is therefore received with socket.recv_into in a loop until the advertised length is reached.
+    :param connection_socket: socket.socket object
+    :param encoding: str (format used for decoding body)
+    :param stats: TransferStats object or None
+    :param buffer_size: int (initial size of receive buffer in bytes)
+    :param max_length: int (longest accepted body, see FrameParser)
+    """
+
+    def __init__(self, connection_socket, encoding: str, stats: TransferStats = None, buffer_size: int = 65536,
+                 max_length: int = MAX_FRAME_LENGTH):
+        self._socket = connection_socket
+        self._parser = FrameParser(encoding, stats=stats, buffer_size=buffer_size, max_length=max_length)
+
+    def read_frame(self) -> tuple:
+        """
+        Block until complete frame is received.
+        :return: tuple (message type, request ID, decoded body string or dictionary if payload format is columnar)
+        """
+        frame = None
+        while frame is None:
+            received_now = self._socket.recv_into(self._parser.get_buffer())
+            # Zero bytes means the peer has closed the connection
+            if received_now == 0:
+                received, length = self._parser.pending
+                raise PeerClosedError(f"Connection closed by peer ({received} of {length} bytes received)")
+            frame = self._parser.buffer_updated(received_now)
+        return frame
+
+
+def client_handshake(connection_socket, config, board_kiid: str = None) -> dict:
+    """
+    Offer supported codecs and payload formats to server right after connecting, return parameters chosen by server.
+    Called in Client thread, so blocking is fine.
+    :param board_kiid: str (KIID of synced board, server keeps data model of every board separately)
+    :return: dict (codec, columnar, streaming, bulk, fragments)
+    """
+    reader = FrameReader(connection_socket, encoding=config.format, buffer_size=1024, max_length=MAX_HELLO_LENGTH)
+    connection_socket.settimeout(HANDSHAKE_TIMEOUT)
+    try:
+        connection_socket.sendall(client_hello(config, local=is_local(connection_socket), board_kiid=board_kiid))
+        msg_type, _, data_raw = reader.read_frame()
+    finally:
+        connection_socket.settimeout(None)
+
+    if msg_type != "HELO":
+        raise ConnectionError(f"Invalid handshake reply: {msg_type}")
+    return parse_server_hello(data_raw)
+
+
+def client_hello(config, local: bool = False, board_kiid: str = None) -> bytes:
+    """ Return complete HELO frame with client's offer. """
+    hello = json.dumps({"codecs": config.compression,
+                        "columnar": config.columnar_payload,
+                        "streaming": config.pcb_chunk_size > 0,
+                        "bulk": config.bulk_threshold > 0 and local,
+                        "fragments": config.fragment_size > 0,
+                        "board": board_kiid}).encode(config.format)
+    return b"".join(encode_frame("HELO", hello))
+
+
+def parse_server_hello(data_raw) -> dict:
+    """
+    Return connection parameters from body of server's HELO reply.
+    Raises ValueError if body isn't a parameters dictionary (peer is not a FreeSync server).
+    :return: dict (codec, columnar, streaming, bulk, fragments)
+    """
+    reply = json.loads(data_raw)
+    if not isinstance(reply, dict):
+        raise ValueError(f"Invalid handshake reply: {reply!r}")
+    return {"codec": reply.get("codec", "none"),
+            "columnar": reply.get("columnar", False),
+            "streaming": reply.get("streaming", False),
+            "bulk": reply.get("bulk", False),
+            "fragments": reply.get("fragments", False)}
+
+
+def is_local(connection_socket) -> bool:
+    """ Return True if socket is Unix domain socket (peer is on same machine and same user). """
+    return connection_socket.family == getattr(socket, "AF_UNIX", None)
+
+
+def negotiate_params(offer: dict, config, local: bool = False) -> dict:
+    """
+    Choose codec according to own preference and use columnar payload only if both sides support it.
+    Streaming PCB transfer is accepted whenever client offers it. Bulk transfer through memory-mapped files only works
+    on local (Unix domain socket) connection. Fragments are used (in both directions) only if both sides enable them.
+    :param offer: dict (decoded HELO message of client)
+    :param local: bool (connection is Unix domain socket)
+    :return: dict (codec, columnar, streaming, bulk, fragments)
+    """
+    return {"codec": negotiate(offered=offer.get("codecs", []), preferred=config.compression),
+            "columnar": bool(offer.get("columnar")) and config.columnar_payload,
+            "streaming": bool(offer.get("streaming")),
+            "bulk": bool(offer.get("bulk")) and config.bulk_threshold > 0 and local,
+            "fragments": bool(offer.get("fragments")) and config.fragment_size > 0}
+
+
+def server_handshake(connection_socket, config) -> dict:
+    """
+    Wait for client's offer, send chosen parameters back. Called in Server thread, so blocking is fine.
+    :return: dict (codec, columnar, streaming, bulk, fragments)
+    """
+    reader = FrameReader(connection_socket, encoding=config.format, buffer_size=1024, max_length=MAX_HELLO_LENGTH)
+    connection_socket.settimeout(HANDSHAKE_TIMEOUT)
+    try:
+        msg_type, _, data_raw = reader.read_frame()
+        if msg_type != "HELO":
+            raise ConnectionError(f"Invalid handshake message: {msg_type}")
+        params = negotiate_params(json.loads(data_raw), config, local=is_local(connection_socket))
+        hello = json.dumps(params).encode(config.format)
+        connection_socket.sendall(b"".join(encode_frame("HELO", hello)))
+    finally:
+        connection_socket.settimeout(None)
+
+    return params
@@ -1,193 +1,496 @@
 """
     Module contains Server and ConnectionHandler host for managing socket connection.
+    All socket operations run on a single asyncio event loop in one background thread (EventLoopThread), results are
+    passed to main thread with Qt signals. Methods called from main thread only schedule work on the loop.
 """
 
+import asyncio
+import collections
+import concurrent.futures
 import json
 import logging
-import socket
+import os
+import threading
+import time
 
-from PySide import QtGui, QtCore
+from PySide import QtCore
+
+from Socket.dispatcher import NO_REQUEST, RequestDispatcher
+from Socket.endpoints import UNIX_SOCKETS_AVAILABLE, remove_stale_socket, unix_socket_path
+from Socket.bulk import new_bulk_prefix, remove_bulk_files
+from Socket.capture import SENT, CaptureWriter, capture_path
+from Socket.framing import (HANDSHAKE_TIMEOUT, MAX_FRAME_LENGTH, MAX_HELLO_LENGTH, FrameParser, FrameTooLargeError,
+                            TransferStats, decode_message, encode_frame, fragment_frame, is_local, is_priority,
+                            negotiate_params)
+from Socket.heartbeat import Liveness, RttStats, ping_body, rtt_from_pong
 
 # Initialize logger
 logger_server = logging.getLogger("SERVER")
 
+# Seconds to wait for connections to close (and for loop thread to finish) when event loop is stopped
+STOP_TIMEOUT = 5.0
+
+
+class EventLoopThread:
+    """ asyncio event loop running in a daemon thread. Coroutines and callbacks are scheduled from main thread. """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="FreeSyncEventLoop", daemon=True)
+        # Protocols of open connections (added and removed by protocols in loop thread), closed when loop is stopped
+        self.connections = set()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        """ Start loop thread (loop runs until stop is called). """
+        self._thread.start()
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """
+        Close listening sockets (tasks are cancelled) and open connections, then stop loop and wait for thread to
+        finish. Called from main thread when plugin is closed.
+        """
+        if not self._thread.is_alive():
+            return
+        try:
+            self.submit(self._shutdown(timeout)).result(timeout * 2)
+        except concurrent.futures.TimeoutError:
+            logger_server.warning("Timed out closing connections")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger_server.warning("Event loop thread did not finish")
+        else:
+            self.loop.close()
+
+    async def _shutdown(self, timeout: float):
+        """ Cancel all other tasks, close connections (pending frames are sent) and abort those that don't close. """
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for protocol in list(self.connections):
+            protocol.transport.close()
+        deadline = time.monotonic() + timeout
+        while self.connections and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for protocol in list(self.connections):
+            protocol.transport.abort()
+        # Let connection_lost callbacks of aborted transports run
+        await asyncio.sleep(0)
+
+    def submit(self, coroutine):
+        """ Run coroutine on loop, return concurrent.futures.Future (can be cancelled from any thread). """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, callback, *args):
+        """ Call function in loop thread. """
+        self.loop.call_soon_threadsafe(callback, *args)
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    """
+    Receive frames of one client connection. Bytes are received directly into buffer of FrameParser.
+    First frame must be HELO (handshake), all following frames are passed to ConnectionHandler. Frames received
+    before handler is attached are kept and passed on attach.
+    Connections that fail before handshake is done (e.g. port probes) are dropped, server keeps listening.
+    :param config: ConfigLoader object
+    :param on_accepted: function(protocol), called in loop thread when handshake is done
+    :param connections: set of open connections (protocol adds itself when connected, removes itself when closed)
+    """
+
+    def __init__(self, config, on_accepted, connections: set):
+        self.config = config
+        self._on_accepted = on_accepted
+        self._connections = connections
+        # Only a short handshake frame is accepted until handshake is done
+        self.parser = FrameParser(config.format, max_length=MAX_HELLO_LENGTH)
+        self.transport = None
+        self.params = None
+        # KIID of board synced by client (sent in handshake), None if client didn't send it
+        self.board_kiid = None
+        self._handler = None
+        self._backlog = []
+        self._handshake_timeout = None
+        self._lost = False
+        # Set while transport buffer is above its high-water mark (peer doesn't read fast enough)
+        self.writing_paused = False
+        # Time when bytes were last received, used for detecting dead peer
+        self.liveness = Liveness(config.liveness_timeout)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._connections.add(self)
+        self._handshake_timeout = asyncio.get_running_loop().call_later(HANDSHAKE_TIMEOUT, self._on_handshake_timeout)
+
+    def _on_handshake_timeout(self):
+        logger_server.error("Handshake timed out")
+        self.transport.abort()
+
+    def get_buffer(self, sizehint):
+        return self.parser.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.liveness.received()
+        try:
+            frame = self.parser.buffer_updated(nbytes)
+        except FrameTooLargeError as e:
+            # Rest of stream can't be parsed, nothing was allocated for body
+            logger_server.error(f"Dropping connection: {e}")
+            self.transport.abort()
+            return
+        if frame is None:
+            return
+        if self.params is None:
+            self._handshake(*frame)
+        elif self._handler is None:
+            self._backlog.append(frame)
+        else:
+            self._handler.on_frame(*frame)
+
+    def _handshake(self, msg_type: str, request_id: int, data_raw: str):
+        """ Reply to client's offer with chosen parameters. """
+        self._handshake_timeout.cancel()
+        try:
+            if msg_type != "HELO":
+                raise ValueError(f"Invalid handshake message: {msg_type}")
+            offer = json.loads(data_raw)
+            self.params = negotiate_params(offer, self.config,
+                                           local=is_local(self.transport.get_extra_info("socket")))
+            self.board_kiid = offer.get("board")
+        except ValueError as e:
+            logger_server.error(f"Handshake failed: {e}")
+            self.transport.abort()
+            return
+        self.parser.max_length = MAX_FRAME_LENGTH
+        hello = json.dumps(self.params).encode(self.config.format)
+        self.transport.writelines(encode_frame("HELO", hello))
+        self._on_accepted(self)
+
+    def attach(self, handler):
+        """ Pass all further frames to handler. Called in loop thread. """
+        self._handler = handler
+        self.parser.stats = handler.stats
+        self.parser.capture = handler.capture
+        for frame in self._backlog:
+            handler.on_frame(*frame)
+        self._backlog.clear()
+        # Connection could be lost before handler was attached
+        if self._lost:
+            handler.on_connection_lost(None)
+
+    def pause_writing(self):
+        self.writing_paused = True
+        # Fragments of large messages are written until buffer is full, so pausing is expected then
+        if self._handler is None or not self._handler.fragment_size:
+            logger_server.warning(f"Peer is not keeping up, {self.transport.get_write_buffer_size()} B waiting to be "
+                                  f"sent")
+
+    def resume_writing(self):
+        self.writing_paused = False
+        if self._handler is not None:
+            self._handler.write_fragments()
+
+    def connection_lost(self, exc):
+        self._lost = True
+        self._connections.discard(self)
+        if self._handshake_timeout:
+            self._handshake_timeout.cancel()
+        if self._handler:
+            self._handler.on_connection_lost(exc)
+        elif self.params is None:
+            logger_server.debug(f"Connection closed before handshake: {exc}")
+
 
 class Server(QtCore.QObject):
     """
-    Instantiate host socket and start listening for clients.
-    There is no way to stop socket.accept() method -> create a new socket to establish connection. This is the only
-    way to satisfy condition for exiting this thread "cleanly"
-    Solution: Wrap return values to dictionary where a key holds information if connection is quasi-abort or real,
-    check this status before launching connection handler
-    https://stackoverflow.com/questions/16734534/close-listening-socket-in-python-thread
+    Listen for clients on event loop until abort is called, which cancels the listening task. Any number of clients
+    (one per KiCAD board) can be connected at once.
+    If transport is unix, server listens on Unix domain socket of every board in document and on generic socket
+    (for boards not in document yet), in addition to TCP.
+    Every client that finished handshake is emitted with client_connected signal as a dictionary (protocol, peer,
+    params). When listening stops, finished signal is emitted with status "abort" or "exception".
+    :param board_kiids: list of KIIDs of boards in document
     """
 
     finished = QtCore.Signal(dict)
+    client_connected = QtCore.Signal(dict)
 
-    def __init__(self, config):
+    def __init__(self, config, event_loop: EventLoopThread, board_kiids=()):
         super().__init__()
         self.config = config
-        # Private attribute to stop infinite loop
-        self._want_abort = False
-        self._socket = None
+        self._event_loop = event_loop
+        self.board_kiids = list(board_kiids)
+        self._future = None
+        # Cleared when listening stops: clients still in handshake are dropped then
+        self._listening = False
+
+    def start(self):
+        """ Start listening (called from main thread). """
+        self._future = self._event_loop.submit(self._serve())
 
     def abort(self):
-        """ Method used by main thread stop accepting clients. Establishes fake connection. """
-        self._want_abort = True
-        socket.socket(socket.AF_INET,
-                      socket.SOCK_STREAM).connect((self.config.host, self.config.port))
-        self._socket.close()
-
-    def run(self):
-        """ Worker thread for starting Socket and listening for client. """
+        """ Method used by main thread stop accepting clients. """
+        if self._future:
+            self._future.cancel()
+
+    def _create_protocol(self) -> FrameProtocol:
+        """ Protocol factory of listening sockets, called in loop thread for every accepted client. """
+        return FrameProtocol(self.config, self._on_accepted, self._event_loop.connections)
+
+    def _on_accepted(self, protocol: FrameProtocol):
+        """ Called in loop thread when client finished handshake. """
+        if not self._listening:
+            protocol.transport.abort()
+            return
+        # Unix domain socket peer has no name, use path of listening socket
+        peer = protocol.transport.get_extra_info("peername") or protocol.transport.get_extra_info("sockname")
+        logger_server.info(f"Client connected: {peer} (board {protocol.board_kiid})")
+        logger_server.info(f"Negotiated connection parameters: {protocol.params}")
+        self.client_connected.emit({
+            "protocol": protocol,
+            "peer": peer,
+            "params": protocol.params,
+            "status": "client_connected"
+            })
+
+    async def _serve(self):
+        """ Listen until listening task is cancelled. """
         logger_server.info("Server starting")
+        loop = asyncio.get_running_loop()
+        servers = []
+        unix_paths = []
 
-        # Instantiate socket object
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Set Re-use address option to 1 to avoid [Errno 98]
-        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.config.transport == "unix" and UNIX_SOCKETS_AVAILABLE:
+            # Board specific sockets first, generic socket last
+            for board_kiid in self.board_kiids + [None]:
+                path = unix_socket_path(board_kiid)
+                try:
+                    if not remove_stale_socket(path):
+                        logger_server.warning(f"Another instance is already listening on {path}")
+                        continue
+                    servers.append(await loop.create_unix_server(self._create_protocol, path=path))
+                except OSError as e:
+                    logger_server.warning(f"Failed to listen on {path}: {e}")
+                    continue
+                unix_paths.append(path)
+                logger_server.info(f"Server is listening on {path}")
 
         try:
-            self._socket.bind((self.config.host, self.config.port))
-            bind_successful = True
+            servers.append(await loop.create_server(self._create_protocol,
+                                                    host=self.config.host,
+                                                    port=self.config.port,
+                                                    reuse_address=True))
+            logger_server.info(f"Server is listening on {self.config.host}, port {self.config.port}")
         except OSError as e:
-            # BUG: error message when manually closing Socket.
-            # FIX: Catch error number 10038 (on windows: Operation was attempted on
-            #                                            something that is not a Socket)
-            bind_successful = False
-            if e.errno == 10038:
-                pass
-            # Only one usage of each Socket address is permitted
-            elif e.errno == 10048:
-                # self.config.port = self.config.port + 1
-                logger_server.exception(e)
-            else:
-                logger_server.exception(e)
+            logger_server.exception(e)
+            # Unix domain sockets are enough if TCP port is taken
+            if not servers:
                 self.finished.emit({"status": "exception"})
                 return
 
-        conn = None
-        if bind_successful:
-            # Wait for connection
-            self._socket.listen()
-            logger_server.info(f"Server is listening on {self.config.host}, port {self.config.port}")
-            # Accept new connection
-            conn, addr = self._socket.accept()
-            # Connection is a genuine client
-            if not self._want_abort:
-                logger_server.info(f"Client connected: {str(addr)}")
-                self._socket.close()
-            # Connection is fake socket
-            else:
-                logger_server.debug(f"Listening stopped by abort signal")
-                self._socket.close()
-
-        logger_server.info("Server Socket closed")
-
-        # See docstring
-        result = {
-            "connection_socket": conn,
-            "status": "abort" if self._want_abort else "client_connected"
-            }
-
-        # Emit Qt Signal
-        self.finished.emit(result)
+        self._listening = True
+        try:
+            # Clients are accepted by protocol factories until task is cancelled
+            await loop.create_future()
+        except asyncio.CancelledError:
+            logger_server.debug(f"Listening stopped by abort signal")
+            self.finished.emit({"status": "abort"})
+            raise
+        finally:
+            self._listening = False
+            for server in servers:
+                server.close()
+            for path in unix_paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            logger_server.info("Server Socket closed")
 
 
 class ConnectionHandler(QtCore.QObject):
     """
-    Listen for an incoming message on connection socket in a separate thread to avoid crashing FreeCAD
-    (socket.recv is a blocking operation).
+    Handle messages of connected client. Frames are received and decoded on event loop thread (on_frame),
+    replies are emitted to main thread with received_reply signal.
+    finished signal is emitted when connection is closed (by either side).
     """
     finished = QtCore.Signal()
-    received_pcb = QtCore.Signal(dict)
-    received_diff = QtCore.Signal(dict)
-    received_diff_reply = QtCore.Signal(dict, dict)
+    # Request ID, message type, data (dictionary, list or None). Routed to request callback in main thread.
+    received_reply = QtCore.Signal(int, str, object)
+    # Round trip time of last heartbeat in seconds
+    rtt_updated = QtCore.Signal(float)
 
-    def __init__(self, connection_socket, config):
+    def __init__(self, protocol: FrameProtocol, config, event_loop: EventLoopThread, params=None):
         super().__init__()
-        self._socket = connection_socket
+        self._protocol = protocol
+        self._event_loop = event_loop
         self.config = config
-        self._abort = False
+        # Negotiated payload compression and format (result of handshake)
+        params = params or {}
+        self.codec = params.get("codec", "none")
+        self.columnar = params.get("columnar", False)
+        # Large payloads are passed through memory-mapped files (only on Unix domain socket)
+        self.bulk_threshold = self.config.bulk_threshold if params.get("bulk") else 0
+        # Payload files of this connection only are removed when it is closed (other boards may be connected)
+        self.bulk_prefix = new_bulk_prefix()
+        # Large messages are split into fragments, which are written to transport only while it isn't full, so
+        # control frames (written right away) don't wait behind whole message
+        self.fragment_size = self.config.fragment_size if params.get("fragments") else 0
+        self._fragments = collections.deque()
+        # Bytes on wire and encode/decode time per message type
+        self.stats = TransferStats()
+        # Requests waiting for reply (several can be in flight at once)
+        self.dispatcher = RequestDispatcher()
+        # Heartbeat round trip times, timer handle of next heartbeat
+        self.rtt = RttStats()
+        self._heartbeat = None
+        # Recorder of all frames of this connection (for replaying session later)
+        self.capture = None
+        if self.config.capture_directory:
+            self.capture = CaptureWriter(capture_path(self.config.capture_directory, "freecad", protocol.board_kiid))
+            logger_server.info(f"Recording session to {self.capture.path}")
+        # Start receiving frames
+        self._event_loop.call(self._protocol.attach, self)
+        self._event_loop.call(self._schedule_heartbeat)
+
+    @property
+    def bytes_pending(self) -> int:
+        """ Number of bytes queued or written to transport but not sent yet. """
+        queued = sum(len(header) + len(body) for header, body in list(self._fragments))
+        return queued + self._protocol.transport.get_write_buffer_size()
 
     def abort(self):
-        """ Method used by main when disconnection from FC side. """
-        self._abort = True
-
-    def run(self):
-        """ Worker thread for receiving messages from client. """
-
-        logger_server.debug(f"ConnectionHandler running")
-        self._abort = False
-        while not self._abort:
-
-            # Receive first message
-            first_msg = self._socket.recv(self.config.header).decode(self.config.format)
-            # Check if anything was actually sent, skip if not
-            if not first_msg:
-                continue
-            # Split first message -> first half is type (pcb, diff, disconnect), second is length
-            msg_type = first_msg.split("_")[0]
-            msg_length = first_msg.split("_")[1]
-            # Receive second message
-            msg_length = int(msg_length)
-            data_raw = self._socket.recv(msg_length).decode(self.config.format)
-
-            logger_server.debug(f"[CONNECTION] Message received: {msg_type}")
-
-            # Check for disconnect message
-            if msg_type == "!DIS":
-                self._abort = True
-                logger_server.info(f"Disconnect message received.")
-
-            elif msg_type == "REP":
-                # Second message has two parts: diff and hash separated by double underscore (because single underscore
-                # appears in dictionary string)
-                dict_data_string = data_raw.split("__")[0]
-                hash_data_string = data_raw.split("__")[1]
-                # String to dictionary with json.loads
-                dict_data = json.loads(dict_data_string)
-                logger_server.info(f"Diff Reply received: {dict_data}, Hash: {hash_data_string}")
-                self.received_diff_reply.emit(dict_data, hash_data_string)
-
-            elif msg_type == "PCB":
-                # String to dictionary with json.loads
-                dict_data = json.loads(data_raw)
-                if not isinstance(dict_data, dict):
-                    continue
-                logger_server.info(f"PCB Dictionary received.")
-                self.received_pcb.emit(dict_data)
+        """
+        Method used by main when disconnection from FC side. Frames already written to transport (e.g. disconnect
+        message) are sent before closing, queued fragments are dropped.
+        """
+        self._event_loop.call(self._close)
 
-            elif msg_type == "DIF":
-                # String to dictionary with json.loads
-                dict_data = json.loads(data_raw)
-                if not isinstance(dict_data, dict):
-                    continue
-                logger_server.info(f"Diff Dictionary received: {dict_data}")
-                self.received_diff.emit(dict_data)
+    def _close(self):
+        """ Called in loop thread. """
+        self._fragments.clear()
+        self._protocol.transport.close()
 
-            else:
-                logger_server.error(f"Invalid message type: {msg_type}_{json.loads(data_raw)}")
+    def _schedule_heartbeat(self):
+        """ Called in loop thread. Liveness is only checked if heartbeats are sent (peer replies to them). """
+        if self.config.heartbeat_interval > 0 and not self._protocol.transport.is_closing():
+            loop = asyncio.get_running_loop()
+            self._heartbeat = loop.call_later(self.config.heartbeat_interval, self._on_heartbeat)
 
-        self._socket.close()
+    def _on_heartbeat(self):
+        """ Called in loop thread: close connection if peer is silent for too long, otherwise send PING. """
+        liveness = self._protocol.liveness
+        if liveness.expired:
+            logger_server.error(f"Nothing received from peer for {liveness.silent:.1f} s, closing connection")
+            self._protocol.transport.abort()
+            return
+        self._write_frame(*encode_frame("PING", ping_body()))
+        self._schedule_heartbeat()
+
+    def _write_frame(self, header: bytes, body: bytes):
+        """
+        Called in loop thread. Transport buffers data until it is sent, so caller never blocks.
+        Control frames are written right away, data frames after fragments queued before them.
+        """
+        if is_priority(header):
+            self._write(header, body)
+            return
+        self._fragments.extend(fragment_frame(header, body, self.fragment_size))
+        self.write_fragments()
+
+    def write_fragments(self):
+        """ Called in loop thread. Write queued fragments until transport pauses writing (buffer is full). """
+        transport = self._protocol.transport
+        while self._fragments and not self._protocol.writing_paused and not transport.is_closing():
+            self._write(*self._fragments.popleft())
+
+    def _write(self, header: bytes, body: bytes):
+        if self.capture is not None:
+            self.capture.record(SENT, header, body)
+        self._protocol.transport.writelines((header, body))
+
+    def on_frame(self, msg_type: str, request_id: int, data_raw):
+        """ Called in loop thread for every received frame. """
+        # Heartbeats are answered here, main thread may be busy drawing or updating
+        if msg_type == "PING":
+            self._write_frame(*encode_frame("PONG", data_raw.encode("ascii")))
+            return
+        if msg_type == "PONG":
+            self.rtt.add(rtt_from_pong(data_raw))
+            logger_server.debug(f"[CONNECTION] {self.rtt.summary()}")
+            self.rtt_updated.emit(self.rtt.last)
+            return
+
+        logger_server.debug(f"[CONNECTION] Message received: {msg_type} (request {request_id})")
+
+        # Check for disconnect message
+        if msg_type == "!DIS":
+            logger_server.info(f"Disconnect message received.")
+            self._close()
+
+        # Replies (PCB, PCBGEN, PCBFPS, PCBEND, DIF, REP) are decoded here and routed to request callback
+        elif self.dispatcher.is_pending(request_id):
+            # Columnar payload is already decoded to dictionary by parser, end message has no data
+            self.received_reply.emit(request_id, msg_type, decode_message(msg_type, data_raw))
+
+        else:
+            logger_server.error(f"Unexpected message: {msg_type} (request {request_id})")
+
+    def on_connection_lost(self, exc):
+        """ Called in loop thread when connection is closed by peer, by abort or because of an error. """
+        if exc:
+            logger_server.info(f"Connection lost: {exc}")
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        self._fragments.clear()
+        if self.capture is not None:
+            self.capture.close()
+        remove_bulk_files(self.bulk_prefix)
+        dropped = self.dispatcher.cancel_all()
+        if dropped:
+            logger_server.warning(f"{dropped} requests left without reply")
         logger_server.info("Client disconnected, connection closed")
+        logger_server.info(f"Transfer statistics ({self.codec}):\n{self.stats.summary()}")
+        logger_server.info(f"Heartbeat {self.rtt.summary()}")
         self.finished.emit()
 
-    def send_message(self, msg: str, msg_type: str = "!DIS"):
+    def send_request(self, msg: str, msg_type: str, callback, final_types: tuple):
+        """
+        Send message and route replies with same request ID to callback.
+        :param msg: json encoded string
+        :param msg_type: str (REQPCB, REQDIF, DIF)
+        :param callback: function(msg_type: str, data), called in main thread
+        :param final_types: tuple of reply message types after which request is complete
+        :return: int (request ID)
+        """
+        request_id = self.dispatcher.register(callback, final_types)
+        self.send_message(msg, msg_type=msg_type, request_id=request_id)
+        return request_id
+
+    def send_message(self, msg: str, msg_type: str = "!DIS", request_id: int = NO_REQUEST):
         """
         Message can be type (by convention) of !DIS, REQ_PCB, REQ_DIF, PCB, DIF
         :param msg: json encoded string
         :param msg_type: str
+        :param request_id: int (sent in header, peer replies with same ID)
         :return:
         """
         logger_server.debug(f"Sending message {msg_type}_{msg}")
-        # Calculate length of first message
-        msg_length = len(msg)
-        send_length = str(msg_length)
-        # First message is type and length of second message
-        first_message = f"{msg_type}_{send_length}".encode(self.config.format)
-        # Pad first message
-        first_message += b' ' * (self.config.header - len(first_message))
-        # Send length and object
-        self._socket.send(first_message)
-        self._socket.send(msg.encode(self.config.format))
+        # Header is type, codec and length of (compressed) body
+        header, body = encode_frame(msg_type=msg_type,
+                                    data=msg.encode(self.config.format),
+                                    codec=self.codec,
+                                    threshold=self.config.compression_threshold,
+                                    stats=self.stats,
+                                    request_id=request_id,
+                                    bulk_threshold=self.bulk_threshold,
+                                    bulk_prefix=self.bulk_prefix)
+        # Transport is not thread safe: write is scheduled on loop. Header and body are sent with one scatter-gather
+        # call, TCP_NODELAY is set by asyncio.
+        self._event_loop.call(self._write_frame, header, body)
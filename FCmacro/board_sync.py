@@ -0,0 +1,155 @@
+"""
+    Module contains BoardSync class, which holds data model, session and connection of one KiCAD board.
+    FreeCADPlugin keeps one instance per board KIID, so several boards (KiCAD instances) are synced at once.
+"""
+import FreeCAD as App
+import FreeCADGui as Gui
+
+import logging
+import os
+
+from PySide import QtCore
+
+from API_scripts.part_scanner import FcPartScanner
+from API_scripts.part_drawer import FcPartDrawer
+from API_scripts.part_updater import FcPartUpdater
+from sync_sequence import SyncSequence
+
+DIRECTORY_PATH = os.path.dirname(os.path.realpath(__file__))
+
+logger = logging.getLogger("root")
+
+
+class BoardSync(SyncSequence, QtCore.QObject):
+    """
+    Sync sequence of one board (see SyncSequence), drawn in FreeCAD document. Signals of connection handler are
+    connected when board is attached, replies are routed to request callbacks in main thread.
+    :param kiid: str (board KIID, as sent by KiCAD in handshake)
+    :param config: ConfigLoader object
+    :param progress_bar: QProgressBar shared by all boards
+    """
+    # Emitted when board is connected, disconnected, starts or finishes syncing (plugin updates buttons and text)
+    status_changed = QtCore.Signal()
+
+    def __init__(self, kiid: str, config, progress_bar):
+        QtCore.QObject.__init__(self)
+        SyncSequence.__init__(self,
+                              kiid=kiid,
+                              config=config,
+                              part_scanner=FcPartScanner,
+                              part_updater=FcPartUpdater,
+                              progress_bar=progress_bar,
+                              log_directory=os.path.join(DIRECTORY_PATH, "Logs"))
+        self.existing_placement = None
+        # Drawer of board that is being received in chunks (streaming transfer)
+        self.pcb_drawer = None
+
+    def attach(self, connection, peer, doc, doc_gui):
+        """ 2. step: Connect signals of connection handler, then attach it (see SyncSequence.attach). """
+        # Finished signal
+        connection.finished.connect(connection.deleteLater)
+        connection.finished.connect(self.on_connection_handler_finished)
+        # Custom signals
+        connection.received_reply.connect(self.on_received_reply)
+        connection.rtt_updated.connect(self.on_rtt_updated)
+        super().attach(connection, peer, doc, doc_gui)
+
+    def attach_pcb(self, pcb_data: dict):
+        """ Remove existing board with same KIID, then attach data model. """
+        # Search FC document if Part object with same KIID as received pcb already exists (in case of opening
+        # a project with board already in it)
+        existing_part = self.find_board_part_by_kiid(doc=self.doc,
+                                                     kiid=pcb_data.get("general").get("kiid"))
+        if existing_part:
+            logger.info(f"Found a board {existing_part.Name} with same ID as in KiCAD")
+            # Store placement of existing part
+            self.existing_placement = existing_part.Placement
+            logger.warning("Removing existing board part")
+            # Delete existing part
+            self.doc.getObject(existing_part.Name).removeObjectsFromDocument()
+            self.doc.removeObject(existing_part.Name)
+        super().attach_pcb(pcb_data)
+
+    def draw_pcb(self):
+        """ 5. step: Draw part object when data model is received. """
+        # Drawer returns board part, so it can be moved to previous location if board with same is existed in document
+        board_part = self.create_pcb_drawer().run()
+
+        # Move newly drawn part to same placement where old part was (if part was already in document)
+        if self.existing_placement:
+            logger.warning(f"Moving redrawn board to same position.")
+            board_part.Placement = self.existing_placement
+
+        self.refresh_document()
+        Gui.SendMsgToActiveView("ViewFit")
+
+    def draw_board(self):
+        """ 5. step (streaming): Draw board outline as soon as general data and drawings are received. """
+        self.pcb_drawer = self.create_pcb_drawer()
+        board_part = self.pcb_drawer.draw_board()
+
+        if self.existing_placement:
+            logger.warning(f"Moving redrawn board to same position.")
+            board_part.Placement = self.existing_placement
+
+        self.refresh_document()
+        Gui.SendMsgToActiveView("ViewFit")
+        # Show board right away, without waiting for queued footprint batches
+        Gui.updateGui()
+
+    def draw_footprints(self, footprints: list):
+        """ 5. step (streaming): Add batch of footprints to already drawn board. """
+        self.pcb_drawer.add_footprints(footprints)
+        self.refresh_document()
+        Gui.updateGui()
+
+    def end_drawing(self):
+        self.pcb_drawer = None
+
+    def create_pcb_drawer(self) -> FcPartDrawer:
+        """ Instantiate Drawer of attached data model. """
+        return FcPartDrawer(doc=self.doc,
+                            doc_gui=self.doc_gui,
+                            pcb=self.pcb,
+                            models_path=self.models_path,
+                            progress_bar=self.progress_bar)
+
+    # ------------------------------------| Utils |--------------------------------------------- #
+
+    def notify_status(self):
+        self.status_changed.emit()
+
+    def observe_document(self, observe: bool):
+        """ Add or remove document observer (FreeCAD keeps calling observer until it is removed). """
+        if observe == self.observing:
+            return
+        if observe:
+            App.addDocumentObserver(self.document_changes)
+        else:
+            App.removeDocumentObserver(self.document_changes)
+        self.observing = observe
+
+    def board_part_exists(self, kiid: str) -> bool:
+        return self.find_board_part_by_kiid(doc=self.doc, kiid=kiid) is not None
+
+    @staticmethod
+    def find_board_part_by_kiid(doc: App.Document, kiid: str) -> App.Part:
+        """ Go through root level objects in document to find if board object with same KIID exists. """
+        board_part = None
+        for object_in_document in doc.RootObjects:
+            try:
+                if object_in_document.KIID == kiid:
+                    board_part = object_in_document
+            except AttributeError:
+                # Only objects created by this plugin have a .KIID attribute, default Part objects do not.
+                pass
+
+        return board_part
+
+    def refresh_document(self):
+        """ Recompute FreeCAD Document object. """
+        logger.info(f"Recomputing document")
+        try:
+            self.doc.recompute()
+        except Exception as e:
+            logger.exception(e)
@@ -1,8 +1,6 @@
 import FreeCAD as App
 import FreeCADGui as Gui
 
-import hashlib
-import json
 import logging
 import logging.config
 import os
@@ -10,11 +8,9 @@ import sys
 
 from PySide import QtGui, QtCore
 
-from API_scripts.part_scanner import FcPartScanner
-from API_scripts.part_drawer import FcPartDrawer
-from API_scripts.part_updater import FcPartUpdater
+from board_sync import BoardSync
 from Config.config_loader import ConfigLoader
-from Socket.server import Server, ConnectionHandler
+from Socket.server import ConnectionHandler, EventLoopThread, Server
 
 # Add plugin directory to path for imports to work
 DIRECTORY_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -42,9 +38,11 @@ class FreeCADPlugin(QtGui.QDockWidget):
         self.doc = doc
         self.doc_gui = doc_gui
 
-        self.pcb = {}
-        self.diff = {}
-        self.existing_placement = None
+        # Data model, session and connection of every board, by board KIID (kept when board disconnects)
+        self.boards = {}
+        # Single background thread for all socket operations (Server and ConnectionHandler)
+        self.event_loop = EventLoopThread()
+        self.event_loop.start()
 
         # Get config.ini file path
         config_file = os.path.join(DIRECTORY_PATH, "Config", "config.ini").replace("\\", "/")
@@ -66,9 +64,9 @@ class FreeCADPlugin(QtGui.QDockWidget):
         self.text_title.resize(250, BUTTON_HEIGHT)
 
         self.text_connection = QtGui.QLabel("", self)
-        # Move text more to the left to accommodate longer pcb name
-        self.text_connection.move(INITIAL_X - 10, INITIAL_Y)
-        self.text_connection.resize(210, BUTTON_HEIGHT)
+        # Below Sync button (server keeps listening while boards are connected), more to the left for longer names
+        self.text_connection.move(INITIAL_X - 10, INITIAL_Y + 2 * OFFSET_Y)
+        self.text_connection.resize(260, BUTTON_HEIGHT)
         self.text_connection.hide()
 
         # Buttons
@@ -98,6 +96,14 @@ class FreeCADPlugin(QtGui.QDockWidget):
         self.progress_bar.resize(BUTTON_WIDTH, BUTTON_HEIGHT)
         self.progress_bar.hide()
 
+    def closeEvent(self, event):
+        """ Plugin is closed: tear down every board (document observers and connections), then stop event loop. """
+        for board in self.boards.values():
+            board.close()
+        # Listening sockets and connections still open are closed by loop, thread is joined
+        self.event_loop.stop()
+        super().closeEvent(event)
+
     # --------------------------------- Button Methods --------------------------------- #
     def on_button_start_server(self):
         """ Call method on button press. """
@@ -115,22 +121,6 @@ class FreeCADPlugin(QtGui.QDockWidget):
 
     # --------------------------------- Hide/Show Buttons --------------------------------- #
 
-    def connected_buttons(self):
-        """ Change button visibility. """
-        self.text_connection.show()
-        self.button_stop_server.hide()
-        self.button_start_server.hide()
-
-    def disconnected_buttons(self):
-        """ Change large button text and visibility. """
-        self.text_connection.hide()
-        self.button_stop_server.setEnabled(False)
-        self.button_stop_server.hide()
-        self.button_start_server.setEnabled(True)
-        self.button_start_server.show()
-        # Disable buttons for requesting pcb or attaching pcb
-        self.button_sync.setEnabled(False)
-
     def server_closed_buttons(self):
         """ Disable stop and enable start when server is stopped. """
         self.button_start_server.setEnabled(True)
@@ -148,72 +138,71 @@ class FreeCADPlugin(QtGui.QDockWidget):
     # ---------------------------------| Sequential Process Methods |--------------------------------- #
 
     def start_server(self):
-        """ 1. step: Start server in a new thread. Thread is stopped and deleted when connection to client occurs. """
-        self.server_thread = QtCore.QThread()
-        self.server = Server(self.config)
-        self.server.moveToThread(self.server_thread)
+        """ 1. step: Start listening on event loop thread. Server accepts clients until it is stopped. """
+        self.server = Server(self.config, self.event_loop, board_kiids=self.find_board_kiids(self.doc))
 
         # Connect signals and slots
-        self.server_thread.started.connect(self.server.run)
-        self.server.finished.connect(self.server_thread.quit)
         self.server.finished.connect(self.server.deleteLater)
-        self.server_thread.finished.connect(self.server_thread.deleteLater)
-        # Connect finished signal to startConnection method - this passes socket.socket object to ConnectionHandler
         self.server.finished.connect(self.on_server_finished)
+        # Every connected client passes its protocol object to ConnectionHandler
+        self.server.client_connected.connect(self.on_client_connected)
 
-        # Start the thread
-        self.server_thread.start()
+        # Start listening
+        self.server.start()
         # Enable stop button and disable start when starting server
         self.server_start_buttons()
 
     def on_server_finished(self, server_response):
-        """ 2. step: Attach socket objects to self. """
+        """ Listening stopped: server was aborted or failed to start. Connected boards stay connected. """
         # Get data from dictionary type
         status = server_response.get("status")
 
-        # Perform check if connection is real or fake (quasi-abort) see Server class docstring
         if status == "abort":
-            logger.debug("Server aborted, ignoring connection socket")
-            # Show correct button configuration - server was aborted, enable button for starting server again
-            self.server_closed_buttons()
-
+            logger.debug("Server aborted")
         elif status == "exception":
             logger.error(f"Exception when starting server")
+        # Show correct button configuration - enable button for starting server again
+        self.server_closed_buttons()
 
-        elif status == "client_connected":
-            # Get data from dictionary type
-            connection_socket = server_response.get("connection_socket")
-            # Attach connection handle (socket) to class, so that a message can be sent manually by button (sendMessage)
-            self.socket = connection_socket
-            # Change button visibility
-            self.connected_buttons()
-            # Change button text
-            self.text_connection.setText(f"Connected: {self.socket}")
-            logger.debug("Client connected.")
-
-            # Run ConnectionHandler in a new thread to listen for replies
-            self.connection_thread = QtCore.QThread()
-            # Instantiate Connection class with client connection Socket
-            self.connection = ConnectionHandler(self.socket, self.config)
-            self.connection.moveToThread(self.connection_thread)
-            # Finished signal
-            self.connection_thread.started.connect(self.connection.run)
-            self.connection.finished.connect(self.connection_thread.quit)
-            self.connection.finished.connect(self.connection.deleteLater)
-            self.connection_thread.finished.connect(self.connection_thread.deleteLater)
-            self.connection.finished.connect(self.on_connection_handler_finished)
-            # Custom signals
-            self.connection.received_pcb.connect(self.on_received_pcb)
-            self.connection.received_diff.connect(self.on_received_diff)
-            self.connection.received_diff_reply.connect(self.on_received_diff_reply)
-            # Start thread
-            self.connection_thread.start()
-
-            # Enable Sync button.
-            self.button_sync.setEnabled(True)
+    def on_client_connected(self, server_response):
+        """ 2. step: Attach connection of new client to board with same KIID (new board if KIID is not known yet). """
+        protocol = server_response.get("protocol")
+        # Clients which don't send board KIID are treated as separate boards
+        kiid = protocol.board_kiid or f"peer-{server_response.get('peer')}"
+
+        board = self.boards.get(kiid)
+        if board and board.connection:
+            logger.error(f"Board {kiid} is already connected, refusing second connection")
+            self.event_loop.call(protocol.transport.close)
+            return
+        if board is None:
+            board = BoardSync(kiid=kiid, config=self.config, progress_bar=self.progress_bar)
+            board.status_changed.connect(self.update_status)
+            self.boards[kiid] = board
+        logger.debug(f"Client connected: board {kiid}")
+
+        # Instantiate Connection class with client connection (frames are received on event loop thread)
+        connection = ConnectionHandler(protocol=protocol,
+                                       config=self.config,
+                                       event_loop=self.event_loop,
+                                       params=server_response.get("params"))
+        board.attach(connection, peer=server_response.get("peer"), doc=self.doc, doc_gui=self.doc_gui)
+        self.update_status()
+
+    def update_status(self):
+        """ Show connected boards, enable Sync button if any connected board is not syncing. """
+        # Round trip time tells network latency apart from scan/update time
+        connected = [board.name + (f" ({board.rtt * 1000:.1f} ms)" if board.rtt is not None else "")
+                     for board in self.boards.values() if board.connection]
+        if connected:
+            self.text_connection.setText(f"Connected: {', '.join(connected)}")
+            self.text_connection.show()
+        else:
+            self.text_connection.hide()
+        self.button_sync.setEnabled(any(board.ready for board in self.boards.values()))
 
     def start_sync_sequence(self):
-        """ 3. step: check if plugin instance has a pcb data-model attached (skip to step 6). """
+        """ 3. step: Start sync sequence of every connected board that is not syncing already. """
         # First check if document was not closed while the plugin was open.
         #  When plugin is started, the active document reference is passed to it.
         #  If document is closed while using the plugin (by user), the document reference is invalid.
@@ -230,247 +219,24 @@ class FreeCADPlugin(QtGui.QDockWidget):
             self.doc = App.newDocument()
             self.doc_gui = Gui.ActiveDocument
 
-        if not self.pcb:
-            logger.info(f"Data-model not attached, requesting Pcb")
-            self.request_pcb()
-        else:
-            logger.info(f"Data-model attached, requesting Diff")
-            self.request_diff()
-
-    def request_pcb(self):
-        """ 4. step: send a request message over socket, listen for reply in a new thread. """
-        # Send message to request pcb from KiCAD
-        self.connection.send_message("blankmessage", msg_type="REQPCB")
-
-    def on_received_pcb(self, pcb_data: dict):
-        """ 5. step: Draw part object when data model is received. """
-        # Search FC document if Part object with same KIID as received pcb already exists (in case of opening
-        # a project with board already in it)
-        existing_part = self.find_board_part_by_kiid(doc=self.doc,
-                                                     kiid=pcb_data.get("general").get("kiid"))
-        if existing_part:
-            logger.info(f"Found a board {existing_part.Name} with same ID as in KiCAD")
-            # Store placement of existing part
-            self.existing_placement = existing_part.Placement
-            logger.warning("Removing existing board part")
-            # Delete existing part
-            self.doc.getObject(existing_part.Name).removeObjectsFromDocument()
-            self.doc.removeObject(existing_part.Name)
-
-        # Attach dictionary to object
-        self.pcb = pcb_data
-        # Write data model to file for debugging purposes
-        self.dump_to_json_file(self.pcb, "/Logs/data_indent.json")
-        # Change button text to indicate registered pcb data-model
-        self.text_connection.setText(f"Connected: {self.pcb.get('general').get('pcb_name')}")
-
-        # Add file directory to models path so that .kicad_pcb file directory is also searched when importing 3d models
-        self.config.models_path.update({"file_directory": self.pcb.get("general").get("file_directory")})
-
-        # Instantiate and run Drawer
-        pcb_drawer = FcPartDrawer(doc=self.doc,
-                                  doc_gui=self.doc_gui,
-                                  pcb=self.pcb,
-                                  models_path=self.config.models_path,
-                                  progress_bar=self.progress_bar)
-        # Drawer returns board part, so it can be moved to previous location if board with same is existed in document
-        board_part = pcb_drawer.run()
-
-        # Move newly drawn part to same placement where old part was (if part was already in document)
-        if self.existing_placement:
-            logger.warning(f"Moving redrawn board to same position.")
-            board_part.Placement = self.existing_placement
-
-        self.refresh_document()
-        Gui.SendMsgToActiveView("ViewFit")
-
-    def request_diff(self):
-        """ 6. step: Send request message when user presses SYNC button. """
-        # Change button text to indicate registered pcb data-model
-        self.text_connection.setText(f"Connected: {self.pcb.get('general').get('pcb_name')}")
-        logger.info("Sending request message.")
-        # Send request message
-        self.connection.send_message("blankmessage", msg_type="REQDIF")
-
-    def on_received_diff(self, diff_data: dict):
-        """ 7. step: start PartScanner to get local Diff, merge local diff and KiCAD diff """
-        # Attach received data to object
-        self.kc_diff = diff_data
-
-        # Instantiate and call PartScanner to get local Diff
-        part_scanner = FcPartScanner(doc=self.doc,
-                                     pcb=self.pcb,
-                                     diff=self.diff,
-                                     config=self.config,
-                                     progress_bar=self.progress_bar)
-        local_diff = part_scanner.run()
-        # Nonetype return if Exception is caught in scanner (can also be empty dict - explicit check)
-        if local_diff is None:
-            # Send disconnect message
-            self.connection.send_message(json.dumps("!DIS"))
-            # Abort connection handler by calling the stop method to break listening loop
-            self.connection.abort()
-
-        # ------------------| Diff merge |------------------
-        logger.info(f"PartScanner finished {local_diff}")
-        merged_diff = {}
-
-        # Select which drawings diff to use:
-        fc_drawings = local_diff.get("drawings")
-        kc_drawings = self.kc_diff.get("drawings")
-        # If only one instance of drawings (logical XOR): use that instance
-        if (fc_drawings and not kc_drawings) or (kc_drawings and not fc_drawings):
-            merged_diff.update({"drawings": fc_drawings if fc_drawings else kc_drawings})
-        # Conflict case (both diffs have drawings)
-        elif fc_drawings and kc_drawings:
-            # FC drawing is a base for merge
-            merged_drawings = fc_drawings
-            # Drawings that were added by user in KC should be deleted when syncing: add their KIIDs to "removed"
-            # key of diff, to be deleted when sending merged diff back
-            added_in_kc = kc_drawings.get("added")
-            if added_in_kc:
-                merged_drawings.update({"removed": [drawing.get("kiid") for drawing in added_in_kc]})
-            merged_diff.update({"drawings": merged_drawings})
-
-        # Select which footprints diff to use:
-        fc_footprints = local_diff.get("footprints")
-        kc_footprints = self.kc_diff.get("footprints")
-        fc_footprints_changed = None
-        kc_footprints_changed = None
-        # First check if diff exist (if non-type it crashed)
-        if fc_footprints is not None:
-            fc_footprints_changed = fc_footprints.get("changed")
-        if kc_footprints is not None:
-            kc_footprints_changed = kc_footprints.get("changed")
-
-        # Initialise empty list to build merged diff
-        footprints_merged_changed = []
-
-        if fc_footprints_changed:
-            # Walk list of fc diff: if conflict append kc diff to merged list, otherwise append fc diff to merged list
-            for fc_fp in fc_footprints_changed:
-                # Entry in changed is a dictionary with single key value pair where key is kiid
-                fc_kiid = list(fc_fp.keys())[0]
-                if kc_footprints_changed:
-                    for kc_fp in kc_footprints_changed:
-                        kc_kiid = list(kc_fp.keys())[0]
-                        # If entry with same kiid exists in kicad diffs, apply this entry and break
-                        if fc_kiid == kc_kiid:
-                            footprints_merged_changed.append(kc_fp)
-                            break
-
-                # No conflicts with kc, append fc diff to list
-                footprints_merged_changed.append(fc_fp)
-
-        if kc_footprints_changed:
-            # Add all kicad entries to merged diff after appending kc entries
-            for kc_fp in kc_footprints_changed:
-                footprints_merged_changed.append(kc_fp)
-
-        # Add merged fp diff if not empty list
-        if footprints_merged_changed:
-            logger.debug(f"Merged diff {footprints_merged_changed}")
-            # Add key if missing from dictionary
-            if merged_diff.get("footprints") is None:
-                merged_diff.update({"footprints": {}})
-            # Add key if missing from dictionary, add merged diff
-            if merged_diff["footprints"].get("changed") is None:
-                merged_diff["footprints"].update({"changed": footprints_merged_changed})
-
-        logger.info(f"Diff merged: {merged_diff}")
-        self.dump_to_json_file(merged_diff, "/Logs/diff.json")
-        # Attach diff to object
-        self.diff = merged_diff
-        # Send new diff to KiCAD
-        self.connection.send_message(json.dumps(merged_diff), msg_type="DIF")
-
-    def on_received_diff_reply(self, diff_reply, hash_data):
-        """
-        8. step: apply diff. diff_reply contains merged diff which was sent to FC before and also updated KIID
-        if new drawings were added in FC.
-        Hash data is hashed KC data model used to check sync on FC side after updating.
-        """
-        # Attach received values to object
-        self.diff = diff_reply
-        self.kc_hash = hash_data
-        logger.info(f"Received reply: {self.diff},\nHash: {hash_data}")
-        self.dump_to_json_file(self.diff, "/Logs/diff.json")
-
-        if self.diff:
-            # # Update FC Part objects
-            # self.start_part_updater(self.diff)
-
-            # Instantiate and run part updater
-            part_updater = FcPartUpdater(doc=self.doc,
-                                         pcb=self.pcb,
-                                         diff=self.diff,
-                                         models_path=self.config.models_path,
-                                         progress_bar=self.progress_bar)
-            status = part_updater.run()
-            # Nonetype return value means exception was caught in updater (can also be empty dict - explicit check)
-            if status is None:
-                # Send disconnect message
-                self.connection.send_message(json.dumps("!DIS"))
-                # Abort connection handler by calling the stop method to break listening loop
-                self.connection.abort()
-
-        logger.info(f"Finished part updater")
-        self.refresh_document()
-
-        # Write data model to file for debugging purposes
-        self.dump_to_json_file(self.pcb, "/Logs/data_indent.json")
-
-        pcb_hash = hashlib.md5(str(self.pcb).encode()).hexdigest()
-        if pcb_hash == self.kc_hash:
-            logger.info(f"Hash match!")
-            logger.debug(f"Clearing Diff")
-            self.diff = {}
-        else:
-            logger.error(f"Hash mismatch!\n{pcb_hash} should be {self.kc_hash}")
-            logger.debug(f"Clearing data-model")
-            # Send disconnect message
-            self.connection.send_message(json.dumps("!DIS"))
-            # Abort connection handler by calling the stop method to break listening loop
-            self.connection.abort()
-
-    # noinspection PyUnusedLocal
-    def on_connection_handler_finished(self):
-        """
-        9: step: Remove data model from plugin instance when disconnecting:
-        this way reconnection after disconnection is treated the same as connection for the first time
-        (board part is redrawn)
-        """
-        # Clear data-model. This causes pcb to be redrawn
-        self.pcb = {}
-        # Change button visibility
-        self.disconnected_buttons()
+        # Boards sync independently: replies are handled as they arrive, in any order
+        for board in list(self.boards.values()):
+            if board.ready:
+                board.start_sync_sequence(self.doc, self.doc_gui)
 
     # ------------------------------------| Utils |--------------------------------------------- #
 
     @staticmethod
-    def find_board_part_by_kiid(doc: App.Document, kiid: str) -> App.Part:
-        """ Go through root level objects in document to find if board object with same KIID exists. """
-        board_part = None
-        for object_in_document in doc.RootObjects:
-            try:
-                if object_in_document.KIID == kiid:
-                    board_part = object_in_document
-            except AttributeError:
-                # Only objects created by this plugin have a .KIID attribute, default Part objects do not.
-                pass
-
-        return board_part
-
-    def refresh_document(self):
-        """ Recompute FreeCAD Document object. """
-        logger.info(f"Recomputing document")
+    def find_board_kiids(doc: App.Document) -> list:
+        """ Return KIIDs of all boards in document (used for Unix domain socket paths). """
+        kiids = []
         try:
-            self.doc.recompute()
-        except Exception as e:
-            logger.exception(e)
-
-    @staticmethod
-    def dump_to_json_file(data, filename: str):
-        """ Save data to file. """
-        with open(DIRECTORY_PATH + filename, "w") as f:
-            json.dump(data, f, indent=4)
+            for object_in_document in doc.RootObjects:
+                # Only objects created by this plugin have a .KIID attribute
+                kiid = getattr(object_in_document, "KIID", None)
+                if kiid:
+                    kiids.append(kiid)
+        except (AttributeError, ReferenceError):
+            # Document was closed
+            pass
+        return kiids
@@ -0,0 +1,600 @@
+"""
+    Module contains SyncSequence class, sync logic of one KiCAD board on FreeCAD side: requests, diff merge, session
+    resume and resync. It doesn't use FreeCAD or PySide directly: document is accessed through part scanner and updater
+    classes and methods which BoardSync overrides (drawing, document observer), so sequence can also be run with
+    stand-ins (see Benchmarks/replay.py).
+"""
+import json
+import logging
+import os
+
+from Socket.fingerprint import ModelFingerprint
+
+logger = logging.getLogger("root")
+
+
+class DocumentChangeCounter:
+    """
+    FreeCAD document observer which counts created, changed and deleted objects. Count is compared with count at the
+    time data model was last scanned or updated, so document isn't scanned if nothing changed since.
+    Objects of all documents are counted (also other boards), which can only cause an unnecessary scan.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    # noinspection PyPep8Naming,PyUnusedLocal
+    def slotCreatedObject(self, obj):
+        self.count += 1
+
+    # noinspection PyPep8Naming,PyUnusedLocal
+    def slotDeletedObject(self, obj):
+        self.count += 1
+
+    # noinspection PyPep8Naming,PyUnusedLocal
+    def slotChangedObject(self, obj, prop):
+        self.count += 1
+
+
+class SyncSequence:
+    """
+    Sync sequence of one board. Every request has its own callback, so replies of other boards (connections) are
+    never mixed with replies of this board and a board waiting for a slow KiCAD instance doesn't hold up the others.
+    Data model and session are kept when connection is closed, so board can be resumed when same KiCAD board
+    reconnects (see attach).
+    :param kiid: str (board KIID, as sent by KiCAD in handshake)
+    :param config: ConfigLoader object
+    :param part_scanner: FcPartScanner class (instantiated for every scan)
+    :param part_updater: FcPartUpdater class (instantiated for every update)
+    :param progress_bar: QProgressBar shared by all boards (passed to scanner and updater)
+    :param log_directory: str (data model and diff are written there for debugging, None: not written)
+    """
+
+    def __init__(self, kiid: str, config, part_scanner, part_updater, progress_bar=None, log_directory: str = None):
+        self.kiid = kiid
+        self.config = config
+        self.part_scanner = part_scanner
+        self.part_updater = part_updater
+        self.progress_bar = progress_bar
+        self.log_directory = log_directory
+        self.doc = None
+        self.doc_gui = None
+        self.peer = None
+
+        self.pcb = {}
+        self.diff = {}
+        self.kc_diff = {}
+        self.kc_hash = None
+        # Merkle hash of data model, compared with KiCAD hash after every sync (only changed entries are rehashed)
+        self.fingerprint = ModelFingerprint()
+        # Document changes and their count when data model was last scanned or updated (None: document has to be
+        # scanned). Observer is registered while board is connected (see observe_document)
+        self.document_changes = DocumentChangeCounter()
+        self.observing = False
+        self.scanned_changes = None
+        # Sync session (assigned by KiCAD when data model is sent) and number of syncs completed in session.
+        # Data model is kept when disconnected, so session can be resumed without redrawing the board.
+        self.session_id = None
+        self.version = 0
+        # KiCAD version this side will be at when running resync is finished
+        self.resync_version = 0
+        # Board is being received in chunks (streaming transfer)
+        self.receiving_pcb = False
+        self.connection = None
+        # True while sync sequence (or session resume) is in progress
+        self.busy = False
+        # Round trip time of last heartbeat in seconds (network latency, without scan/update time)
+        self.rtt = None
+
+    @property
+    def name(self) -> str:
+        """ Name of pcb if data model is attached, otherwise peer address. """
+        if self.pcb.get("general"):
+            return self.pcb.get("general").get("pcb_name")
+        return str(self.peer)
+
+    @property
+    def document_changed(self) -> bool:
+        """ Document was modified since data model was last scanned or updated (or local diff is pending). """
+        return bool(self.diff) or self.scanned_changes != self.document_changes.count
+
+    @property
+    def ready(self) -> bool:
+        """ Board is connected and sync can be started. """
+        return self.connection is not None and not self.busy
+
+    @property
+    def models_path(self) -> dict:
+        """
+        Configured 3D model directories and .kicad_pcb file directory (so that it is also searched when importing
+        3d models). Copied for every board, since boards are in different directories.
+        """
+        models_path = dict(self.config.models_path)
+        if self.pcb.get("general"):
+            models_path.update({"file_directory": self.pcb.get("general").get("file_directory")})
+        return models_path
+
+    def set_busy(self, busy: bool):
+        self.busy = busy
+        self.notify_status()
+
+    def attach(self, connection, peer, doc, doc_gui):
+        """ 2. step: Attach connection handler of (re)connected KiCAD instance, resume session if possible. """
+        self.connection = connection
+        self.peer = peer
+        self.doc = doc
+        self.doc_gui = doc_gui
+        self.observe_document(True)
+
+        if self.pcb and self.session_id:
+            self.resume_session()
+        else:
+            self.invalidate_session()
+            self.set_busy(False)
+
+    def on_rtt_updated(self, rtt: float):
+        self.rtt = rtt
+        self.notify_status()
+
+    def disconnect(self):
+        """ Send disconnect message and close connection (pending outgoing data is sent first). """
+        self.connection.send_message(json.dumps("!DIS"))
+        # Abort connection handler by calling the stop method to break listening loop
+        self.connection.abort()
+
+    def resume_session(self):
+        """ 2.a step: Send own session and version to KiCAD, reply contains diffs applied since that version. """
+        logger.info(f"Resuming session {self.session_id} at version {self.version}")
+        self.set_busy(True)
+        self.connection.send_request(json.dumps({"id": self.session_id, "version": self.version}),
+                                     msg_type="REQSES",
+                                     callback=self.on_session_resume_reply,
+                                     final_types=("SES",))
+
+    # noinspection PyUnusedLocal
+    def on_session_resume_reply(self, msg_type: str, session: dict):
+        """
+        Apply diffs which KiCAD applied after this side was disconnected. If KiCAD has another session (e.g. plugin
+        was restarted) or doesn't have all diffs since own version, data model is discarded and board is redrawn
+        on next sync.
+        """
+        entries = session.get("entries")
+        board_part_exists = self.board_part_exists(self.pcb.get("general").get("kiid"))
+        if session.get("id") != self.session_id or entries is None or not board_part_exists:
+            logger.warning(f"Session can't be resumed (KiCAD: {session.get('id')}, version {session.get('version')}),"
+                           f" board will be redrawn")
+            self.invalidate_session()
+        else:
+            for entry in entries:
+                # Resync brings data model to current KiCAD version
+                if not self.apply_diff_reply(entry.get("diff"), entry.get("hash"), session.get("version")):
+                    return
+                self.version = entry.get("version")
+            logger.info(f"Session resumed at version {self.version} ({len(entries)} missed syncs applied)")
+        self.set_busy(False)
+
+    def adopt_session(self):
+        """ Ask KiCAD for ID of session started by sending data model. """
+        self.connection.send_request(json.dumps({"id": None, "version": 0}),
+                                     msg_type="REQSES",
+                                     callback=self.on_session_adopt_reply,
+                                     final_types=("SES",))
+
+    # noinspection PyUnusedLocal
+    def on_session_adopt_reply(self, msg_type: str, session: dict):
+        """ Store session ID and version of data model received from KiCAD. """
+        self.session_id = session.get("id")
+        self.version = session.get("version")
+        logger.info(f"Session {self.session_id} started at version {self.version}")
+
+    def invalidate_session(self):
+        """ Discard data model and session: board is redrawn on next sync. """
+        self.pcb = {}
+        self.scanned_changes = None
+        self.session_id = None
+        self.version = 0
+
+    def start_sync_sequence(self, doc, doc_gui):
+        """ 3. step: check if board has a pcb data-model attached (skip to step 6). """
+        self.doc = doc
+        self.doc_gui = doc_gui
+        self.set_busy(True)
+        if not self.pcb:
+            logger.info(f"[{self.kiid}] Data-model not attached, requesting Pcb")
+            self.request_pcb()
+        else:
+            logger.info(f"[{self.kiid}] Data-model attached, requesting Diff")
+            self.request_diff()
+
+    def request_pcb(self):
+        """ 4. step: send a request message, reply is routed to on_pcb_reply. """
+        # Send message to request pcb from KiCAD. Reply is either one PCB message, or a stream ending with PCBEND
+        self.connection.send_request("blankmessage",
+                                     msg_type="REQPCB",
+                                     callback=self.on_pcb_reply,
+                                     final_types=("PCB", "PCBEND"))
+
+    def on_received_reply(self, request_id: int, msg_type: str, data):
+        """ Route reply received by ConnectionHandler to callback of matching request. """
+        if self.connection:
+            self.connection.dispatcher.dispatch(request_id, msg_type, data)
+
+    def on_pcb_reply(self, msg_type: str, data):
+        """ Callback of PCB request: whole data model or parts of streamed data model. """
+        if msg_type == "PCB":
+            self.on_received_pcb(data)
+        elif msg_type == "PCBGEN":
+            self.on_received_pcb_general(data)
+        elif msg_type == "PCBFPS":
+            self.on_received_footprints(data.get("footprints"))
+        elif msg_type == "PCBEND":
+            self.on_received_pcb_end()
+
+    def on_received_pcb(self, pcb_data: dict):
+        """ 5. step: Draw part object when data model is received. """
+        self.attach_pcb(pcb_data)
+        self.draw_pcb()
+        self.scanned_changes = self.document_changes.count
+        self.adopt_session()
+        self.set_busy(False)
+
+    def on_received_pcb_general(self, pcb_data: dict):
+        """
+        5. step (streaming): Draw board outline as soon as general data and drawings are received.
+        Footprints list in data model is empty and gets filled by on_received_footprints.
+        """
+        self.attach_pcb(pcb_data)
+        self.receiving_pcb = True
+        self.draw_board()
+
+    def on_received_footprints(self, footprints: list):
+        """ 5. step (streaming): Add batch of footprints to data model and to already drawn board. """
+        if not self.receiving_pcb:
+            logger.error(f"Footprints received before board, ignoring {len(footprints)} footprints")
+            return
+        self.pcb["footprints"].extend(footprints)
+        self.draw_footprints(footprints)
+
+    def on_received_pcb_end(self):
+        """ 5. step (streaming): All footprints were received, data model is complete. """
+        self.receiving_pcb = False
+        self.end_drawing()
+        self.scanned_changes = self.document_changes.count
+        # Write data model to file for debugging purposes
+        self.dump_to_json_file(self.pcb, "data_indent.json")
+        logger.info(f"Board drawn: {len(self.pcb.get('footprints'))} footprints")
+        self.adopt_session()
+        self.set_busy(False)
+
+    def attach_pcb(self, pcb_data: dict):
+        """ Attach received data model (drawn by draw_pcb, or by draw_board and draw_footprints if streamed). """
+        self.pcb = pcb_data
+        # Write data model to file for debugging purposes
+        self.dump_to_json_file(self.pcb, "data_indent.json")
+        # Plugin shows name of pcb
+        self.notify_status()
+
+    def request_diff(self):
+        """
+        6. step: Send request message when user presses SYNC button. If document wasn't modified since data model was
+        last scanned or updated, request carries hash of data model: KiCAD replies with empty diff reply (REP) right
+        away if it has no changes either, otherwise with its diff (DIF).
+        """
+        logger.info("Sending request message.")
+        request = {} if self.document_changed else {"hash": self.fingerprint.root(self.pcb)}
+        # Send request message
+        self.connection.send_request(json.dumps(request),
+                                     msg_type="REQDIF",
+                                     callback=self.on_received_diff,
+                                     final_types=("DIF", "REP"))
+
+    def on_received_diff(self, msg_type: str, diff_data: dict):
+        """ 7. step: start PartScanner to get local Diff, merge local diff and KiCAD diff """
+        if msg_type == "REP":
+            self.on_received_no_changes(diff_data)
+            return
+        # Attach received data to object
+        self.kc_diff = diff_data
+
+        if self.document_changed:
+            # Instantiate and call PartScanner to get local Diff
+            part_scanner = self.part_scanner(doc=self.doc,
+                                             pcb=self.pcb,
+                                             diff=self.diff,
+                                             config=self.config,
+                                             progress_bar=self.progress_bar)
+            local_diff = part_scanner.run()
+            self.scanned_changes = self.document_changes.count
+        else:
+            logger.info("Document not modified since last sync, skipping PartScanner")
+            local_diff = {}
+        # Nonetype return if Exception is caught in scanner (can also be empty dict - explicit check)
+        if local_diff is None:
+            self.invalidate_session()
+            self.disconnect()
+            return
+        # Scanner applies local changes to data model
+        self.fingerprint.touch(local_diff)
+
+        # ------------------| Diff merge |------------------
+        logger.info(f"PartScanner finished {local_diff}")
+        merged_diff = {}
+
+        # Select which drawings diff to use:
+        fc_drawings = local_diff.get("drawings")
+        kc_drawings = self.kc_diff.get("drawings")
+        # If only one instance of drawings (logical XOR): use that instance
+        if (fc_drawings and not kc_drawings) or (kc_drawings and not fc_drawings):
+            merged_diff.update({"drawings": fc_drawings if fc_drawings else kc_drawings})
+        # Conflict case (both diffs have drawings)
+        elif fc_drawings and kc_drawings:
+            # FC drawing is a base for merge
+            merged_drawings = fc_drawings
+            # Drawings that were added by user in KC should be deleted when syncing: add their KIIDs to "removed"
+            # key of diff, to be deleted when sending merged diff back
+            added_in_kc = kc_drawings.get("added")
+            if added_in_kc:
+                merged_drawings.update({"removed": [drawing.get("kiid") for drawing in added_in_kc]})
+            merged_diff.update({"drawings": merged_drawings})
+
+        # Select which footprints diff to use:
+        fc_footprints = local_diff.get("footprints")
+        kc_footprints = self.kc_diff.get("footprints")
+        fc_footprints_changed = None
+        kc_footprints_changed = None
+        # First check if diff exist (if non-type it crashed)
+        if fc_footprints is not None:
+            fc_footprints_changed = fc_footprints.get("changed")
+        if kc_footprints is not None:
+            kc_footprints_changed = kc_footprints.get("changed")
+
+        # Initialise empty list to build merged diff
+        footprints_merged_changed = []
+
+        if fc_footprints_changed:
+            # Walk list of fc diff: if conflict append kc diff to merged list, otherwise append fc diff to merged list
+            for fc_fp in fc_footprints_changed:
+                # Entry in changed is a dictionary with single key value pair where key is kiid
+                fc_kiid = list(fc_fp.keys())[0]
+                if kc_footprints_changed:
+                    for kc_fp in kc_footprints_changed:
+                        kc_kiid = list(kc_fp.keys())[0]
+                        # If entry with same kiid exists in kicad diffs, apply this entry and break
+                        if fc_kiid == kc_kiid:
+                            footprints_merged_changed.append(kc_fp)
+                            break
+
+                # No conflicts with kc, append fc diff to list
+                footprints_merged_changed.append(fc_fp)
+
+        if kc_footprints_changed:
+            # Add all kicad entries to merged diff after appending kc entries
+            for kc_fp in kc_footprints_changed:
+                footprints_merged_changed.append(kc_fp)
+
+        # Add merged fp diff if not empty list
+        if footprints_merged_changed:
+            logger.debug(f"Merged diff {footprints_merged_changed}")
+            # Add key if missing from dictionary
+            if merged_diff.get("footprints") is None:
+                merged_diff.update({"footprints": {}})
+            # Add key if missing from dictionary, add merged diff
+            if merged_diff["footprints"].get("changed") is None:
+                merged_diff["footprints"].update({"changed": footprints_merged_changed})
+
+        logger.info(f"Diff merged: {merged_diff}")
+        self.dump_to_json_file(merged_diff, "diff.json")
+        # Attach diff to object
+        self.diff = merged_diff
+        # Send new diff to KiCAD, reply contains diff (with valid KIIDs of new drawings) and hash of KC data model
+        self.connection.send_request(json.dumps(merged_diff),
+                                     msg_type="DIF",
+                                     callback=self.on_received_diff_reply,
+                                     final_types=("REP",))
+
+    def on_received_no_changes(self, reply: dict):
+        """ 7.a step: Neither side has changes, KiCAD replied with hash of its data model only (version stays same). """
+        pcb_hash = self.fingerprint.root(self.pcb)
+        if pcb_hash != reply.get("hash"):
+            logger.error(f"Hash mismatch!\n{pcb_hash} should be {reply.get('hash')}")
+            self.start_resync(self.version)
+            return
+        logger.info(f"No changes, data models are in sync")
+        self.set_busy(False)
+
+    # noinspection PyUnusedLocal
+    def on_received_diff_reply(self, msg_type: str, reply: dict):
+        """
+        8. step: apply diff. Reply contains merged diff which was sent to FC before and also updated KIID
+        if new drawings were added in FC.
+        Hash is hashed KC data model used to check sync on FC side after updating.
+        """
+        if self.apply_diff_reply(reply.get("diff"), reply.get("hash"), self.version + 1):
+            self.version += 1
+            self.set_busy(False)
+
+    def apply_diff_reply(self, diff_reply: dict, hash_data: str, version: int) -> bool:
+        """
+        Update FC Part objects and data model with diff, check hash of data model.
+        Disconnect if updating fails, start resync if hashes don't match.
+        :param version: int (KiCAD version after this diff, this side is at that version when resync is finished)
+        :return: bool (True if data models are in sync)
+        """
+        # Changes made by updater are in data model already: document needs scanning on next sync only if it was
+        # modified after last scan (e.g. while KC was updating)
+        scanned = self.scanned_changes == self.document_changes.count
+        # Attach received values to object
+        self.diff = diff_reply
+        self.kc_hash = hash_data
+        logger.info(f"Received reply: {self.diff},\nHash: {hash_data}")
+        self.dump_to_json_file(self.diff, "diff.json")
+
+        if self.diff:
+            # Instantiate and run part updater
+            part_updater = self.part_updater(doc=self.doc,
+                                             pcb=self.pcb,
+                                             diff=self.diff,
+                                             models_path=self.models_path,
+                                             progress_bar=self.progress_bar)
+            status = part_updater.run()
+            self.fingerprint.touch(self.diff)
+            # Nonetype return value means exception was caught in updater (can also be empty dict - explicit check)
+            if status is None:
+                self.invalidate_session()
+                self.disconnect()
+                return False
+
+        logger.info(f"Finished part updater")
+        self.refresh_document()
+        if scanned:
+            self.scanned_changes = self.document_changes.count
+
+        # Write data model to file for debugging purposes
+        self.dump_to_json_file(self.pcb, "data_indent.json")
+
+        pcb_hash = self.fingerprint.root(self.pcb)
+        if pcb_hash == self.kc_hash:
+            logger.info(f"Hash match!")
+            logger.debug(f"Clearing Diff")
+            self.diff = {}
+            return True
+
+        logger.error(f"Hash mismatch!\n{pcb_hash} should be {self.kc_hash}")
+        self.start_resync(version)
+        return False
+
+    def start_resync(self, version: int):
+        """
+        8.a step: Data models diverged. Compare hash tree with KiCAD level by level and re-apply only entries
+        that differ (see Socket/fingerprint.py), instead of redrawing the board.
+        """
+        logger.info(f"Starting resync to version {version}")
+        self.resync_version = version
+        self.request_resync({"level": "sections"})
+
+    def request_resync(self, request: dict):
+        self.connection.send_request(json.dumps(request),
+                                     msg_type="REQSYN",
+                                     callback=self.on_resync_reply,
+                                     final_types=("SYN",))
+
+    # noinspection PyUnusedLocal
+    def on_resync_reply(self, msg_type: str, reply: dict):
+        """ Request next level of hash tree (only divergent nodes), apply entries when they are received. """
+        logger.debug(f"Resync reply: {reply.get('level')}")
+        if reply.get("level") == "error":
+            logger.error(f"KiCAD failed to answer resync request, clearing data-model")
+            self.invalidate_session()
+            self.disconnect()
+            return
+        request = self.fingerprint.resync_request(self.pcb, reply)
+        if request:
+            self.request_resync(request)
+        elif self.apply_resync(reply):
+            self.version = self.resync_version
+            self.set_busy(False)
+
+    def apply_resync(self, reply: dict) -> bool:
+        """
+        Apply KiCAD entries which differ from own data model. Updater redraws changed, added and removed footprints
+        and drawings, then entries are copied to data model exactly as they are in KiCAD.
+        Disconnect and discard data model if data models still don't match.
+        :return: bool (True if data models are in sync)
+        """
+        # Board is named by pcb ID and extruded by thickness from general data: redraw if it changed
+        if reply.get("general") != self.pcb.get("general"):
+            logger.error(f"General data changed ({reply.get('general')}), clearing data-model")
+            self.invalidate_session()
+            self.disconnect()
+            return False
+
+        diff = self.fingerprint.resync_diff(reply)
+        logger.info(f"Resync diff: {diff}")
+        scanned = self.scanned_changes == self.document_changes.count
+        if diff:
+            part_updater = self.part_updater(doc=self.doc,
+                                             pcb=self.pcb,
+                                             diff=diff,
+                                             models_path=self.models_path,
+                                             progress_bar=self.progress_bar)
+            if part_updater.run() is None:
+                self.invalidate_session()
+                self.disconnect()
+                return False
+            self.fingerprint.copy_entries(reply)
+            self.fingerprint.touch(diff)
+            self.refresh_document()
+            if scanned:
+                self.scanned_changes = self.document_changes.count
+
+        pcb_hash = self.fingerprint.root(self.pcb)
+        if pcb_hash == reply.get("hash"):
+            logger.info(f"Resync finished, hash match! ({len(diff)} sections updated)")
+            self.diff = {}
+            return True
+
+        logger.error(f"Hash mismatch after resync!\n{pcb_hash} should be {reply.get('hash')}")
+        logger.debug(f"Clearing data-model")
+        self.invalidate_session()
+        self.disconnect()
+        return False
+
+    # noinspection PyUnusedLocal
+    def on_connection_handler_finished(self):
+        """
+        9: step: Data model and session are kept when disconnecting, so that session can be resumed on reconnection
+        without redrawing the board (see resume_session).
+        """
+        # Handler is deleted when finished
+        self.connection = None
+        self.rtt = None
+        # Changes made while disconnected are not counted, document is scanned on next sync
+        self.observe_document(False)
+        self.scanned_changes = None
+        # Streamed data model is incomplete if connection was closed before end message
+        if self.receiving_pcb:
+            self.receiving_pcb = False
+            self.end_drawing()
+            self.invalidate_session()
+        self.set_busy(False)
+
+    def close(self):
+        """ Plugin is closed: stop observing document and close connection. """
+        self.observe_document(False)
+        if self.connection:
+            self.connection.abort()
+
+    # -----------------------------| Document (overridden by BoardSync) |----------------------------- #
+
+    def notify_status(self):
+        """ Board is connected, disconnected, starts or finishes syncing (plugin updates buttons and text). """
+
+    def observe_document(self, observe: bool):
+        """ Start or stop counting document changes. """
+        self.observing = observe
+
+    def board_part_exists(self, kiid: str) -> bool:
+        """ Board part with KIID is in document (session can only be resumed if board wasn't deleted). """
+        return True
+
+    def draw_pcb(self):
+        """ Draw whole data model. """
+
+    def draw_board(self):
+        """ Draw board of streamed data model (general data and drawings). """
+
+    def draw_footprints(self, footprints: list):
+        """ Draw batch of footprints of streamed data model. """
+
+    def end_drawing(self):
+        """ Streamed data model is complete (or connection was closed before end message). """
+
+    def refresh_document(self):
+        """ Recompute document after update. """
+
+    def dump_to_json_file(self, data, filename: str):
+        """ Save data to file in log directory. """
+        if self.log_directory is None:
+            return
+        with open(os.path.join(self.log_directory, filename), "w") as f:
+            json.dump(data, f, indent=4)
@@ -0,0 +1,114 @@
+"""
+    Indexes by KIID, used by PcbScanner and PcbUpdater instead of searching lists: KiidIndex of data model entries and
+    BoardIndex of pcbnew objects on board.
+"""
+
+
+class KiidIndex:
+    """
+    KIID -> entry index of lists in data model (footprints, drawings, vias). Data model is sent to FreeCAD as it is,
+    so index is kept next to it: entries must be appended and removed through index to keep it consistent.
+    :param pcb: dict (data model) or None
+    """
+
+    def __init__(self, pcb: dict = None):
+        self.pcb = pcb
+        self._sections = {}
+        for key, entries in (pcb or {}).items():
+            if isinstance(entries, list):
+                section = self._sections[key] = {}
+                for entry in entries:
+                    # First entry wins, same as searching the list
+                    section.setdefault(entry.get("kiid"), entry)
+
+    @staticmethod
+    def of(pcb: dict, index=None):
+        """ Return index if it was built for this data model, otherwise build a new one. """
+        if index is not None and index.pcb is pcb:
+            return index
+        return KiidIndex(pcb)
+
+    def get(self, key: str, kiid: str) -> dict:
+        """ Returns entry with same KIID value (None if there is none). """
+        return self._sections.get(key, {}).get(kiid)
+
+    def contains(self, key: str, kiid: str) -> bool:
+        return kiid in self._sections.get(key, {})
+
+    def append(self, key: str, entry: dict):
+        """ Append entry to list in data model. """
+        self.pcb[key].append(entry)
+        self._sections.setdefault(key, {}).setdefault(entry.get("kiid"), entry)
+
+    def remove(self, key: str, entry: dict):
+        """ Remove entry from list in data model. """
+        self.pcb[key].remove(entry)
+        section = self._sections.get(key, {})
+        if section.get(entry.get("kiid")) is entry:
+            del section[entry.get("kiid")]
+
+    def remove_missing(self, key: str, kiids: set) -> list:
+        """
+        Remove entries whose KIID is not in kiids (KIIDs of items on board) from list in data model, in one pass.
+        :return: list of removed KIIDs (in data model order)
+        """
+        entries = self.pcb[key]
+        removed = [entry.get("kiid") for entry in entries if entry.get("kiid") not in kiids]
+        if removed:
+            # Rebuild list in place: data model dictionary keeps reference to same list
+            entries[:] = [entry for entry in entries if entry.get("kiid") in kiids]
+            section = self._sections.get(key, {})
+            for kiid in removed:
+                section.pop(kiid, None)
+        return removed
+
+
+class BoardIndex:
+    """
+    UUID -> pcbnew object index of footprints and drawings on board. Each section is built with one pass over board
+    when it is first needed. Objects must not be kept after board was edited in KiCAD, so index is built for one update
+    cycle: drawings added or deleted by updater are registered with add_drawing() / remove_drawing().
+    :param brd: pcbnew.BOARD
+    """
+
+    def __init__(self, brd=None):
+        self.brd = brd
+        self._footprints = None
+        self._drawings = None
+
+    @staticmethod
+    def of(brd, index=None):
+        """ Return index if it was built for this board, otherwise build a new one. """
+        if index is not None and index.brd is brd:
+            return index
+        return BoardIndex(brd)
+
+    @staticmethod
+    def _build(items) -> dict:
+        section = {}
+        for item in items:
+            # First object wins, same as searching the board
+            section.setdefault(item.m_Uuid.AsString(), item)
+        return section
+
+    def footprint(self, kiid: str):
+        """ Returns pcbnew.FOOTPRINT object with same KIID attribute (None if there is none). """
+        if self._footprints is None:
+            self._footprints = self._build(self.brd.GetFootprints())
+        return self._footprints.get(kiid)
+
+    def drawing(self, kiid: str):
+        """ Returns pcbnew.PCB_SHAPE object with same KIID attribute (None if there is none). """
+        if self._drawings is None:
+            self._drawings = self._build(self.brd.GetDrawings())
+        return self._drawings.get(kiid)
+
+    def add_drawing(self, drw):
+        """ Register drawing which was added to board. """
+        if self._drawings is not None:
+            self._drawings.setdefault(drw.m_Uuid.AsString(), drw)
+
+    def remove_drawing(self, kiid: str):
+        """ Unregister drawing which was deleted from board. """
+        if self._drawings is not None:
+            self._drawings.pop(kiid, None)
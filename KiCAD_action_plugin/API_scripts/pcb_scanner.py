@@ -8,21 +8,99 @@ import os
 import random
 
 import pcbnew
-from API_scripts.utils import get_dict_entry_by_kiid, relative_model_path, get_drawing_by_kiid, get_model_path
+from API_scripts.kiid_index import KiidIndex
+from API_scripts.utils import board_timestamp, relative_model_path, get_model_path
 
 # Initialize logger
 logger = logging.getLogger("SCANNER")
 
 
+class ScanContext:
+    """
+    Board properties which don't change during a scan, read once per get_pcb / get_diff instead of once per item.
+    :param brd: pcbnew.Board object
+    """
+
+    def __init__(self, brd: pcbnew.BOARD):
+        self.brd = brd
+        design_settings = brd.GetDesignSettings()
+        aux_origin = design_settings.GetAuxOrigin()
+        # Auxiliary board origin as tuple of ints (indexing VECTOR2I is a call through pcbnew bindings)
+        self.board_origin = (aux_origin[0], aux_origin[1])
+        self.thickness = design_settings.GetBoardThickness()
+        # Drawings are filtered by layer ID (layer name is looked up by board on every GetLayerName call)
+        self.edge_cuts = pcbnew.Edge_Cuts
+
+    @staticmethod
+    def of(brd: pcbnew.BOARD, context=None):
+        """ Return context if it was created for this board, otherwise create a new one. """
+        if context is not None and context.brd is brd:
+            return context
+        return ScanContext(brd)
+
+
+class FootprintScan:
+    """
+    Scan footprints of a new data model batch by batch (see PcbScanner.get_pcb with footprints=False), so that
+    batches can be sent to FreeCAD while the rest of the board is being scanned. Entries are same as in get_pcb.
+    Board can be edited in KiCAD between batches: list of footprints is fetched again if board was modified (pcbnew
+    objects of deleted footprints must not be used), footprints that were already scanned are skipped.
+    :param brd: pcbnew.Board object
+    :param context: ScanContext of board, created if None
+    """
+
+    def __init__(self, brd: pcbnew.BOARD, context: ScanContext = None):
+        self.brd = brd
+        self.context = ScanContext.of(brd, context)
+        # KIIDs of scanned footprints
+        self.scanned = set()
+        self._stamp = None
+        self._footprints = None
+        self._position = 0
+
+    def next_batch(self, size: int) -> list:
+        """ Return entries of next (at most) size footprints, empty list when all footprints are scanned. """
+        stamp = board_timestamp(self.brd)
+        # Without modification counter board can't be checked, so list is always fetched again
+        if self._footprints is None or stamp is None or stamp != self._stamp:
+            self._stamp = stamp
+            self._footprints = [fp for fp in self.brd.GetFootprints() if fp.m_Uuid.AsString() not in self.scanned]
+            self._position = 0
+
+        batch = []
+        for fp in self._footprints[self._position:self._position + size]:
+            fp_id = fp.m_Uuid.AsString()
+            batch.append(PcbScanner.footprint_entry(fp, fp_id, len(self.scanned) + 1, self.context))
+            self.scanned.add(fp_id)
+        self._position += len(batch)
+        return batch
+
+
 class PcbScanner:
     """ Class for grouping static methods. """
 
     @staticmethod
-    def get_pcb(brd: pcbnew.BOARD, pcb: dict = None) -> dict:
+    def get_board() -> pcbnew.BOARD:
+        """ Board open in pcbnew. """
+        return pcbnew.GetBoard()
+
+    @staticmethod
+    def board_timestamp(brd: pcbnew.BOARD) -> int:
+        """ Modification counter of board (see utils.board_timestamp). """
+        return board_timestamp(brd)
+
+    @staticmethod
+    def footprint_scan(brd: pcbnew.BOARD) -> FootprintScan:
+        """ Scan of footprints batch by batch, after get_pcb was called with footprints=False. """
+        return FootprintScan(brd)
+
+    @staticmethod
+    def get_pcb(brd: pcbnew.BOARD, pcb: dict = None, footprints: bool = True) -> dict:
         """
         Create a dictionary with PCB elements and properties
         :param pcb: dict
         :param brd: pcbnew.Board object
+        :param footprints: bool (if False, footprints list is left empty, footprints are scanned with FootprintScan)
         :return: dict
         """
 
@@ -32,6 +110,7 @@ class PcbScanner:
         random_id_list = [random.choice(rand_pool[1]) for _ in range(2)] + \
                          [random.choice(rand_pool[0]) for _ in range(2)]
 
+        context = ScanContext(brd)
         # Parse file path to get file name, file path and pcb ID
         file_name = brd.GetFileName()
         file_directory = os.path.dirname(file_name)
@@ -44,26 +123,31 @@ class PcbScanner:
         general_data = {"pcb_name": pcb_name,
                         "pcb_id": "".join(str(char) for char in random_id_list),
                         "kiid": pcb_kiid,
-                        "thickness": brd.GetDesignSettings().GetBoardThickness(),
+                        "thickness": context.thickness,
                         "file_directory": file_directory}
 
         # Pcb dictionary
         pcb = {"general": general_data,
-               "drawings": PcbScanner.get_pcb_drawings(brd, pcb).get("added"),
-               "footprints": PcbScanner.get_footprints(brd, pcb).get("added"),
+               "drawings": PcbScanner.get_pcb_drawings(brd, pcb, context=context).get("added"),
+               "footprints": PcbScanner.get_footprints(brd, pcb, context=context).get("added") if footprints else [],
                # "vias": PcbScanner.getVias(brd, pcb)["added"]
                }
 
         return pcb
 
     @staticmethod
-    def get_diff(brd: pcbnew.BOARD, pcb: dict, diff: dict) -> dict:
-        """ Update existing diff data type. """
+    def get_diff(brd: pcbnew.BOARD, pcb: dict, diff: dict, index: KiidIndex = None) -> dict:
+        """
+        Update existing diff data type.
+        :param index: KiidIndex of data model (kept up to date by scanner), built if None
+        """
+        index = KiidIndex.of(pcb, index)
+        context = ScanContext(brd)
         PcbScanner.update_diff_dict(key="footprints",
-                                    value=PcbScanner.get_footprints(brd, pcb),
+                                    value=PcbScanner.get_footprints(brd, pcb, index, context),
                                     diff=diff)
         PcbScanner.update_diff_dict(key="drawings",
-                                    value=PcbScanner.get_pcb_drawings(brd, pcb),
+                                    value=PcbScanner.get_pcb_drawings(brd, pcb, index, context),
                                     diff=diff)
         # PcbScanner.updateDiffDict(key="vias",
         #                           value=PcbScanner.getVias(brd, pcb),
@@ -169,62 +253,67 @@ class PcbScanner:
                         logger.debug(f"Updated diff {diff[key]}")
 
     @staticmethod
-    def get_pcb_drawings(brd: pcbnew.BOARD, pcb: dict) -> dict:
+    def get_pcb_drawings(brd: pcbnew.BOARD, pcb: dict, index: KiidIndex = None, context: ScanContext = None) -> dict:
         """
         Returns three keyword dictionary: added - changed - removed
         If drawings is changed, pcb dictionary gets automatically updated
         :param pcb: dict
         :param brd: pcbnew.Board object
+        :param index: KiidIndex of data model, built if None
+        :param context: ScanContext of board, created if None
         :return: dict
         """
 
         added = []
         removed = []
         changed = []
+        # Index of drawings in data model by KIID, to find out if drw is new, or it already exists in pcb dictionary
+        index = KiidIndex.of(pcb, index)
+        context = ScanContext.of(brd, context)
 
         try:
-            # Add all drw IDs to list, to find out if drw is new, or it already exists in pcb dictionary
-            list_of_ids = [d["kiid"] for d in pcb["drawings"]]
             latest_nr = pcb["drawings"][-1]["ID"]
-        except TypeError:
-            # No drawings in pcb dictionary: scanning drws for the first time
+        except (TypeError, IndexError):
+            # No drawings in pcb dictionary: scanning drws for the first time (or all of them were deleted)
             latest_nr = 0
-            list_of_ids = []
 
+        # KIIDs of drawings on board, collected in the same pass to find deleted drawings
+        board_kiids = set()
         # Go through drawings
         drawings = brd.GetDrawings()
         for i, drw in enumerate(drawings):
             # Get drawings in edge layer
-            if drw.GetLayerName() == "Edge.Cuts":
+            if drw.GetLayer() == context.edge_cuts:
+                drw_id = drw.m_Uuid.AsString()
+                board_kiids.add(drw_id)
 
                 # if drawing kiid is not in pcb dictionary, it's a new drawing
-                if drw.m_Uuid.AsString() not in list_of_ids:
+                if not index.contains("drawings", drw_id):
 
                     # Get data
-                    drawing = PcbScanner.get_drawings_data(drw, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                    drawing = PcbScanner.get_drawings_data(drw, board_origin=context.board_origin)
                     # Hash drawing - used for detecting change when scanning board
                     drawing_hash = hashlib.md5(str(drawing).encode()).hexdigest()
                     drawing.update({"hash": drawing_hash})
                     # ID for enumerating drawing name in FreeCAD
                     drawing.update({"ID": (latest_nr + i + 1)})
                     # KIID for cross-referencing drawings inside KiCAD
-                    drawing.update({"kiid": drw.m_Uuid.AsString()})
+                    drawing.update({"kiid": drw_id})
                     # Add dict to list
                     added.append(drawing)
                     # Add drawing to pcb dictionary
-                    if pcb and pcb.get("drawings"):
-                        pcb["drawings"].append(drawing)
+                    if pcb and pcb.get("drawings") is not None:
+                        index.append("drawings", drawing)
 
                 # known kiid, drw has already been added, check for diff
                 else:
                     # Get old dictionary entry to be edited (by KIID):
-                    drawing_old = get_dict_entry_by_kiid(list_of_entries=pcb.get("drawings"),
-                                                         kiid=drw.m_Uuid.AsString())
+                    drawing_old = index.get("drawings", drw_id)
                     if not drawing_old:
                         continue
 
                     # Get new drawing data
-                    drawing_new = PcbScanner.get_drawings_data(drw, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                    drawing_new = PcbScanner.get_drawings_data(drw, board_origin=context.board_origin)
 
                     # Calculate new hash and compare it to hash in old dictionary
                     # to see if anything is changed
@@ -251,18 +340,10 @@ class PcbScanner:
                         # Append dictionary with ID and list of changes to list of changed drawings
                         changed.append({drawing_old["kiid"]: drawing_diffs})
 
-        # Find deleted drawings
-        if type(pcb) is dict and pcb.get("drawing"):
-            # Go through existing list of drawings (dictionary)
-            for drawing_old in pcb["drawings"]:
-                # Returns object if PCB SHAPE exists in board, skip this iteration
-                if get_drawing_by_kiid(brd, drawing_old["kiid"]):
-                    continue
-                # No matches in board (return None): drawings has been removed from board
-                # Add UUID of deleted drawing to removed list
-                removed.append(drawing_old["kiid"])
-                # Delete drawing from pcb dictionary
-                pcb["drawings"].remove(drawing_old)
+        # Find deleted drawings: drawings in data model which are not on board (Edge.Cuts layer) anymore
+        if type(pcb) is dict and pcb.get("drawings"):
+            # Delete drawings from pcb dictionary, add their UUIDs to removed list
+            removed = index.remove_missing("drawings", board_kiids)
 
         result = {}
         if added:
@@ -275,55 +356,54 @@ class PcbScanner:
         return result
 
     @staticmethod
-    def get_footprints(brd: pcbnew.BOARD, pcb: dict) -> dict:
+    def get_footprints(brd: pcbnew.BOARD, pcb: dict, index: KiidIndex = None, context: ScanContext = None) -> dict:
         """
         Returns three keyword dictionary: added - changed - removed
         If fp is changed, pcb dictionary gets automatically updated
         :param pcb: dict
         :param brd: pcbnew.Board object
+        :param index: KiidIndex of data model, built if None
+        :param context: ScanContext of board, created if None
         :return: dict
         """
 
         added, removed, changed = [], [], []
+        # Index of footprints in data model by KIID, to find out if fp is new, or it already exists in pcb dictionary
+        index = KiidIndex.of(pcb, index)
+        context = ScanContext.of(brd, context)
 
         try:
-            # Add all fp IDs to list, to find out if fp is new, or it already exists in pcb dictionary
             latest_nr = pcb["footprints"][-1]["ID"]
-            list_of_ids = [f["kiid"] for f in pcb["footprints"]]
-        except TypeError:
-            # No footprints in pcb dictionary: scanning fps for the first time
+        except (TypeError, IndexError):
+            # No footprints in pcb dictionary: scanning fps for the first time (or all of them were deleted)
             latest_nr = 0
-            list_of_ids = []
 
+        # KIIDs of footprints on board, collected in the same pass to find deleted footprints
+        board_kiids = set()
         # Go through footprints
         footprints = brd.GetFootprints()
         for i, fp in enumerate(footprints):
             # Use UUID as unique ID
             fp_id = fp.m_Uuid.AsString()
-            if fp_id not in list_of_ids:
-                # Get FP data
-                footprint = PcbScanner.get_fp_data(fp, board_origin=brd.GetDesignSettings().GetAuxOrigin())
-                # Hash footprint - used for detecting change when scanning board
-                footprint_hash = hashlib.md5(str(footprint).encode()).hexdigest()
-                footprint.update({"hash": footprint_hash})
-                footprint.update({"ID": (latest_nr + i + 1)})
-                footprint.update({"kiid": fp_id})
+            board_kiids.add(fp_id)
+            if not index.contains("footprints", fp_id):
+                # Get FP data with hash, ID and KIID
+                footprint = PcbScanner.footprint_entry(fp, fp_id, latest_nr + i + 1, context)
 
                 # Add dict to list
                 added.append(footprint)
                 # Add footprint to pcb dictionary
                 if pcb:
-                    pcb["footprints"].append(footprint)
+                    index.append("footprints", footprint)
 
                 logger.debug(f"New footprint: {footprint}")
 
             # known kiid, fp has already been added, check for diff
             else:
                 # Get old dictionary entry to be edited:
-                footprint_old = get_dict_entry_by_kiid(list_of_entries=pcb["footprints"],
-                                                       kiid=fp_id)
+                footprint_old = index.get("footprints", fp_id)
                 # Get new data of footprint
-                footprint_new = PcbScanner.get_fp_data(fp, board_origin=brd.GetDesignSettings().GetAuxOrigin())
+                footprint_new = PcbScanner.get_fp_data(fp, board_origin=context.board_origin)
                 # # Skip footprint if it doesn't have 3d models
                 # if not footprint_new.get("3d_models"):
                 #     continue
@@ -401,22 +481,10 @@ class PcbScanner:
                     # Append dictionary with ID and list of changes to list of changed footprints
                     changed.append({footprint_old["kiid"]: fp_diffs})
 
-        # Find deleted footprints
+        # Find deleted footprints: footprints in data model which are not on board anymore
         if type(pcb) is dict:
-            # Go through existing list of footprints (dictionary)
-            for footprint_old in pcb["footprints"]:
-                found_match = False
-                # Go through FPs in PCB:
-                for fp in footprints:
-                    # # Find corresponding footprint in old dict based on kiid
-                    if fp.m_Uuid.AsString() == footprint_old["kiid"]:
-                        #  Found match
-                        found_match = True
-                if not found_match:
-                    # Add kiid of deleted footprint to removed list
-                    removed.append(footprint_old["kiid"])
-                    # Delete footprint from pcb dictionary
-                    pcb["footprints"].remove(footprint_old)
+            # Delete footprints from pcb dictionary, add their kiids to removed list
+            removed = index.remove_missing("footprints", board_kiids)
 
         result = {}
         if added:
@@ -429,25 +497,38 @@ class PcbScanner:
         return result
 
     @staticmethod
-    def get_vias(brd: pcbnew.BOARD, pcb: dict) -> dict:
+    def footprint_entry(fp: pcbnew.FOOTPRINT, fp_id: str, nr: int, context: ScanContext) -> dict:
+        """
+        Return data model entry of new footprint: footprint data, hash (used for detecting change when scanning board),
+        ID (for enumerating footprint name in FreeCAD) and KIID.
+        """
+        footprint = PcbScanner.get_fp_data(fp, board_origin=context.board_origin)
+        footprint_hash = hashlib.md5(str(footprint).encode()).hexdigest()
+        footprint.update({"hash": footprint_hash})
+        footprint.update({"ID": nr})
+        footprint.update({"kiid": fp_id})
+        return footprint
+
+    @staticmethod
+    def get_vias(brd: pcbnew.BOARD, pcb: dict, index: KiidIndex = None) -> dict:
         """
         Returns three keyword dictionary: added - changed - removed
         If via is changed, pcb dictionary gets automatically updated
         :param pcb: dict
         :param brd: pcbnew.Board object
+        :param index: KiidIndex of data model, built if None
         :return: dict
         """
 
         added = []
         removed = []
         changed = []
+        # Index of vias in data model by KIID, to find out if via is new, or it already exists in pcb dictionary
+        index = KiidIndex.of(pcb, index)
 
         try:
-            # Add all track IDs to list to find out if track is new, or it already exists in pcb dictionary
-            list_of_ids = [v["kiid"] for v in pcb["vias"]]
             latest_nr = pcb["vias"][-1]["ID"]
-        except TypeError:
-            list_of_ids = []
+        except (TypeError, IndexError):
             latest_nr = 0
 
         # Get vias from track list inside KC
@@ -456,10 +537,14 @@ class PcbScanner:
             if "VIA" in str(type(track)):
                 vias.append(track)
 
+        # KIIDs of vias on board, collected in the same pass to find deleted vias
+        board_kiids = set()
         # Go through vias
         for i, v in enumerate(vias):
+            via_id = v.m_Uuid.AsString()
+            board_kiids.add(via_id)
             # if via kiid is not in pcb dictionary, it's a new via
-            if v.m_Uuid.AsString() not in list_of_ids:
+            if not index.contains("vias", via_id):
 
                 # Get data
                 via = PcbScanner.get_via_data(v)
@@ -468,18 +553,17 @@ class PcbScanner:
                 via.update({"hash": via_hash})
                 via.update({"ID": (latest_nr + i + 1)})
                 # Add UUID to dictionary
-                via.update({"kiid": v.m_Uuid.AsString()})
+                via.update({"kiid": via_id})
                 # Add dict to list of added vias
                 added.append(via)
                 # Add via to pcb dictionary
                 if pcb:
-                    pcb["vias"].append(via)
+                    index.append("vias", via)
 
             # Known kiid, via has already been added, check for diff
             else:
                 # Get old via to be updated
-                via_old = get_dict_entry_by_kiid(list_of_entries=pcb["vias"],
-                                                 kiid=v.m_Uuid.AsString())
+                via_old = index.get("vias", via_id)
                 # Get data
                 via_new = PcbScanner.get_via_data(v)
 
@@ -506,22 +590,10 @@ class PcbScanner:
                     # Append dictionary with kiid and list of changes to list of changed vias
                     changed.append({via_old["kiid"]: via_diffs})
 
-        # Find deleted vias
+        # Find deleted vias: vias in data model which are not on board anymore
         if type(pcb) is dict:
-            # Go through existing list of vias (dictionary)
-            for via_old in pcb["vias"]:
-                found_match = False
-                # Go through vias in KC PCB
-                for v in vias:
-                    # Find corresponding track in old dict based on UUID
-                    if v.m_Uuid.AsString() == via_old["kiid"]:
-                        found_match = True
-                # Via in dict is not in KC - it has been deleted
-                if not found_match:
-                    # Add UUID of deleted via to removed list
-                    removed.append(via_old["kiid"])
-                    # Detele via from pcb dictionary
-                    pcb["vias"].remove(via_old)
+            # Delete vias from pcb dictionary, add their UUIDs to removed list
+            removed = index.remove_missing("vias", board_kiids)
 
         result = {}
         if added:
@@ -543,51 +615,56 @@ class PcbScanner:
         """
         drawing = None
         geometry_type = drw.ShowShape()
+        # Every pcbnew value is read once (each call and VECTOR2I index goes through pcbnew bindings)
+        origin_x, origin_y = board_origin[0], board_origin[1]
 
         if geometry_type == "Line":
+            start, end = drw.GetStart(), drw.GetEnd()
             drawing = {
-                "shape": drw.ShowShape(),
+                "shape": geometry_type,
                 "start": [
-                    drw.GetStart()[0] - board_origin[0],
-                    drw.GetStart()[1] - board_origin[1]
+                    start[0] - origin_x,
+                    start[1] - origin_y
                 ],
                 "end": [
-                    drw.GetEnd()[0] - board_origin[0],
-                    drw.GetEnd()[1] - board_origin[1]
+                    end[0] - origin_x,
+                    end[1] - origin_y
                 ]
             }
 
         elif (geometry_type == "Rect") or (geometry_type == "Polygon"):
             drawing = {
-                "shape": drw.ShowShape(),
-                "points": [[c[0] - board_origin[0], c[1] - board_origin[1]] for c in drw.GetCorners()]
+                "shape": geometry_type,
+                "points": [[c[0] - origin_x, c[1] - origin_y] for c in drw.GetCorners()]
             }
 
         elif geometry_type == "Circle":
+            center = drw.GetCenter()
             drawing = {
-                "shape": drw.ShowShape(),
+                "shape": geometry_type,
                 "center": [
-                    drw.GetCenter()[0] - board_origin[0],
-                    drw.GetCenter()[1] - board_origin[1]
+                    center[0] - origin_x,
+                    center[1] - origin_y
                 ],
                 "radius": drw.GetRadius()
             }
 
         elif geometry_type == "Arc":
+            start, mid, end = drw.GetStart(), drw.GetArcMid(), drw.GetEnd()
             drawing = {
-                "shape": drw.ShowShape(),
+                "shape": geometry_type,
                 "points": [
                     [
-                        drw.GetStart()[0] - board_origin[0],
-                        drw.GetStart()[1] - board_origin[1]
+                        start[0] - origin_x,
+                        start[1] - origin_y
                     ],
                     [
-                        drw.GetArcMid()[0] - board_origin[0],
-                        drw.GetArcMid()[1] - board_origin[1]
+                        mid[0] - origin_x,
+                        mid[1] - origin_y
                     ],
                     [
-                        drw.GetEnd()[0] - board_origin[0],
-                        drw.GetEnd()[1] - board_origin[1]
+                        end[0] - origin_x,
+                        end[1] - origin_y
                     ]
                 ]
             }
@@ -603,12 +680,14 @@ class PcbScanner:
         :param board_origin: board origin coordinates - these get subtracted from absolute coordinates
         :return: dict
         """
+        # Every pcbnew value is read once (each call and vector index goes through pcbnew bindings)
+        fp_x, fp_y = fp.GetX(), fp.GetY()
         footprint = {
             "id": fp.GetFPIDAsString(),
             "ref": fp.GetReference(),
             "pos": [
-                fp.GetX() - board_origin[0],
-                fp.GetY() - board_origin[1]
+                fp_x - board_origin[0],
+                fp_y - board_origin[1]
             ],
             "rot": fp.GetOrientationDegrees()
         }
@@ -621,56 +700,59 @@ class PcbScanner:
             footprint.update({"layer": "Top"})
 
         # Add through hole if it's only one (Mounting hole footprint)
-        if fp.HasThroughHolePads() and (len(fp.Pads()) == 1):
-            # logger.debug(f"Scanning through holes for {footprint['ref']}")
-            pads_list = []
-            for pad in fp.Pads():
-                pad_hole = {
-                    "pos_delta": [
-                        pad.GetX() - fp.GetX(),  # - board_origin[0]
-                        pad.GetY() - fp.GetY()  # - board_origin[1]
-                    ],
-                    "hole_size": [
-                        pad.GetDrillSize()[0],
-                        pad.GetDrillSize()[0]
-                    ]
-                }
-                # Hash itself and add to list
-                pad_hole.update({"hash": hash(str(pad_hole))})
-                # Edit: mounting hole has no Name
-                # pad_hole.update({"ID": int(pad.GetName())})
-                pad_hole.update({"kiid": pad.m_Uuid.AsString()})
-                pads_list.append(pad_hole)
+        if fp.HasThroughHolePads():
+            pads = fp.Pads()
+            if len(pads) == 1:
+                # logger.debug(f"Scanning through holes for {footprint['ref']}")
+                pads_list = []
+                for pad in pads:
+                    drill_size = pad.GetDrillSize()
+                    pad_hole = {
+                        "pos_delta": [
+                            pad.GetX() - fp_x,  # - board_origin[0]
+                            pad.GetY() - fp_y  # - board_origin[1]
+                        ],
+                        "hole_size": [
+                            drill_size[0],
+                            drill_size[0]
+                        ]
+                    }
+                    # Hash itself and add to list
+                    pad_hole.update({"hash": hash(str(pad_hole))})
+                    # Edit: mounting hole has no Name
+                    # pad_hole.update({"ID": int(pad.GetName())})
+                    pad_hole.update({"kiid": pad.m_Uuid.AsString()})
+                    pads_list.append(pad_hole)
 
-            # Add pad holes to footprint dict
-            footprint.update({"pads_pth": pads_list})
+                # Add pad holes to footprint dict
+                footprint.update({"pads_pth": pads_list})
 
         # Get models
         model_list = []
-        if fp.Models():
-            for ii, model in enumerate(fp.Models()):
-                model_list.append(
-                    {
-                        "model_id": f"{ii:03d}",
-                        "filename": relative_model_path(model.m_Filename),
-                        "absolute_path": get_model_path(model.m_Filename),
-                        "offset": [
-                            model.m_Offset[0],
-                            model.m_Offset[1],
-                            model.m_Offset[2]
-                        ],
-                        "scale": [
-                            model.m_Scale[0],
-                            model.m_Scale[1],
-                            model.m_Scale[2]
-                        ],
-                        "rot": [
-                            model.m_Rotation[0],
-                            model.m_Rotation[1],
-                            model.m_Rotation[2]
-                        ]
-                    }
-                )
+        for ii, model in enumerate(fp.Models()):
+            filename, offset, scale, rotation = model.m_Filename, model.m_Offset, model.m_Scale, model.m_Rotation
+            model_list.append(
+                {
+                    "model_id": f"{ii:03d}",
+                    "filename": relative_model_path(filename),
+                    "absolute_path": get_model_path(filename),
+                    "offset": [
+                        offset[0],
+                        offset[1],
+                        offset[2]
+                    ],
+                    "scale": [
+                        scale[0],
+                        scale[1],
+                        scale[2]
+                    ],
+                    "rot": [
+                        rotation[0],
+                        rotation[1],
+                        rotation[2]
+                    ]
+                }
+            )
 
         # Add models to footprint dict: if no models, append empty list
         footprint.update({"3d_models": model_list})
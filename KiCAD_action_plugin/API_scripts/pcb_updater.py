@@ -6,8 +6,8 @@ import pcbnew
 import hashlib
 import logging
 
-from API_scripts.utils import (relative_model_path, get_dict_entry_by_kiid, get_drawing_by_kiid, get_footprint_by_kiid,
-                               kicad_vector)
+from API_scripts.kiid_index import BoardIndex, KiidIndex
+from API_scripts.utils import relative_model_path, kicad_vector
 
 
 # Initialize logger
@@ -18,9 +18,21 @@ class PcbUpdater:
     """ This class contains only static methods. """
 
     @staticmethod
-    def remove_drawings(brd: pcbnew.BOARD, pcb: dict, removed: list):
-        """ Deletes drawings from board by KIID, removes entry from data model. """
+    def refresh():
+        """ Redraw board in pcbnew after all changes are applied. """
+        pcbnew.Refresh()
+
+    @staticmethod
+    def remove_drawings(brd: pcbnew.BOARD, pcb: dict, removed: list, index: KiidIndex = None,
+                        board_index: BoardIndex = None):
+        """
+        Deletes drawings from board by KIID, removes entry from data model.
+        :param index: KiidIndex of data model (kept up to date by updater), built if None
+        :param board_index: BoardIndex of board (deleted drawings are unregistered), built if None
+        """
         logger.info(f"Deleting drawings {removed}")
+        index = KiidIndex.of(pcb, index)
+        board_index = BoardIndex.of(brd, board_index)
 
         # Walk list of KIIDs to be removed
         for kiid_to_remove in removed:
@@ -28,27 +40,32 @@ class PcbUpdater:
             try:
                 # Remove from data model:
                 # Get drawing from data model by kiid
-                drawing_in_data_model = get_dict_entry_by_kiid(pcb.get("drawings"), kiid_to_remove)
+                drawing_in_data_model = index.get("drawings", kiid_to_remove)
                 if drawing_in_data_model:
                     logger.debug(f"Removing drawing: {drawing_in_data_model}")
                     # Remove entry from data model
-                    pcb.get("drawings").remove(drawing_in_data_model)
+                    index.remove("drawings", drawing_in_data_model)
 
                 # Remove from board
                 # Get PCB SHAPE object from board
-                drw = get_drawing_by_kiid(brd, kiid_to_remove)
+                drw = board_index.drawing(kiid_to_remove)
                 if drw:
                     logger.debug(f"Deleting drw: {drw}")
                     # Call pcbnew method to delete PCB SHAPE from BOARD
                     drw.DeleteStructure()
+                    # Deleted object must not be returned by index anymore
+                    board_index.remove_drawing(kiid_to_remove)
             except Exception as e:
                 logger.exception(e)
 
     @staticmethod
-    def update_drawings(brd: pcbnew.BOARD, pcb: dict, changed: list):
+    def update_drawings(brd: pcbnew.BOARD, pcb: dict, changed: list, index: KiidIndex = None,
+                        board_index: BoardIndex = None):
         """ Update pcbnew objects with Diff data. Add auxiliary board origin coordinates to relative coordinates in data
-        model. """
+        model. Entries and pcbnew objects are looked up by KIID in index and board_index (built if None). """
         logger.info("Updating drawings")
+        index = KiidIndex.of(pcb, index)
+        board_index = BoardIndex.of(brd, board_index)
         board_origin = brd.GetDesignSettings().GetAuxOrigin()
 
         for entry in changed:
@@ -63,12 +80,12 @@ class PcbUpdater:
             changes = items[0][1]
 
             # Old entry in pcb dictionary
-            drawing = get_dict_entry_by_kiid(pcb["drawings"], kiid)
+            drawing = index.get("drawings", kiid)
             if drawing is None:
                 logger.error(f"Cannot find drawing in data model by KIID: {kiid}")
 
             # Drawing object in KiCAD
-            drw = get_drawing_by_kiid(brd, kiid)
+            drw = board_index.drawing(kiid)
             if drw is None:
                 logger.error(f"Cannot find drawing is pcb by KIID: {kiid}")
 
@@ -194,10 +211,14 @@ class PcbUpdater:
     logger.info("Finished drawings")
 
     @staticmethod
-    def update_footprints(brd: pcbnew.BOARD, pcb: dict, footprints: dict):
+    def update_footprints(brd: pcbnew.BOARD, pcb: dict, footprints: dict, index: KiidIndex = None,
+                          board_index: BoardIndex = None):
         """ Apply data from Diff to pcbnew objects.
-        Add board origin coordinates to relative coordinates in data model. """
+        Add board origin coordinates to relative coordinates in data model. Entries and pcbnew objects are looked up
+        by KIID in index and board_index (built if None). """
         board_origin = brd.GetDesignSettings().GetAuxOrigin()
+        index = KiidIndex.of(pcb, index)
+        board_index = BoardIndex.of(brd, board_index)
 
         logger.info("Updating footprints")
         changed = footprints.get("changed")
@@ -216,13 +237,13 @@ class PcbUpdater:
                 logger.debug(f"Got change: {kiid} {changes}")
 
                 # Old entry in pcb dictionary
-                footprint = get_dict_entry_by_kiid(pcb["footprints"], kiid)
+                footprint = index.get("footprints", kiid)
                 if footprint is None:
                     logger.error(f"Cannot find footprint {kiid} in data model.")
                     continue
 
                 # Footprint object in KiCAD
-                fp = get_footprint_by_kiid(brd, kiid)
+                fp = board_index.footprint(kiid)
                 if fp is None:
                     logger.error(f"Cannot find footprint {kiid} in data PCB.")
                     continue
@@ -273,10 +294,11 @@ class PcbUpdater:
         logger.info("Finished footprints")
 
     @staticmethod
-    def add_drawing(brd: pcbnew.BOARD, drawing: dict) -> str:
+    def add_drawing(brd: pcbnew.BOARD, drawing: dict, board_index: BoardIndex = None) -> str:
         """
         Add a drawing specified in drawing dictionary to board. When board is added, KIID (m_Uuid) is assigned
         automatically by KiCAD. Return this value so data model can be updated with correct KIID value.
+        :param board_index: BoardIndex of board, new drawing is registered in it (optional)
         """
         logger.debug(f"Adding new drawing to pcb: {drawing}")
         board_origin = brd.GetDesignSettings().GetAuxOrigin()
@@ -345,5 +367,7 @@ class PcbUpdater:
         brd.Add(new_shape)
         # Get new drawing's id:
         kiid = new_shape.m_Uuid.AsString()
+        if board_index is not None:
+            board_index.add_drawing(new_shape)
 
         return kiid
@@ -65,6 +65,17 @@ def get_footprint_by_kiid(brd: pcbnew.BOARD, kiid: str) -> pcbnew.FOOTPRINT:
     return result
 
 
+def board_timestamp(brd: pcbnew.BOARD) -> int:
+    """
+    Returns modification counter of board (KiCAD increments it on every edit), None if it is not available
+    (no board, or KiCAD version without BOARD.GetTimeStamp).
+    """
+    try:
+        return brd.GetTimeStamp()
+    except AttributeError:
+        return None
+
+
 def kicad_vector(coordinates: list) -> pcbnew.VECTOR2I:
     """ Convert two element list to pcbnew.VECTOR2I type. """
     return pcbnew.VECTOR2I(coordinates[0], coordinates[1])
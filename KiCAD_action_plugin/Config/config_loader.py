@@ -1,6 +1,7 @@
 """ Read configuration data from file. """
 
 import configparser
+import os
 
 
 class ConfigLoader(configparser.ConfigParser):
@@ -17,9 +18,26 @@ class ConfigLoader(configparser.ConfigParser):
         # Convert strings to correct data types, and store as attributes
         self.host = str(self["network"]["host"])
         self.port = int(self["network"]["port"])
+        self.transport = str(self["network"]["transport"])
         self.max_port_search_range = int(self["network"]["max_port_search_range"])
-        self.header = int(self["network"]["header"])
+        self.port_search_timeout = float(self["network"]["port_search_timeout"])
         self.format = str(self["network"]["format"])
+        # Comma separated list of codecs
+        self.compression = [codec.strip() for codec in self["network"]["compression"].split(",")]
+        self.compression_threshold = int(self["network"]["compression_threshold"])
+        self.columnar_payload = self["network"].getboolean("columnar_payload")
+        self.bulk_threshold = int(self["network"]["bulk_threshold"])
+        self.fragment_size = int(self["network"]["fragment_size"])
+        self.heartbeat_interval = float(self["network"]["heartbeat_interval"])
+        self.liveness_timeout = float(self["network"]["liveness_timeout"])
+        # Relative path is relative to plugin directory (parent of Config directory)
+        capture_directory = str(self["network"]["capture_directory"]).strip()
+        if capture_directory and not os.path.isabs(capture_directory):
+            plugin_directory = os.path.dirname(os.path.dirname(os.path.abspath(config_file)))
+            capture_directory = os.path.join(plugin_directory, capture_directory)
+        self.capture_directory = capture_directory
+        self.pcb_chunk_size = int(self["network"]["pcb_chunk_size"])
+        self.send_queue_length = int(self["network"]["send_queue_length"])
 
     def get_config(self):
         """ Return all attributes for logging/debugging purposes. """
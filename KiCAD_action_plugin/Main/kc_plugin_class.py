@@ -5,20 +5,32 @@
 """
 import pcbnew
 
-import hashlib
 import json
 import logging
 import logging.config
 import os
+import selectors
 import socket
 import sys
 import threading
+import time
 import wx
 
 from API_scripts.pcb_scanner import PcbScanner
 from API_scripts.pcb_updater import PcbUpdater
 from Config.config_loader import ConfigLoader
 from Main.kc_plugin_gui import KcPluginGui
+from Main.kc_sync import KcSync
+from Socket.bulk import new_bulk_prefix, remove_bulk_files
+from Socket.capture import CaptureWriter, capture_path
+from Socket.columnar import encode_pcb
+from Socket.discovery import discover_server
+from Socket.dispatcher import NO_REQUEST
+from Socket.endpoints import UNIX_SOCKETS_AVAILABLE, connect_unix
+from Socket.framing import (FrameParser, PeerClosedError, TransferStats, client_handshake, client_hello,
+                            decode_message, encode_frame, fragment_frame, is_priority)
+from Socket.heartbeat import Liveness, RttStats, ping_body, rtt_from_pong
+from Socket.writer import FrameWriter
 
 
 # Get the path to log file because configparser doesn't search for the file in same directory where module is saved
@@ -44,48 +56,45 @@ logger.info("KiCad build version: " + str(pcbnew.GetBuildVersion()))
 
 # Define event IDS for cross thread communication
 EVT_CONNECTED_ID = wx.NewId()
-EVT_PCB_REQUEST_ID = wx.NewId()
-EVT_DIFF_REQUEST_ID = wx.NewId()
-EVT_RECEIVED_DIFF = wx.NewId()
+EVT_RECEIVED_MESSAGE_ID = wx.NewId()
 EVT_DISCONNECT_ID = wx.NewId()
+EVT_RTT_ID = wx.NewId()
 # Events, EVT_IDs, Client and ConnectionHandler must all be defined in same module.
 
 
 # Define wx event for cross-thread communication (Client --(socket)--> main)
 # If data is None (by convention), connection failed
 class ClientConnectedEvent(wx.PyEvent):
-    """ Event to carry socket object when connection to server occurs."""
+    """ Event to carry socket object (and negotiated parameters) when connection to server occurs."""
 
     # noinspection PyShadowingNames
-    def __init__(self, socket):
+    def __init__(self, socket, params=None, discovery_time=None):
         super().__init__()
         self.SetEventType(EVT_CONNECTED_ID)
         self.socket = socket
+        self.params = params
+        # Seconds spent finding the server
+        self.discovery_time = discovery_time
 
 
-# Event for connecting function when receiving request message from FreeCAD
-class ReceivedPcbRequestEvent(wx.PyEvent):
-    """ Event to trigger function. """
-    def __init__(self):
+# Define wx event for cross-thread communication (ConnectionHandler --(request or diff)--> main)
+class ReceivedMessageEvent(wx.PyEvent):
+    """ Event to carry request or diff received from FreeCAD (handled by KcSync), and request ID to send with reply. """
+    def __init__(self, msg_type, request_id=NO_REQUEST, data=None):
         super().__init__()
-        self.SetEventType(EVT_PCB_REQUEST_ID)
+        self.SetEventType(EVT_RECEIVED_MESSAGE_ID)
+        self.msg_type = msg_type
+        self.request_id = request_id
+        self.data = data
 
 
-# Event for connecting function when receiving request message from FreeCAD
-class ReceivedDiffRequestEvent(wx.PyEvent):
-    """ Event to trigger function. """
-    def __init__(self):
+# Define wx event for cross-thread communication (ConnectionHandler --(heartbeat statistics)--> main)
+class RttUpdatedEvent(wx.PyEvent):
+    """ Event to carry round trip time statistics text after every heartbeat reply. """
+    def __init__(self, summary):
         super().__init__()
-        self.SetEventType(EVT_DIFF_REQUEST_ID)
-
-
-# Define wx event for cross-thread communication (ConnectionHandler --(diff dictionary)--> main)
-class ReceivedDiffEvent(wx.PyEvent):
-    """Event to carry status message"""
-    def __init__(self, data):
-        super().__init__()
-        self.SetEventType(EVT_RECEIVED_DIFF)
-        self.diff = data
+        self.SetEventType(EVT_RTT_ID)
+        self.summary = summary
 
 
 class ReceivedDisconnectMessage(wx.PyEvent):
@@ -98,11 +107,11 @@ class ReceivedDisconnectMessage(wx.PyEvent):
 class Client(threading.Thread):
     """ Worker Thread that handles socket connection. """
 
-    def __init__(self, notify_window, config):
+    def __init__(self, notify_window, config, board_kiid=None):
         super().__init__()
         self.config = config
-        # This port get changed
-        self.port = self.config.port
+        # Unix domain socket path is derived from board KIID
+        self.board_kiid = board_kiid
         self._notify_window = notify_window
         self._want_abort = False
 
@@ -113,31 +122,49 @@ class Client(threading.Thread):
     def run(self):
         """Worker thread for starting Socket and connecting to server"""
         connected = False
-        # Instantiate CLIENT Socket
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        logger.debug("[CLIENT] Socket created")
-
-        while not self._want_abort:
+        address = None
+        client_socket = None
+        params = None
+        start = time.perf_counter()
+        # Same host: try Unix domain socket of this board (or generic one) first, no port search needed
+        if self.config.transport == "unix" and UNIX_SOCKETS_AVAILABLE:
+            client_socket = connect_unix(self.board_kiid)
+            if client_socket:
+                address = client_socket.getpeername()
+                # Agree on payload compression and format
+                try:
+                    params = client_handshake(client_socket, self.config, board_kiid=self.board_kiid)
+                    connected = True
+                except (ConnectionError, OSError, ValueError) as e:
+                    logger.exception(e)
+                    client_socket.close()
+            else:
+                logger.debug(f"[CLIENT] No server on Unix domain socket, falling back to TCP")
+
+        if not connected and not self._want_abort:
+            # Probe whole port range at once, handshake identifies FreeSync server
             try:
-                logger.debug(f"[CLIENT] Trying to connect on port {self.port}")
-                # Try to connect
-                client_socket.connect((self.config.host, self.port))
+                found = discover_server(host=self.config.host,
+                                        ports=range(self.config.port,
+                                                    self.config.port + self.config.max_port_search_range + 1),
+                                        hello=client_hello(self.config, board_kiid=self.board_kiid),
+                                        timeout=self.config.port_search_timeout,
+                                        should_abort=lambda: self._want_abort)
+            except OSError as e:
+                logger.exception(e)
+                found = None
+            if found:
+                client_socket, params, port = found
+                address = (self.config.host, port)
                 connected = True
-                break
-            except ConnectionRefusedError:
-                logger.debug(f"[CLIENT] Connection failed")
-                # Increment port number and try again
-                self.port += 1
-
-            if self.port > (self.config.port + self.config.max_port_search_range):
-                connected = False
-                break
 
+        discovery_time = time.perf_counter() - start
         # If successfully connected:
         if connected:
-            logger.info(f"[CLIENT] Connected to {self.config.host}, {self.port}")
+            logger.info(f"[CLIENT] Connected to {address} in {discovery_time * 1000:.1f} ms")
+            logger.info(f"[CLIENT] Negotiated connection parameters: {params}")
             # Send socket object to main thread
-            wx.PostEvent(self._notify_window, ClientConnectedEvent(client_socket))
+            wx.PostEvent(self._notify_window, ClientConnectedEvent(client_socket, params, discovery_time))
         else:
             # Post same event with None argument signaling connection has failed
             wx.PostEvent(self._notify_window, ClientConnectedEvent(None))
@@ -146,89 +173,215 @@ class Client(threading.Thread):
 class ConnectionHandler(threading.Thread):
     """ Worker Thread class that handles messaging via socket."""
 
-    def __init__(self, notify_window, connection_socket, config):
+    def __init__(self, notify_window, connection_socket, config, params=None):
         super().__init__()
         self.config = config
         self.socket = connection_socket
+        # Negotiated payload compression and format (result of handshake)
+        params = params or {}
+        self.codec = params.get("codec", "none")
+        self.columnar = params.get("columnar", False)
+        self.streaming = params.get("streaming", False)
+        # Large payloads are passed through memory-mapped files (only on Unix domain socket)
+        self.bulk_threshold = self.config.bulk_threshold if params.get("bulk") else 0
+        # Payload files of this connection only are removed when it is closed
+        self.bulk_prefix = new_bulk_prefix()
+        # Large messages are split into fragments, so control messages can be sent between them
+        self.fragment_size = self.config.fragment_size if params.get("fragments") else 0
         self._notify_window = notify_window
         self._want_abort = False
-
-    def send_message(self, msg, msg_type="!DIS"):
+        # Bytes on wire and encode/decode time per message type
+        self.stats = TransferStats()
+        # Parser with reusable buffer for receiving complete messages
+        self._parser = FrameParser(encoding=self.config.format, stats=self.stats)
+        # Recorder of all frames of this connection (for replaying session later)
+        self.capture = None
+        if self.config.capture_directory:
+            self.capture = CaptureWriter(capture_path(self.config.capture_directory, "kicad"))
+            self._parser.capture = self.capture
+            logger.info(f"[CONNECTION] Recording session to {self.capture.path}")
+        # Thread waits until socket is readable. Abort writes to socket pair to wake it up.
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_receive, self._wakeup_send = socket.socketpair()
+        # Outgoing frames are sent by writer thread, send methods only queue them (never block main thread)
+        self.writer = FrameWriter(connection_socket,
+                                  max_queue=self.config.send_queue_length,
+                                  on_error=self._on_send_error,
+                                  capture=self.capture)
+        # Heartbeat round trip times, time of next heartbeat and time when bytes were last received
+        self.rtt = RttStats()
+        self._next_heartbeat = None
+        self.liveness = Liveness(self.config.liveness_timeout)
+
+    def send_message(self, msg, msg_type="!DIS", request_id=NO_REQUEST):
         """
         Message can be type (by convention) of !DIS, REQ_PCB, REQ_DIF, DIF, DIFREP
         :param msg: json encoded string
         :param msg_type: str
+        :param request_id: int (ID of request this message replies to)
         :return:
         """
         logger.debug(f"Sending message {msg_type}_{msg}")
-        # Calculate length of first message
-        msg_length = len(msg)
-        send_length = str(msg_length)
-        # First message is type and length of second message
-        first_message = f"{msg_type}_{send_length}".encode(self.config.format)
-        # Pad first message
-        first_message += b' ' * (self.config.header - len(first_message))
-        # Send length and object
-        self.socket.send(first_message)
-        self.socket.send(msg.encode(self.config.format))
+        # Header is type, codec and length of (compressed) body
+        header, body = encode_frame(msg_type=msg_type,
+                                    data=msg.encode(self.config.format),
+                                    codec=self.codec,
+                                    threshold=self.config.compression_threshold,
+                                    stats=self.stats,
+                                    request_id=request_id,
+                                    bulk_threshold=self.bulk_threshold,
+                                    bulk_prefix=self.bulk_prefix)
+        self.enqueue_frame(header, body)
+
+    def enqueue_frame(self, header: bytes, body: bytes):
+        """
+        Queue frame for writer thread, split into fragments if it is large. Control frames (disconnect, heartbeat,
+        requests) are sent ahead of queued data. Connection is closed if peer doesn't keep up (queue is full).
+        """
+        frames = fragment_frame(header, body, self.fragment_size)
+        if not self.writer.enqueue_frames(frames, priority=is_priority(header)):
+            logger.error(f"[CONNECTION] Send queue full ({self.writer.queue_depth} frames, "
+                         f"{self.writer.bytes_pending} B pending), disconnecting")
+            self._on_send_error(None)
+
+    def _on_send_error(self, error):
+        """ Close connection when frame can't be sent, reset GUI same as when disconnect message is received. """
+        if not self._want_abort:
+            wx.PostEvent(self._notify_window, ReceivedDisconnectMessage())
+        self.abort()
+
+    def send_data_model(self, data: dict, msg_type: str, request_id=NO_REQUEST):
+        """
+        Send (part of) data model. Use columnar format if negotiated, fall back to json if data
+        can't be encoded (e.g. unexpected types).
+        :param data: dict
+        :param msg_type: str (PCB, PCBGEN or PCBFPS)
+        :param request_id: int (ID of PCB request)
+        :return:
+        """
+        if self.columnar:
+            try:
+                data_encoded = encode_pcb(data)
+            except (TypeError, ValueError, KeyError) as e:
+                logger.warning(f"[CONNECTION] Columnar encoding failed, sending json: {e}")
+            else:
+                logger.debug(f"Sending message {msg_type} (columnar, {len(data_encoded)} B)")
+                header, body = encode_frame(msg_type=msg_type,
+                                            data=data_encoded,
+                                            codec=self.codec,
+                                            threshold=self.config.compression_threshold,
+                                            stats=self.stats,
+                                            payload_format="columnar",
+                                            request_id=request_id,
+                                            bulk_threshold=self.bulk_threshold,
+                                            bulk_prefix=self.bulk_prefix)
+                self.enqueue_frame(header, body)
+                return
+        self.send_message(json.dumps(data), msg_type=msg_type, request_id=request_id)
 
     def abort(self):
-        """ Method used by main thread to signal abort (condition is checked in While loop) """
+        """ Method used by main thread to signal abort (wakes up thread waiting in select) """
         self._want_abort = True
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            # Thread has already finished and closed the socket pair
+            pass
 
     def run(self):
-        """ Worker thread for receiving messages from client. """
+        """
+        Worker thread for receiving messages from client. Thread sleeps in select until socket has data or abort
+        is called, every complete frame is handled exactly once.
+        """
         logger.info(f"[CONNECTION] ConnectionHandler running")
-        data = None
-        msg_type = None
+        self.writer.start()
+        self._selector.register(self.socket, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_receive, selectors.EVENT_READ)
+        heartbeat_interval = self.config.heartbeat_interval
+        if heartbeat_interval > 0:
+            self._next_heartbeat = time.monotonic() + heartbeat_interval
         while not self._want_abort:
-            # noinspection PyBroadException
-            try:
-                # Receive first message
-                first_msg = self.socket.recv(self.config.header).decode(self.config.format)
-                # Check if anything was actually sent, skip if not
-                if not first_msg:
+            # Wake up for next heartbeat even if nothing is received
+            timeout = max(self._next_heartbeat - time.monotonic(), 0) if self._next_heartbeat else None
+            for key, _ in self._selector.select(timeout):
+                # Abort was called from main thread
+                if key.fileobj is self._wakeup_receive:
+                    self._wakeup_receive.recv(64)
                     continue
-                # Split first message -> first half is type (pcb, diff, disconnect), second is length
-                msg_type = first_msg.split('_')[0]
-                msg_length = first_msg.split('_')[1]
-                # Receive second message
-                msg_length = int(msg_length)
-                data_raw = self.socket.recv(msg_length).decode(self.config.format)
-                data = json.loads(data_raw)
-                logger.debug(f"[CONNECTION] Message: {msg_type} {data}")
-            except Exception:
-                # OSError: [WinError 10038] an operation was attempted on something that is not a socket
-                # If exception OSError, receiving the second message (diff request doesn't work)
-                # If not socket.recv not in try/except block, receiving the second message (diff request doesn't work)
-                pass
-
-            # Check for disconnect message
-            if msg_type == "!DIS":
-                self._want_abort = True
-                # Post event that signals request received
-                wx.PostEvent(self._notify_window, ReceivedDisconnectMessage())
-
-            elif msg_type == "REQPCB":
-                logger.debug(f"[CONNECTION] Received Pcb request.")
-                # Post event that signals request received
-                wx.PostEvent(self._notify_window, ReceivedPcbRequestEvent())
-
-            elif msg_type == "REQDIF":
-                logger.debug(f"[CONNECTION] Received Diff request.")
-                # Post event that signals request received
-                wx.PostEvent(self._notify_window, ReceivedDiffRequestEvent())
-
-            elif msg_type == "DIF":
-                if not isinstance(data, dict):
-                    continue
-                logger.info(f"[CONNECTION] Diff Dictionary received: {data}")
-                # Post event that starts updater
-                wx.PostEvent(self._notify_window, ReceivedDiffEvent(data))
-
-        self._want_abort = False
+                try:
+                    # Socket is readable, so this doesn't block. Frame is parsed from as many pieces as it arrives in.
+                    received = self.socket.recv_into(self._parser.get_buffer())
+                    if received == 0:
+                        received, length = self._parser.pending
+                        raise PeerClosedError(f"Connection closed by peer ({received} of {length} bytes received)")
+                    self.liveness.received()
+                    frame = self._parser.buffer_updated(received)
+                except (OSError, ValueError) as e:
+                    # Peer closed, socket error or corrupted frame (stream can't be resynchronised): stop in any case
+                    logger.info(f"[CONNECTION] Connection lost: {e}")
+                    # Reset GUI same as when disconnect message is received (unless disconnecting from this side)
+                    if not self._want_abort:
+                        wx.PostEvent(self._notify_window, ReceivedDisconnectMessage())
+                    self._want_abort = True
+                    break
+                if frame is not None:
+                    try:
+                        self.handle_frame(*frame)
+                    except ValueError as e:
+                        # Invalid json in body: message is dropped, connection stays usable
+                        logger.error(f"[CONNECTION] Invalid message: {e}")
+
+            if self._next_heartbeat and time.monotonic() >= self._next_heartbeat and not self._want_abort:
+                self._heartbeat()
+
+        # Queued frames (e.g. disconnect message) are sent before socket is closed
+        self.writer.stop(timeout=5.0)
+        self._selector.close()
+        self._wakeup_receive.close()
+        self._wakeup_send.close()
         self.socket.close()
+        if self.capture is not None:
+            self.capture.close()
+        remove_bulk_files(self.bulk_prefix)
         logger.debug("[CONNECTION] Socket closed")
+        logger.info(f"[CONNECTION] Transfer statistics ({self.codec}):\n{self.stats.summary()}")
+        logger.info(f"[CONNECTION] Heartbeat {self.rtt.summary()}")
+
+    def _heartbeat(self):
+        """ Close connection if peer is silent for too long, otherwise send PING. Liveness needs heartbeats enabled. """
+        if self.liveness.expired:
+            logger.error(f"[CONNECTION] Nothing received from peer for {self.liveness.silent:.1f} s, "
+                         f"closing connection")
+            wx.PostEvent(self._notify_window, ReceivedDisconnectMessage())
+            self._want_abort = True
+            return
+        self.enqueue_frame(*encode_frame("PING", ping_body()))
+        self._next_heartbeat = time.monotonic() + self.config.heartbeat_interval
+
+    def handle_frame(self, msg_type: str, request_id: int, data_raw):
+        """ Post event for received message (events are handled in main thread). """
+        # Heartbeats are answered here, main thread may be busy scanning or updating
+        if msg_type == "PING":
+            self.enqueue_frame(*encode_frame("PONG", data_raw.encode("ascii")))
+            return
+        if msg_type == "PONG":
+            self.rtt.add(rtt_from_pong(data_raw))
+            logger.debug(f"[CONNECTION] {self.rtt.summary()}")
+            wx.PostEvent(self._notify_window, RttUpdatedEvent(self.rtt.summary()))
+            return
+
+        logger.debug(f"[CONNECTION] Message: {msg_type} (request {request_id})")
+
+        # Check for disconnect message
+        if msg_type == "!DIS":
+            self._want_abort = True
+            # Post event that signals request received
+            wx.PostEvent(self._notify_window, ReceivedDisconnectMessage())
+            return
+
+        # Requests and diffs are handled by KcSync in main thread. Large bodies are decoded incrementally by parser.
+        data = decode_message(msg_type, data_raw)
+        wx.PostEvent(self._notify_window, ReceivedMessageEvent(msg_type, request_id, data))
 
 
 # noinspection PyAttributeOutsideInit
@@ -245,14 +398,28 @@ class KcPlugin(KcPluginGui):
         logger.info(f"Loaded configuration: {self.config.get_config()}")
         self.console_logger.info(f"Loaded configuration: {self.config.get_config()}")
         # self.searching_port = None  # Variable used for stopping port search
-        self.brd = None
-        self.pcb = None
-        self.diff = {}
         self.client = None
+        # Data model and sync session of board, requests of FC are handled there (footprint batches are scanned
+        # between other events)
+        self.sync = KcSync(self.config,
+                           scanner=PcbScanner,
+                           updater=PcbUpdater,
+                           schedule=wx.CallAfter,
+                           console_logger=self.console_logger,
+                           log_directory=log_files_directory)
         self.connection = None
         # # Call function to get board on startup
         # self.scanBoard()
 
+    @property
+    def connection(self):
+        """ ConnectionHandler of connected FreeCAD instance (None if not connected), replies are sent through it. """
+        return self.sync.connection
+
+    @connection.setter
+    def connection(self, connection):
+        self.sync.connection = connection
+
     # --------------------------------- Button Methods --------------------------------- #
 
     # noinspection PyUnusedLocal
@@ -264,8 +431,14 @@ class KcPlugin(KcPluginGui):
 
         # Connect event to method
         self.Connect(-1, -1, EVT_CONNECTED_ID, self.start_connection_handler)
+        # Board KIID selects Unix domain socket of this board (pcbnew must be called from main thread)
+        try:
+            board_kiid = pcbnew.GetBoard().m_Uuid.AsString()
+        except Exception as e:
+            logger.exception(e)
+            board_kiid = None
         # Instantiate client
-        self.client = Client(self, config=self.config)
+        self.client = Client(self, config=self.config, board_kiid=board_kiid)
         # Start worker thread
         self.client.start()
 
@@ -281,17 +454,19 @@ class KcPlugin(KcPluginGui):
             # self.button_send_message.Enable(True)
             self.button_disconnect.Enable(True)
             # Display status to console
-            self.console_logger.log(logging.INFO, f"[CLIENT] Connected")
+            self.console_logger.log(logging.INFO, f"[CLIENT] Connected (server found in "
+                                                  f"{event.discovery_time * 1000:.0f} ms)")
             # Connected received DISCONNECT message to method
             self.Connect(-1, -1, EVT_DISCONNECT_ID, self.on_disconnect_message)
-            # Connect received PCB REQUEST to method
-            self.Connect(-1, -1, EVT_PCB_REQUEST_ID, self.on_received_pcb_request)
-            # Connect received DIFF REQUEST to method
-            self.Connect(-1, -1, EVT_DIFF_REQUEST_ID, self.on_received_diff_request)
-            # Connect received DIFF to method
-            self.Connect(-1, -1, EVT_RECEIVED_DIFF, self.on_received_diff)
+            # Connect received requests and diffs to method
+            self.Connect(-1, -1, EVT_RECEIVED_MESSAGE_ID, self.on_received_message)
+            # Connect heartbeat statistics to method
+            self.Connect(-1, -1, EVT_RTT_ID, self.on_rtt_updated)
             # Instantiate ConnectionHandler class, pass socket object as argument
-            self.connection = ConnectionHandler(self, connection_socket=event.socket, config=self.config)
+            self.connection = ConnectionHandler(self,
+                                                connection_socket=event.socket,
+                                                config=self.config,
+                                                params=event.params)
             # Start connection thread
             self.connection.start()
 
@@ -306,160 +481,22 @@ class KcPlugin(KcPluginGui):
         # If event is triggered, client worker thread is done in any case: conn successful or not
         self.client = None
 
-    # ---------------------------------| Sequential Process Methods |--------------------------------- #
-
-    # noinspection PyUnusedLocal
-    def on_received_pcb_request(self, event):
-        """
-        Send pcb data model to FC. Method is invoked when receiving request message via event.
-        Event does not carry and data.
-        """
-        logger.info(f"PCB request received.")
-        self.console_logger.log(logging.INFO, f"PCB request received.")
-
-        # Get data model
-        self.scan_board()
-
-        if self.pcb:
-            self.connection.send_message(json.dumps(self.pcb), msg_type="PCB")
-        else:
-            self.console_logger.log(logging.ERROR, f"Failed to scan board, disconnecting")
-            logger.error(f"Failed to scan board, disconnecting")
-            self.connection.send_message(json.dumps("!DIS"))
+    def on_rtt_updated(self, event):
+        """ Show round trip time (network latency, without scan/update time). """
+        self.text_rtt.SetLabel(event.summary)
 
-    # noinspection PyUnusedLocal
-    def on_received_diff_request(self, event):
-        """
-        Send Diff to FC. Method is invoked when receiving request message via event.
-        Event does not carry and data.
-        """
-        try:
-            # Call the function to get diff (this takes existing diff dictionary and updates it)
-            self.diff = PcbScanner.get_diff(self.brd, self.pcb, self.diff)
-            self.console_logger.log(logging.INFO, self.diff)
-            self.dump_to_json_file(self.diff, "/Logs/diff.json")
-            self.dump_to_json_file(self.pcb, "/Logs/data_indent.json")
-
-            self.console_logger.log(logging.INFO, "Sending Diff")
-            logger.debug("Sending Diff")
-            self.connection.send_message(json.dumps(self.diff), msg_type="DIF")
-
-            # Clear diff, FreeCAD takes care of merging sent diff with FC diff, and then sends merged diff back
-            logger.debug(f"Clearing local Diff: {self.diff}")
-            self.diff = {}
-        except Exception as e:
-            logger.exception(e)
+    # ---------------------------------| Sequential Process Methods |--------------------------------- #
 
-    def on_received_diff(self, event):
-        """
-        Apply received Diff data to pcbnew object. Special case for drawings that were added in FC: these drawings don't
-        have valid KIID. They are first added to board, at which point KiCAD assigns them an m_Uuid (cannot be set
-        manually). These drawings are added to
-        """
-        self.console_logger.log(logging.INFO, f"Diff received: {event.diff}")
-        logger.info(f"Diff received: {event.diff}")
-        self.console_logger.log(logging.INFO, f"[UPDATER] Starting...")
-
-        # Attach diff to object. This gets modified if new drawings are updated with KIIDs and then sent back to FC
-        self.diff = event.diff
-        footprints = self.diff.get("footprints")
-        drawings = self.diff.get("drawings")
-
-        # Call update scripts to apply diff to pcbnew.BOARD
-        if footprints:
-            logger.debug(f"calling update footprints")
-            PcbUpdater.update_footprints(self.brd, self.pcb, footprints)
-        if drawings:
-            changed = drawings.get("changed")
-            added = drawings.get("added")
-            removed = drawings.get("removed")
-            if changed:
-                # Update drawings with pcbnew (also update data model)
-                PcbUpdater.update_drawings(self.brd, self.pcb, changed)
-            if removed:
-                # Remove drawings with pcbnew from board and from data model
-                PcbUpdater.remove_drawings(self.brd, self.pcb, removed)
-                # # Delete the whole key from diff to avoid -> "removed": []
-                # del drawings["removed"]
-
-            if added:
-                # (KIID cannot be set, it's attached to object after instantiation with pcbnew).
-                # Drawings with invalid KIID (new drawings from FC) are marked as deleted, drawings are added to pcb
-                # with new kiid, Differ is called to recognise them as added, Diff is sent to FC where invalid
-                # drawings are redrawn and replaced in data model with valid KIIDs
-
-                # List of dictionary data
-                drawings_added = []
-                # List if KIIDs
-                drawings_to_remove = []
-                # Copy diff.added since drawing is being removed from diff (to avoid in place .remove())
-                for drawing in added.copy():
-                    # Draw the new drawings with pcbnew
-                    valid_kiid = PcbUpdater.add_drawing(brd=self.brd, drawing=drawing)
-                    # Make a new instance of dictionary, so that drawing stays the same
-                    drawing_updated = drawing.copy()
-                    # Override "new-drawing-added-in-freecad" with actual m_Uuid
-                    drawing_updated.update({"kiid": valid_kiid})
-                    # Append to list. This will be added to Diff as "added" drawings
-                    drawings_added.append(drawing_updated)
-                    # Append KIID of deleted drawing to list. This will be added to Diff as "removed" drawings
-                    drawings_to_remove.append(drawing["kiid"])
-                    # Remove entry with invalid ID from diff
-                    self.diff.get("drawings").get("added").remove(drawing)
-
-                    # If null, define value
-                    if not self.pcb.get("drawings"):
-                        self.pcb.update({"drawings": []})
-
-                    # Add entry with updated kiid to data model
-                    self.pcb.get("drawings").append(drawing_updated)
-
-                # Build Diff dictionary as follows:
-                # {
-                #   "removed": [invalid IDs of new drawings, as sent by FreeCAD] <-  to be deleted from sketch and pcb
-                #   "added": [newly added drawings with correct KIIDs] <- to be redrawn in sketch and added to pcb
-                # }
-                PcbScanner.update_diff_dict(key="drawings",
-                                            value={
-                                              "removed": drawings_to_remove,
-                                              "added": drawings_added
-                                            },
-                                            diff=self.diff)
-
-        # # Delete whole drawings from diff if it's an empty dictionary
-        # if self.diff.get("drawings") == {}:
-        #     del self.diff["drawings"]
-
-        # Save data model and diff to file for debugging
-        KcPlugin.dump_to_json_file(self.pcb, "/Logs/data_indent.json")
-        KcPlugin.dump_to_json_file(self.diff, "/Logs/diff.json")
-
-        # Hash data model after applying all changes. Send hash to FC so data model sync can be checked on FC side.
-
-        pcb_hash = hashlib.md5(str(self.pcb).encode()).hexdigest()
-
-        self.console_logger.log(logging.INFO, "[UPDATER] Sending Diff Reply")
-        logger.debug(f"Sending Diff Reply {self.diff}")
-        # Send diff back to FC
-        # (either same as merged diff, or with updated "removed" and "added" in case of new drawings)
-        # Also contains hash of updated data model (separated by double underscore (because single underscore appears
-        # in dictionary string)
-        diff_reply = f"{json.dumps(self.diff)}__{pcb_hash}"
-        self.connection.send_message(diff_reply, msg_type="REP")
-
-        logger.debug(f"Clearing diff.")
-        self.diff = {}
-
-        self.console_logger.log(logging.INFO, f"[UPDATER] Done, refreshing document")
-        logger.info(f"[UPDATER] Done, refreshing document")
-        # Refresh document
-        pcbnew.Refresh()
+    def on_received_message(self, event):
+        """ Pass request or diff received from FC to sync logic (see Main/kc_sync.py). """
+        self.sync.on_message(event.msg_type, event.request_id, event.data)
 
     # noinspection PyUnusedLocal
     def on_button_disconnect(self, event):
         """ Send disconnect message via socket and close socket connection. """
         self.console_logger.log(logging.INFO, "Disconnecting...")
         logger.debug("Disconnecting...")
+        self.sync.end_session_if_pending()
         # Send message to host to request disconnect
         self.connection.send_message(json.dumps("!DIS"))
         # Call abort method of ConnectionHandler to stop listening loop and shutdown socket
@@ -472,50 +509,18 @@ class KcPlugin(KcPluginGui):
         self.button_disconnect.Enable(False)
         self.button_connect.Enable(True)
         self.button_connect.SetLabel("Connect")
+        self.text_rtt.SetLabel("")
 
     # noinspection PyUnusedLocal
     def on_disconnect_message(self, event):
         """ Handle disconnection from host side: close socket and reset button without sending disconnect message. """
         # Log to GUI here, cannot be done in ConnectionHandler class
         self.console_logger.log(logging.INFO, "Socket closed")
+        self.sync.end_session_if_pending()
         # Clear connection socket object (to pass the check when connecting again after disconnect)
         self.connection = None
         # Set buttons
         self.button_disconnect.Enable(False)
         self.button_connect.Enable(True)
         self.button_connect.SetLabel("Connect")
-
-    # ------------------------------------| Utils |--------------------------------------------- #
-
-    def scan_board(self):
-        """ Get pcb data model. """
-        # Get board
-        try:
-            self.brd = pcbnew.GetBoard()
-        except Exception as e:
-            logger.exception(e)
-            self.console_logger.exception(e)
-
-        # Get dictionary from board
-        if self.brd:
-            logger.debug("Calling PcbScanner... (check pcb_scanner.log for logs)")
-            self.pcb = PcbScanner.get_pcb(self.brd)
-            self.console_logger.log(logging.INFO, f"Board scanned: {self.pcb['general']['pcb_name']}")
-            logger.debug(f"Board scanned: {self.pcb['general']['pcb_name']}")
-            # Print pcb data to json file
-            with open(parent_directory_path + "/Logs/data_indent.json", "w") as f:
-                json.dump(self.pcb, f, indent=4)
-
-    def get_diff(self):
-        """ Scan get data with pcbnew API, update existing dictionary. """
-        # Call the function to get diff (this takes existing diff dictionary and updates it)
-        self.diff = PcbScanner.get_diff(self.brd, self.pcb, self.diff)
-        self.console_logger.log(logging.INFO, self.diff)
-        self.dump_to_json_file(self.diff, "/Logs/diff.json")
-        self.dump_to_json_file(self.pcb, "/Logs/data_indent.json")
-
-    @staticmethod
-    def dump_to_json_file(data, filename):
-        """ Save data to file. """
-        with open(parent_directory_path + filename, "w") as f:
-            json.dump(data, f, indent=4)
+        self.text_rtt.SetLabel("")
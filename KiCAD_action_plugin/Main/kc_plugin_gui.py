@@ -70,7 +70,9 @@ class KcPluginGui(wx.Frame):
         socket_box = wx.StaticBoxSizer(wx.VERTICAL, panel, label="Socket")
         socket_box.Add(wx.StaticText(panel, label=""), 1, wx.ALL | wx.EXPAND)  # Blank space
         socket_box.Add(socket_button_sizer, 1, wx.CENTRE)  # Add button sizer as child of static box
-        socket_box.Add(wx.StaticText(panel, label=""), 1, wx.ALL | wx.EXPAND)  # Blank space
+        # Round trip time of heartbeat messages, updated while connected
+        self.text_rtt = wx.StaticText(panel, label="", style=wx.ALIGN_CENTRE_HORIZONTAL)
+        socket_box.Add(self.text_rtt, 1, wx.ALL | wx.EXPAND)
 
         # Bottom buttons
         button_sizer = wx.BoxSizer()
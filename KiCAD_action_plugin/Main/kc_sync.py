@@ -0,0 +1,394 @@
+"""
+    Module contains KcSync class, which holds data model and sync session of the board and handles messages received
+    from FreeCAD. It doesn't use wx or pcbnew directly: board is accessed through scanner and updater passed by
+    KcPlugin (PcbScanner, PcbUpdater), so sync can also be run with stand-ins (see Benchmarks/replay.py).
+"""
+import collections
+import json
+import logging
+import os
+import uuid
+
+from API_scripts.kiid_index import BoardIndex, KiidIndex
+from Socket.fingerprint import ModelFingerprint
+
+logger = logging.getLogger()
+
+# Number of diff replies kept for resuming sync session after reconnect
+SESSION_LOG_LENGTH = 32
+
+
+class KcSync:
+    """
+    Sync logic of KiCAD side. Methods are called in main thread, replies are sent with connection (ConnectionHandler).
+    :param config: ConfigLoader object
+    :param scanner: PcbScanner (get_board, get_pcb, get_diff, footprint_scan, board_timestamp, update_diff_dict)
+    :param updater: PcbUpdater (update_footprints, update_drawings, remove_drawings, add_drawing, refresh)
+    :param schedule: function(callback, *args), calls callback later in main thread (wx.CallAfter)
+    :param console_logger: logging.Logger (messages shown in plugin window), root logger if None
+    :param log_directory: str (data model and diff are written there for debugging, None: not written)
+    """
+
+    def __init__(self, config, scanner, updater, schedule, console_logger: logging.Logger = None,
+                 log_directory: str = None):
+        self.config = config
+        self.scanner = scanner
+        self.updater = updater
+        self.schedule = schedule
+        self.console_logger = console_logger or logger
+        self.log_directory = log_directory
+        self.connection = None
+        self.brd = None
+        self.pcb = None
+        # Data model entries by KIID (scanner and updater keep it up to date)
+        self.pcb_index = KiidIndex()
+        self.diff = {}
+        # Merkle hash of data model, sent to FC with diff reply (only changed entries are rehashed)
+        self.fingerprint = ModelFingerprint()
+        # Modification counter of board when data model was last scanned or updated (None: board has to be scanned)
+        self.board_stamp = None
+        # Sync session is started when data model is sent to FC, version is number of syncs completed in session.
+        # Diff replies of last syncs are kept, so that FC can catch up after reconnecting without redrawing the board.
+        self.session_id = None
+        self.version = 0
+        self.session_log = collections.deque(maxlen=SESSION_LOG_LENGTH)
+        # Diff was sent to FC and merged diff was not received yet: session can't be resumed if connection is lost
+        self.sync_pending = False
+
+    def on_message(self, msg_type: str, request_id: int, data):
+        """
+        Handle message received from FreeCAD (body decoded with decode_message).
+        :param msg_type: str (REQPCB, REQDIF, REQSES, REQSYN or DIF)
+        :param request_id: int (sent back with reply)
+        :param data: dict or None
+        """
+        if msg_type == "REQPCB":
+            logger.debug(f"[CONNECTION] Received Pcb request.")
+            self.on_received_pcb_request(request_id)
+        elif msg_type == "REQDIF":
+            logger.debug(f"[CONNECTION] Received Diff request.")
+            self.on_received_diff_request(data, request_id)
+        elif msg_type == "REQSES":
+            logger.debug(f"[CONNECTION] Received Session request.")
+            self.on_received_session_request(data, request_id)
+        elif msg_type == "REQSYN":
+            logger.debug(f"[CONNECTION] Received Resync request.")
+            self.on_received_resync_request(data, request_id)
+        elif msg_type == "DIF":
+            if not isinstance(data, dict):
+                return
+            logger.info(f"[CONNECTION] Diff Dictionary received: {data}")
+            self.on_received_diff(data, request_id)
+        else:
+            logger.error(f"[CONNECTION] Unexpected message: {msg_type} (request {request_id})")
+
+    # ---------------------------------| Sequential Process Methods |--------------------------------- #
+
+    def on_received_pcb_request(self, request_id: int):
+        """
+        Send pcb data model to FC.
+        If streaming is negotiated, general data and drawings are scanned and sent first (FC draws the board right
+        away), footprints are then scanned and sent batch by batch (see send_footprint_batch).
+        """
+        logger.info(f"PCB request received.")
+        self.console_logger.log(logging.INFO, f"PCB request received.")
+        streaming = self.connection.streaming and self.config.pcb_chunk_size > 0
+
+        # Get data model (without footprints if streaming)
+        self.scan_board(footprints=not streaming)
+
+        if not self.pcb:
+            self.console_logger.log(logging.ERROR, f"Failed to scan board, disconnecting")
+            logger.error(f"Failed to scan board, disconnecting")
+            self.connection.send_message(json.dumps("!DIS"))
+            return
+
+        # New data model starts new session
+        self.start_session()
+        if not streaming:
+            self.connection.send_data_model(self.pcb, msg_type="PCB", request_id=request_id)
+            return
+        self.connection.send_data_model(self.pcb, msg_type="PCBGEN", request_id=request_id)
+        self.schedule(self.send_footprint_batch, self.connection, self.scanner.footprint_scan(self.brd), request_id)
+
+    def send_footprint_batch(self, connection, scan, request_id: int):
+        """
+        Scan and send next batch of footprints, then schedule next batch, so that other events are handled in between.
+        End message is sent after last batch. Stops if connection was closed (or replaced) meanwhile.
+        :param scan: FootprintScan
+        """
+        if connection is not self.connection:
+            logger.warning(f"Connection closed while sending board ({len(scan.scanned)} footprints sent)")
+            return
+        try:
+            footprints = scan.next_batch(self.config.pcb_chunk_size)
+        except Exception as e:
+            logger.exception(e)
+            self.console_logger.log(logging.ERROR, f"Failed to scan footprints, disconnecting")
+            connection.send_message(json.dumps("!DIS"))
+            return
+
+        if footprints:
+            for footprint in footprints:
+                self.pcb_index.append("footprints", footprint)
+            connection.send_data_model({"footprints": footprints}, msg_type="PCBFPS", request_id=request_id)
+            self.schedule(self.send_footprint_batch, connection, scan, request_id)
+            return
+
+        connection.send_message("blankmessage", msg_type="PCBEND", request_id=request_id)
+        self.console_logger.log(logging.INFO, f"Board sent: {len(scan.scanned)} footprints")
+        logger.info(f"Board sent: {len(scan.scanned)} footprints")
+        self.dump_to_json_file(self.pcb, "data_indent.json")
+
+    def on_received_diff_request(self, request: dict, request_id: int):
+        """
+        Send Diff to FC.
+        Board is only scanned if it was modified since it was last scanned or updated. Request carries hash of FC data
+        model if FC has no changes: if there are none on this side either and hashes match, sync is finished with
+        an empty diff reply right away (version is not incremented).
+        """
+        try:
+            if self.board_changed():
+                # Call the function to get diff (this takes existing diff dictionary and updates it)
+                self.diff = self.scanner.get_diff(self.brd, self.pcb, self.diff, self.pcb_index)
+                self.board_stamp = self.scanner.board_timestamp(self.brd)
+                # Scanner applies changes on board to data model
+                self.fingerprint.touch(self.diff)
+                self.console_logger.log(logging.INFO, self.diff)
+                self.dump_to_json_file(self.diff, "diff.json")
+                self.dump_to_json_file(self.pcb, "data_indent.json")
+
+            fc_hash = request.get("hash")
+            if fc_hash and not self.diff:
+                pcb_hash = self.fingerprint.root(self.pcb)
+                if pcb_hash == fc_hash:
+                    self.console_logger.log(logging.INFO, "No changes, data models are in sync")
+                    logger.info("No changes on either side, sending empty Diff Reply")
+                    self.connection.send_message(json.dumps({"diff": {}, "hash": pcb_hash}),
+                                                 msg_type="REP",
+                                                 request_id=request_id)
+                    return
+
+            self.console_logger.log(logging.INFO, "Sending Diff")
+            logger.debug("Sending Diff")
+            self.connection.send_message(json.dumps(self.diff), msg_type="DIF", request_id=request_id)
+            self.sync_pending = True
+
+            # Clear diff, FreeCAD takes care of merging sent diff with FC diff, and then sends merged diff back
+            logger.debug(f"Clearing local Diff: {self.diff}")
+            self.diff = {}
+        except Exception as e:
+            logger.exception(e)
+
+    def on_received_diff(self, diff: dict, request_id: int):
+        """
+        Apply received Diff data to pcbnew object. Special case for drawings that were added in FC: these drawings don't
+        have valid KIID. They are first added to board, at which point KiCAD assigns them an m_Uuid (cannot be set
+        manually). These drawings are added to
+        """
+        self.console_logger.log(logging.INFO, f"Diff received: {diff}")
+        logger.info(f"Diff received: {diff}")
+        self.console_logger.log(logging.INFO, f"[UPDATER] Starting...")
+
+        # Changes made by updater are in data model already: board needs scanning on next sync only if it was modified
+        # after last scan (e.g. while FC was scanning)
+        board_changed = self.board_changed()
+        # pcbnew objects by KIID, built once for all updater calls of this diff (board is not edited meanwhile)
+        board_index = BoardIndex(self.brd)
+        # Attach diff to object. This gets modified if new drawings are updated with KIIDs and then sent back to FC
+        self.diff = diff
+        footprints = self.diff.get("footprints")
+        drawings = self.diff.get("drawings")
+
+        # Call update scripts to apply diff to pcbnew.BOARD
+        if footprints:
+            logger.debug(f"calling update footprints")
+            self.updater.update_footprints(self.brd, self.pcb, footprints, self.pcb_index, board_index)
+        if drawings:
+            changed = drawings.get("changed")
+            added = drawings.get("added")
+            removed = drawings.get("removed")
+            if changed:
+                # Update drawings with pcbnew (also update data model)
+                self.updater.update_drawings(self.brd, self.pcb, changed, self.pcb_index, board_index)
+            if removed:
+                # Remove drawings with pcbnew from board and from data model
+                self.updater.remove_drawings(self.brd, self.pcb, removed, self.pcb_index, board_index)
+                # # Delete the whole key from diff to avoid -> "removed": []
+                # del drawings["removed"]
+
+            if added:
+                # (KIID cannot be set, it's attached to object after instantiation with pcbnew).
+                # Drawings with invalid KIID (new drawings from FC) are marked as deleted, drawings are added to pcb
+                # with new kiid, Differ is called to recognise them as added, Diff is sent to FC where invalid
+                # drawings are redrawn and replaced in data model with valid KIIDs
+
+                # List of dictionary data
+                drawings_added = []
+                # List if KIIDs
+                drawings_to_remove = []
+                # Copy diff.added since drawing is being removed from diff (to avoid in place .remove())
+                for drawing in added.copy():
+                    # Draw the new drawings with pcbnew
+                    valid_kiid = self.updater.add_drawing(brd=self.brd, drawing=drawing, board_index=board_index)
+                    # Make a new instance of dictionary, so that drawing stays the same
+                    drawing_updated = drawing.copy()
+                    # Override "new-drawing-added-in-freecad" with actual m_Uuid
+                    drawing_updated.update({"kiid": valid_kiid})
+                    # Append to list. This will be added to Diff as "added" drawings
+                    drawings_added.append(drawing_updated)
+                    # Append KIID of deleted drawing to list. This will be added to Diff as "removed" drawings
+                    drawings_to_remove.append(drawing["kiid"])
+                    # Remove entry with invalid ID from diff
+                    self.diff.get("drawings").get("added").remove(drawing)
+
+                    # If null, define value
+                    if not self.pcb.get("drawings"):
+                        self.pcb.update({"drawings": []})
+
+                    # Add entry with updated kiid to data model
+                    self.pcb_index.append("drawings", drawing_updated)
+
+                # Build Diff dictionary as follows:
+                # {
+                #   "removed": [invalid IDs of new drawings, as sent by FreeCAD] <-  to be deleted from sketch and pcb
+                #   "added": [newly added drawings with correct KIIDs] <- to be redrawn in sketch and added to pcb
+                # }
+                self.scanner.update_diff_dict(key="drawings",
+                                              value={
+                                                "removed": drawings_to_remove,
+                                                "added": drawings_added
+                                              },
+                                              diff=self.diff)
+
+        # # Delete whole drawings from diff if it's an empty dictionary
+        # if self.diff.get("drawings") == {}:
+        #     del self.diff["drawings"]
+
+        # Save data model and diff to file for debugging
+        self.dump_to_json_file(self.pcb, "data_indent.json")
+        self.dump_to_json_file(self.diff, "diff.json")
+
+        if not board_changed:
+            self.board_stamp = self.scanner.board_timestamp(self.brd)
+
+        # Hash data model after applying all changes. Send hash to FC so data model sync can be checked on FC side.
+        # Reply diff contains every entry updater changed, added or removed
+        self.fingerprint.touch(self.diff)
+        pcb_hash = self.fingerprint.root(self.pcb)
+
+        self.console_logger.log(logging.INFO, "[UPDATER] Sending Diff Reply")
+        logger.debug(f"Sending Diff Reply {self.diff}")
+        # Send diff back to FC
+        # (either same as merged diff, or with updated "removed" and "added" in case of new drawings)
+        # Also contains hash of updated data model
+        diff_reply = json.dumps({"diff": self.diff, "hash": pcb_hash})
+        self.connection.send_message(diff_reply, msg_type="REP", request_id=request_id)
+
+        # Keep reply, so it can be sent again if FC doesn't receive it (or disconnects before next sync)
+        self.version += 1
+        self.session_log.append({"version": self.version, "diff": self.diff, "hash": pcb_hash})
+        self.sync_pending = False
+
+        logger.debug(f"Clearing diff.")
+        self.diff = {}
+
+        self.console_logger.log(logging.INFO, f"[UPDATER] Done, refreshing document")
+        logger.info(f"[UPDATER] Done, refreshing document")
+        # Refresh document
+        self.updater.refresh()
+
+    # ------------------------------------| Sessions |------------------------------------------ #
+
+    def start_session(self):
+        """ Start new session at version 0 (called when data model is sent to FC). """
+        self.session_id = uuid.uuid4().hex
+        self.version = 0
+        self.session_log.clear()
+        self.sync_pending = False
+        logger.info(f"Started session {self.session_id}")
+
+    def end_session_if_pending(self):
+        """
+        Diff sent to FC is already cleared on this side, so session can't be continued if connection is lost before
+        merged diff is received: FC has to redraw the board.
+        """
+        if self.sync_pending:
+            logger.warning(f"Connection closed during sync, ending session {self.session_id}")
+            self.session_id = None
+            self.session_log.clear()
+            self.sync_pending = False
+
+    def on_received_session_request(self, session: dict, request_id: int):
+        """
+        Reply with current session ID and version. If FC resumes this session, reply also contains diff replies of
+        syncs FC has missed. Entries are None if session can't be resumed (FC redraws the board on next sync).
+        """
+        fc_session_id = session.get("id")
+        fc_version = session.get("version", 0)
+        entries = None
+        if fc_session_id and fc_session_id == self.session_id and fc_version <= self.version:
+            entries = [entry for entry in self.session_log if entry["version"] > fc_version]
+            # Log is bounded, oldest missed diffs could be discarded already
+            if len(entries) != self.version - fc_version:
+                entries = None
+        if fc_session_id:
+            logger.info(f"Session request: FC at {fc_session_id} version {fc_version}, KC at {self.session_id} "
+                        f"version {self.version}, {'resuming' if entries is not None else 'not resumable'}")
+        self.connection.send_message(json.dumps({"id": self.session_id, "version": self.version, "entries": entries}),
+                                     msg_type="SES",
+                                     request_id=request_id)
+
+    def on_received_resync_request(self, request: dict, request_id: int):
+        """
+        FC data model diverged: reply with requested level of hash tree. FC requests only nodes that differ from its
+        own tree, last reply contains divergent entries (see Socket/fingerprint.py).
+        """
+        try:
+            reply = self.fingerprint.resync_reply(self.pcb, request)
+        except Exception as e:
+            logger.exception(e)
+            reply = {"level": "error"}
+        logger.info(f"Resync request: {request.get('level')}")
+        self.connection.send_message(json.dumps(reply), msg_type="SYN", request_id=request_id)
+
+    # ------------------------------------| Utils |--------------------------------------------- #
+
+    def scan_board(self, footprints: bool = True):
+        """
+        Get pcb data model.
+        :param footprints: bool (if False, footprints are left out, they are added by send_footprint_batch)
+        """
+        # Get board
+        try:
+            self.brd = self.scanner.get_board()
+        except Exception as e:
+            logger.exception(e)
+            self.console_logger.exception(e)
+
+        # Get dictionary from board
+        if self.brd:
+            logger.debug("Calling PcbScanner... (check pcb_scanner.log for logs)")
+            # Board edited while footprints are being scanned in batches is scanned again on next sync
+            self.board_stamp = self.scanner.board_timestamp(self.brd)
+            self.pcb = self.scanner.get_pcb(self.brd, footprints=footprints)
+            self.pcb_index = KiidIndex(self.pcb)
+            self.console_logger.log(logging.INFO, f"Board scanned: {self.pcb['general']['pcb_name']}")
+            logger.debug(f"Board scanned: {self.pcb['general']['pcb_name']}")
+            # Print pcb data to json file
+            self.dump_to_json_file(self.pcb, "data_indent.json")
+
+    def board_changed(self) -> bool:
+        """
+        Board was modified since data model was last scanned or updated (always True if KiCAD has no modification
+        counter).
+        """
+        stamp = self.scanner.board_timestamp(self.brd)
+        return stamp is None or stamp != self.board_stamp
+
+    def dump_to_json_file(self, data, filename: str):
+        """ Save data to file in log directory. """
+        if self.log_directory is None:
+            return
+        with open(os.path.join(self.log_directory, filename), "w") as f:
+            json.dump(data, f, indent=4)
@@ -0,0 +1,167 @@
+"""
+    Module contains recorder and replayer of sync sessions. Same module is used on KiCAD and FreeCAD side.
+
+    Every frame sent or received by a ConnectionHandler is appended to a capture file exactly as it was on the wire
+    (header and compressed body), with direction and monotonic timestamp. A capture can later be replayed: frames
+    are decoded with FrameParser and passed to handler function (KiCAD or FreeCAD sync logic with stand-in scanner and
+    updater, see Benchmarks/replay.py), without the peer application. Duration of handler calls is measured per message
+    type.
+
+    File format: MAGIC, followed by records of RECORD header (direction, timestamp, frame length) and frame bytes.
+    Payload of frames sent through memory-mapped files (bulk transfer) is copied into capture, frame is recorded as if
+    payload was sent over socket. If payload file was already removed, only descriptor is recorded and frame is skipped
+    on replay.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+from Socket.bulk import copy_bulk
+from Socket.framing import BULK_FLAG, FRAGMENT_FLAG, HEADER, FrameParser, frame_type
+
+logger_capture = logging.getLogger("CAPTURE")
+
+MAGIC = b"FSCAP1\n"
+# Direction, monotonic timestamp in seconds, frame length
+RECORD = struct.Struct("!cdI")
+SENT = b"S"
+RECEIVED = b"R"
+
+
+class CaptureWriter:
+    """
+    Append frames to capture file. Thread safe: sent frames are recorded by thread which sends them (KiCAD writer
+    thread, FreeCAD event loop), received frames by socket thread.
+    :param path: str (file is created, or appended to if it exists)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+
+    def record(self, direction: bytes, header, body):
+        """ Append one frame (header and body as on the wire, bulk payload is copied from its file). """
+        header, body = inline_bulk(header, body)
+        length = len(header) + len(body)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(RECORD.pack(direction, time.monotonic(), length))
+            self._file.write(header)
+            self._file.write(body)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def inline_bulk(header, body) -> tuple:
+    """
+    Return bulk frame with payload copied from its file in place of descriptor (payload in file is never compressed).
+    Other frames, and bulk frames whose file is already removed, are returned unchanged.
+    :return: tuple (header, body)
+    """
+    msg_type, codec_id, payload_format, request_id, _ = HEADER.unpack(bytes(header))
+    if not payload_format & BULK_FLAG or payload_format & FRAGMENT_FLAG:
+        return header, body
+    try:
+        data = copy_bulk(json.loads(str(body, "ascii")))
+    except (OSError, ValueError) as e:
+        logger_capture.warning(f"Payload of {msg_type!r} not recorded: {e}")
+        return header, body
+    return HEADER.pack(msg_type, codec_id, payload_format & ~BULK_FLAG, request_id, len(data)), data
+
+
+def capture_path(directory: str, side: str, board_kiid: str = None) -> str:
+    """ Return path of new capture file for one connection, e.g. kicad-<board KIID>-<time>.fscap. """
+    os.makedirs(directory, exist_ok=True)
+    name = "-".join(part for part in (side, board_kiid, time.strftime("%Y%m%d-%H%M%S"), str(os.getpid())) if part)
+    return os.path.join(directory, f"{name}.fscap")
+
+
+def read_capture(path: str):
+    """
+    Yield records of capture file.
+    :return: generator of tuples (direction, timestamp, frame bytes)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            record = f.read(RECORD.size)
+            # Last record can be incomplete if application was killed while writing
+            if len(record) < RECORD.size:
+                return
+            direction, timestamp, length = RECORD.unpack(record)
+            frame = f.read(length)
+            if len(frame) < length:
+                return
+            yield direction, timestamp, frame
+
+
+def decode_records(path: str, encoding: str = "utf-8"):
+    """
+    Decode frames of both directions in recorded order, each direction with its own parser (same parser as
+    ConnectionHandler uses). Bulk frames recorded without payload are skipped.
+    :return: generator of tuples (direction, timestamp relative to first record, message type, request ID, decoded body)
+    """
+    parsers = {}
+    start = None
+    for direction, timestamp, frame in read_capture(path):
+        if start is None:
+            start = timestamp
+        if HEADER.unpack_from(frame)[2] & BULK_FLAG:
+            logger_capture.warning(f"Skipped {frame_type(frame)} frame at {timestamp - start:.3f} s, "
+                                   f"its payload file wasn't recorded")
+            continue
+        parser = parsers.setdefault(direction, FrameParser(encoding))
+        view = memoryview(frame)
+        decoded = None
+        while view:
+            buffer = parser.get_buffer()
+            length = min(len(buffer), len(view))
+            buffer[:length] = view[:length]
+            view = view[length:]
+            decoded = parser.buffer_updated(length)
+        if decoded is not None:
+            yield (direction, timestamp - start) + decoded
+
+
+def decode_capture(path: str, direction: bytes = RECEIVED, encoding: str = "utf-8"):
+    """
+    Decode frames of one direction (see decode_records).
+    :return: generator of tuples (timestamp relative to first record, message type, request ID, decoded body)
+    """
+    for record in decode_records(path, encoding):
+        if record[0] == direction:
+            yield record[1:]
+
+
+def replay_capture(path: str, handler, direction: bytes = RECEIVED, encoding: str = "utf-8",
+                   realtime: bool = False) -> dict:
+    """
+    Pass decoded frames to handler and measure how long handling takes.
+    :param handler: function(msg_type: str, request_id: int, data_raw)
+    :param realtime: bool (keep original spacing between frames, otherwise frames are passed as fast as possible)
+    :return: dict (message type -> [number of messages, total handler time in seconds, max handler time in seconds])
+    """
+    durations = {}
+    replay_start = time.monotonic()
+    for offset, msg_type, request_id, data_raw in decode_capture(path, direction, encoding):
+        if realtime:
+            time.sleep(max(replay_start + offset - time.monotonic(), 0))
+        start = time.perf_counter()
+        handler(msg_type, request_id, data_raw)
+        duration = time.perf_counter() - start
+        entry = durations.setdefault(msg_type, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+    return durations
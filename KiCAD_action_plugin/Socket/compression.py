@@ -0,0 +1,50 @@
+"""
+    Payload compression codecs used in message frames. Codec is negotiated when client connects (see framing.py).
+    Same module is used on KiCAD and FreeCAD side.
+"""
+import lzma
+import zlib
+
+# Codec name -> ID sent in frame header. "none" is always supported.
+CODECS = {"none": 0, "zlib": 1, "lzma": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODECS.items()}
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """ Compress data with codec (by name). """
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    elif codec == "lzma":
+        # Preset 1 is much faster than default (6) and still compresses repeated JSON keys very well
+        return lzma.compress(data, preset=1)
+    return data
+
+
+def decompress(data, codec_id: int) -> bytes:
+    """ Decompress bytes-like object (also memoryview of receive buffer) by codec ID from header. """
+    if codec_id == CODECS["zlib"]:
+        return zlib.decompress(data)
+    elif codec_id == CODECS["lzma"]:
+        return lzma.decompress(data)
+    elif codec_id == CODECS["none"]:
+        return data
+    raise ValueError(f"Unknown codec ID: {codec_id}")
+
+
+def decompressor(codec_id: int):
+    """ Return incremental decompress function for codec ID, called with consecutive chunks of compressed body. """
+    if codec_id == CODECS["zlib"]:
+        return zlib.decompressobj().decompress
+    elif codec_id == CODECS["lzma"]:
+        return lzma.LZMADecompressor().decompress
+    elif codec_id == CODECS["none"]:
+        return lambda data: data
+    raise ValueError(f"Unknown codec ID: {codec_id}")
+
+
+def negotiate(offered: list, preferred: list) -> str:
+    """ Return first codec from preferred list which is also offered by peer. Fall back to no compression. """
+    for codec in preferred:
+        if codec in offered and codec in CODECS:
+            return codec
+    return "none"
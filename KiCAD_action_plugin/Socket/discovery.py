@@ -0,0 +1,168 @@
+"""
+    Module contains function for finding FreeSync server on TCP port range.
+
+    All ports are probed at once with non-blocking sockets, so a port where packets are dropped (firewall) doesn't
+    delay the others by a whole TCP connect timeout. Every address of host is probed (e.g. "localhost" resolves to
+    both ::1 and 127.0.0.1, server may listen on only one of them). Whole search is limited by a single deadline.
+    Handshake is done with one connected server at a time (in order of connection), so only the chosen server sees
+    a new client. Other connected servers are disconnected without handshake.
+"""
+import errno
+import logging
+import selectors
+import socket
+import time
+
+from Socket.framing import HEADER, MAX_HELLO_LENGTH, parse_server_hello
+
+logger_discovery = logging.getLogger("DISCOVERY")
+
+# FreeSync server replies to hello right away, a server that doesn't is skipped after this many seconds
+PROBE_HANDSHAKE_TIMEOUT = 0.5
+
+
+class _Probe:
+    """ Non-blocking connection attempt to one port. """
+
+    def __init__(self, address_info: tuple, port: int):
+        family, socket_type, proto, _, address = address_info
+        self.port = port
+        self.address = address[:1] + (port,) + address[2:]
+        self.socket = socket.socket(family, socket_type, proto)
+        self.socket.setblocking(False)
+        # Bytes of hello frame still to send, bytes of reply received so far, body length from reply header
+        self.outgoing = b""
+        self.received = bytearray()
+        self.length = None
+        self.handshake_deadline = None
+
+    def close(self):
+        self.socket.close()
+
+
+def discover_server(host: str, ports: range, hello: bytes, timeout: float, should_abort=None):
+    """
+    Connect to every port at once, return first server which replies to handshake as a FreeSync server.
+    :param host: str
+    :param ports: range of ports to probe
+    :param hello: bytes (complete HELO frame with client's offer, see framing.client_hello)
+    :param timeout: float (deadline of whole search in seconds)
+    :param should_abort: function returning True if search should stop (checked a few times per second)
+    :return: tuple (blocking socket, negotiated parameters dict, port) or None if no server was found
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    addresses = []
+    for address_info in socket.getaddrinfo(host, ports.start, type=socket.SOCK_STREAM):
+        if address_info not in addresses:
+            addresses.append(address_info)
+    selector = selectors.DefaultSelector()
+    # Connected probes waiting for handshake, probe whose handshake is in progress
+    queue = []
+    active = None
+    result = None
+
+    for port in ports:
+        for address_info in addresses:
+            try:
+                probe = _Probe(address_info, port)
+            except OSError as e:
+                # Address family not supported on this machine (e.g. IPv6 disabled)
+                logger_discovery.debug(f"{address_info[4][0]}: {e}")
+                continue
+            error = probe.socket.connect_ex(probe.address)
+            if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                selector.register(probe.socket, selectors.EVENT_WRITE, probe)
+            else:
+                probe.close()
+
+    try:
+        while result is None and (selector.get_map() or queue) and not (should_abort and should_abort()):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                logger_discovery.debug(f"Port search deadline reached")
+                break
+            if active is not None and time.perf_counter() > active.handshake_deadline:
+                logger_discovery.debug(f"Port {active.port}: no reply to handshake")
+                selector.unregister(active.socket)
+                active.close()
+                active = None
+            # Start handshake with next connected server if none is in progress
+            if active is None and queue:
+                active = queue.pop(0)
+                active.outgoing = hello
+                active.handshake_deadline = time.perf_counter() + PROBE_HANDSHAKE_TIMEOUT
+                selector.register(active.socket, selectors.EVENT_READ | selectors.EVENT_WRITE, active)
+            for key, events in selector.select(timeout=min(remaining, 0.2)):
+                probe = key.data
+                try:
+                    if probe is active:
+                        result = _handshake_step(probe, events)
+                        if result is not None:
+                            break
+                        # Whole hello is sent, wait only for reply
+                        if not probe.outgoing and key.events & selectors.EVENT_WRITE:
+                            selector.modify(probe.socket, selectors.EVENT_READ, probe)
+                        continue
+                    # Connect finished (successfully or not)
+                    error = probe.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error:
+                        raise OSError(error, f"connect failed")
+                    selector.unregister(probe.socket)
+                    queue.append(probe)
+                    logger_discovery.debug(f"Port {probe.port} accepted connection "
+                                           f"after {(time.perf_counter() - start) * 1000:.1f} ms")
+                except (OSError, ValueError) as e:
+                    logger_discovery.debug(f"Port {probe.port}: {e}")
+                    selector.unregister(probe.socket)
+                    probe.close()
+                    if probe is active:
+                        active = None
+    finally:
+        for key in list(selector.get_map().values()):
+            if result is None or key.data.socket is not result[0]:
+                key.data.close()
+        for probe in queue:
+            probe.close()
+        selector.close()
+
+    elapsed = (time.perf_counter() - start) * 1000
+    if result is None:
+        logger_discovery.info(f"No server found on ports {ports.start}-{ports.stop - 1} ({elapsed:.1f} ms)")
+        return None
+    connection_socket, params, port = result
+    logger_discovery.info(f"Found server on port {port} in {elapsed:.1f} ms ({len(ports)} ports probed)")
+    return connection_socket, params, port
+
+
+def _handshake_step(probe: _Probe, events: int):
+    """
+    Send rest of hello frame or receive part of reply.
+    :return: tuple (socket, parameters, port) when valid reply is complete, None otherwise
+    """
+    if events & selectors.EVENT_WRITE and probe.outgoing:
+        sent = probe.socket.send(probe.outgoing)
+        probe.outgoing = probe.outgoing[sent:]
+    if not events & selectors.EVENT_READ:
+        return None
+
+    # Read exactly header, then declared body: frames server sends after its reply stay in socket for connection
+    wanted = HEADER.size if probe.length is None else HEADER.size + probe.length
+    chunk = probe.socket.recv(wanted - len(probe.received))
+    if not chunk:
+        raise OSError("connection closed during handshake")
+    probe.received += chunk
+    if probe.length is None:
+        if len(probe.received) < HEADER.size:
+            return None
+        msg_type, _, _, _, length = HEADER.unpack_from(probe.received)
+        if msg_type.rstrip(b"\0") != b"HELO" or length > MAX_HELLO_LENGTH:
+            raise ValueError(f"not a FreeSync server (reply starts with {bytes(probe.received[:6])!r})")
+        probe.length = length
+    if len(probe.received) < HEADER.size + probe.length:
+        return None
+
+    # Server's reply is never compressed
+    params = parse_server_hello(bytes(probe.received[HEADER.size:]))
+    probe.socket.setblocking(True)
+    return probe.socket, params, probe.port
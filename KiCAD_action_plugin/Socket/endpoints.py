@@ -0,0 +1,78 @@
+"""
+    Module contains functions for Unix domain socket addresses of sync sessions.
+    Same module is used on KiCAD and FreeCAD side.
+
+    KiCAD and FreeCAD usually run on the same machine, so a Unix domain socket is used instead of TCP when available.
+    Socket path is derived from board UUID (KIID), so multiple sessions (boards) can run at once without port search.
+    A generic path is used when FreeCAD document doesn't contain the board yet. TCP is the fallback.
+"""
+import errno
+import getpass
+import logging
+import os
+import socket
+import tempfile
+
+logger_endpoints = logging.getLogger("ENDPOINTS")
+
+# Windows builds of Python don't support AF_UNIX
+UNIX_SOCKETS_AVAILABLE = hasattr(socket, "AF_UNIX")
+# Name of socket used when board is not known yet
+GENERIC_NAME = "any"
+
+
+def socket_directory() -> str:
+    """ Return per-user directory for socket files (created if it doesn't exist). """
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = "user"
+    directory = os.path.join(tempfile.gettempdir(), f"freesync-{user}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return directory
+
+
+def unix_socket_path(board_kiid: str = None) -> str:
+    """ Return socket path for board with given KIID, or generic path if KIID is None. """
+    return os.path.join(socket_directory(), f"{board_kiid or GENERIC_NAME}.sock")
+
+
+def remove_stale_socket(path: str) -> bool:
+    """
+    Remove socket file left behind by a closed (crashed) server.
+    :return: bool (True if path is free to bind, False if another server is listening on it)
+    """
+    if not os.path.exists(path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError as e:
+        if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+        os.unlink(path)
+        logger_endpoints.debug(f"Removed stale socket file {path}")
+        return True
+    finally:
+        probe.close()
+    return False
+
+
+def connect_unix(board_kiid: str = None):
+    """
+    Connect to server listening for given board, otherwise to server listening on generic path.
+    :return: connected socket.socket or None if no server is listening
+    """
+    paths = [unix_socket_path(board_kiid)] if board_kiid else []
+    paths.append(unix_socket_path())
+    for path in paths:
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client_socket.connect(path)
+        except OSError as e:
+            logger_endpoints.debug(f"Connection to {path} failed: {e}")
+            client_socket.close()
+            continue
+        logger_endpoints.info(f"Connected to {path}")
+        return client_socket
+    return None
@@ -0,0 +1,261 @@
+"""
+    Module contains Merkle fingerprint of pcb data model, used to check that data models are in sync after a diff
+    was applied. Same module is used on KiCAD and FreeCAD side.
+
+    Tree levels: leaf per footprint / drawing (keyed by KIID), BUCKETS buckets per section (leaf is placed in bucket by
+    crc32 of its KIID, so same item is in same bucket on both sides regardless of list order), section root per list
+    in data model ("footprints", "drawings") and board root over general data and section roots.
+    Leaves are hashed from canonical JSON (sorted keys, integer valued floats as ints, other floats rounded to
+    FLOAT_DIGITS), so hash doesn't depend on dictionary order or float representation.
+
+    Fingerprint is built once per data model. Afterward only KIIDs in diffs passed to touch() are rehashed, together
+    with their buckets, section roots and board root.
+
+    Resync (REQSYN / SYN messages) repairs diverged data models without redrawing the board. FreeCAD requests
+    one level of KiCAD tree at a time and asks only for nodes that differ from its own tree:
+    "sections" -> "buckets" of divergent sections -> "leaves" of divergent buckets -> "entries" with divergent KIIDs.
+    Last reply contains KiCAD entries (and KIIDs KiCAD doesn't have), which are applied as a diff.
+"""
+import hashlib
+import json
+import zlib
+
+# Number of buckets per section
+BUCKETS = 256
+# Floats are rounded before hashing (coordinates are integers in nm, angles in degrees)
+FLOAT_DIGITS = 6
+# Properties not passed to updater in resync diff (entries are copied to data model after updating)
+BOOKKEEPING_KEYS = ("kiid", "ID", "hash")
+
+
+def _normalize(value):
+    """ Return copy of value with floats normalized, tuples as lists. """
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else round(value, FLOAT_DIGITS)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def leaf_digest(item) -> bytes:
+    """ Hash of one data model entry (footprint, drawing or general data). """
+    canonical = json.dumps(_normalize(item), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.md5(canonical.encode("utf-8")).digest()
+
+
+def bucket_of(kiid: str) -> int:
+    return zlib.crc32(kiid.encode("utf-8")) % BUCKETS
+
+
+class SectionTree:
+    """ Leaves and buckets of one list in data model (e.g. footprints). """
+
+    def __init__(self):
+        # KIID -> entry in data model (entries are updated in place by scanners and updaters)
+        self.items = {}
+        # Bucket -> {KIID: leaf digest}
+        self.buckets = [{} for _ in range(BUCKETS)]
+        self.bucket_digests = [hashlib.md5().digest()] * BUCKETS
+        self.dirty_buckets = set(range(BUCKETS))
+        self.root = None
+
+    def set_leaf(self, item: dict):
+        kiid = item["kiid"]
+        bucket = bucket_of(kiid)
+        self.items[kiid] = item
+        self.buckets[bucket][kiid] = leaf_digest(item)
+        self.dirty_buckets.add(bucket)
+
+    def remove_leaf(self, kiid: str):
+        if self.items.pop(kiid, None) is not None:
+            bucket = bucket_of(kiid)
+            del self.buckets[bucket][kiid]
+            self.dirty_buckets.add(bucket)
+
+    def refresh(self) -> bytes:
+        """ Rehash dirty buckets and section root, return section root. """
+        if self.dirty_buckets or self.root is None:
+            for bucket in self.dirty_buckets:
+                leaves = self.buckets[bucket]
+                self.bucket_digests[bucket] = hashlib.md5(
+                    b"".join(kiid.encode("utf-8") + leaves[kiid] for kiid in sorted(leaves))).digest()
+            self.dirty_buckets.clear()
+            self.root = hashlib.md5(b"".join(self.bucket_digests)).digest()
+        return self.root
+
+
+class ModelFingerprint:
+    """
+    Maintained Merkle fingerprint of one data model.
+    Call touch() with every diff that was applied to data model (by scanner or updater), root() returns board hash.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.general = None
+        self.sections = {}
+        # Section -> KIIDs to rehash, to remove and added entries (which have to be looked up in data model)
+        self.changed = {}
+        self.removed = {}
+        self.added = {}
+
+    def build(self, pcb: dict):
+        """ Hash whole data model. """
+        self.model = pcb
+        self.general = leaf_digest(pcb.get("general"))
+        self.sections = {}
+        for key, value in pcb.items():
+            if isinstance(value, list):
+                section = self.sections[key] = SectionTree()
+                for item in value:
+                    section.set_leaf(item)
+        self.changed, self.removed, self.added = {}, {}, {}
+
+    def touch(self, diff: dict):
+        """ Mark entries in diff (added, changed or removed) for rehashing. """
+        for key, section_diff in (diff or {}).items():
+            if not isinstance(section_diff, dict):
+                continue
+            for entry in section_diff.get("changed") or []:
+                self.changed.setdefault(key, set()).update(entry.keys())
+            for kiid in section_diff.get("removed") or []:
+                self.removed.setdefault(key, set()).add(kiid)
+            for item in section_diff.get("added") or []:
+                self.added.setdefault(key, set()).add(item.get("kiid"))
+
+    def root(self, pcb: dict) -> str:
+        """ Return board hash of data model (hex string). Whole model is hashed only if it is a new data model. """
+        if pcb is not self.model:
+            self.build(pcb)
+        self.general = leaf_digest(pcb.get("general"))
+
+        for key in set(self.changed) | set(self.removed) | set(self.added):
+            section = self.sections.setdefault(key, SectionTree())
+            added = self.added.get(key, set())
+            for kiid in self.removed.get(key, set()) - added:
+                section.remove_leaf(kiid)
+            for kiid in self.changed.get(key, set()) - added:
+                item = section.items.get(kiid)
+                if item is not None:
+                    section.set_leaf(item)
+            if added:
+                self._find_added(section, pcb.get(key) or [], added)
+        self.changed, self.removed, self.added = {}, {}, {}
+
+        board = hashlib.md5(self.general)
+        for key in sorted(self.sections):
+            board.update(key.encode("utf-8"))
+            board.update(self.sections[key].refresh())
+        return board.hexdigest()
+
+    @staticmethod
+    def _find_added(section: SectionTree, entries: list, added: set):
+        """ Hash added entries. They are appended to data model, so list is searched from the end. """
+        missing = set(added)
+        for item in reversed(entries):
+            if item.get("kiid") in missing:
+                section.set_leaf(item)
+                missing.discard(item.get("kiid"))
+                if not missing:
+                    break
+        # Entries in diff that are not in data model (e.g. drawings from FC replaced by drawings with valid KIID)
+        for kiid in missing:
+            section.remove_leaf(kiid)
+
+    def resync_reply(self, pcb: dict, request: dict) -> dict:
+        """ KiCAD side of resync: return requested level of tree (request parameters are echoed in reply). """
+        board_hash = self.root(pcb)
+        level = request.get("level")
+        if level == "sections":
+            return {"level": level, "sections": {key: section.root.hex() for key, section in self.sections.items()}}
+        if level == "buckets":
+            return {"level": level,
+                    "buckets": {key: [digest.hex() for digest in self.sections.get(key, SectionTree()).bucket_digests]
+                                for key in request.get("sections")}}
+        if level == "leaves":
+            leaves = {}
+            for key, buckets in request.get("buckets").items():
+                section = self.sections.get(key, SectionTree())
+                leaves[key] = {kiid: digest.hex()
+                               for bucket in buckets for kiid, digest in section.buckets[bucket].items()}
+            return {"level": level, "buckets": request.get("buckets"), "leaves": leaves}
+        if level == "entries":
+            entries, removed = {}, {}
+            for key, kiids in request.get("entries").items():
+                section = self.sections.get(key, SectionTree())
+                entries[key] = [section.items[kiid] for kiid in kiids if kiid in section.items]
+                removed[key] = [kiid for kiid in kiids if kiid not in section.items]
+            return {"level": level, "general": pcb.get("general"), "entries": entries, "removed": removed,
+                    "hash": board_hash}
+        raise ValueError(f"Unknown resync level: {level}")
+
+    def resync_request(self, pcb: dict, reply: dict) -> dict | None:
+        """
+        FreeCAD side of resync: compare reply with own tree.
+        :return: dict (request of next level, only with divergent nodes) or None if reply contains entries
+        """
+        self.root(pcb)
+        level = reply.get("level")
+        if level == "sections":
+            remote = reply.get("sections")
+            divergent = [key for key in sorted(set(self.sections) | set(remote))
+                         if key not in self.sections or self.sections[key].root.hex() != remote.get(key)]
+            return {"level": "buckets", "sections": divergent}
+        if level == "buckets":
+            buckets = {}
+            for key, remote in reply.get("buckets").items():
+                local = self.sections.get(key, SectionTree()).bucket_digests
+                buckets[key] = [bucket for bucket, digest in enumerate(remote) if local[bucket].hex() != digest]
+            return {"level": "leaves", "buckets": buckets}
+        if level == "leaves":
+            entries = {}
+            for key, remote in reply.get("leaves").items():
+                section = self.sections.get(key, SectionTree())
+                local = {kiid: digest.hex() for bucket in reply.get("buckets").get(key)
+                         for kiid, digest in section.buckets[bucket].items()}
+                entries[key] = sorted(kiid for kiid in set(local) | set(remote) if local.get(kiid) != remote.get(kiid))
+            return {"level": "entries", "entries": entries}
+        return None
+
+    def resync_diff(self, reply: dict) -> dict:
+        """
+        Return diff (same format as scanner diff) which turns own data model into KiCAD data model.
+        Changed entries contain every property which differs, except BOOKKEEPING_KEYS.
+        """
+        diff = {}
+        for key, entries in reply.get("entries").items():
+            section = self.sections.get(key, SectionTree())
+            added, changed = [], []
+            for entry in entries:
+                local = section.items.get(entry["kiid"])
+                if local is None:
+                    added.append(entry)
+                else:
+                    changed.append({entry["kiid"]: {name: value for name, value in entry.items()
+                                                    if local.get(name) != value and name not in BOOKKEEPING_KEYS}})
+            section_diff = {}
+            for name, value in (("added", added), ("changed", changed), ("removed", reply.get("removed").get(key))):
+                if value:
+                    section_diff.update({name: value})
+            if section_diff:
+                diff.update({key: section_diff})
+        return diff
+
+    def copy_entries(self, reply: dict):
+        """
+        Copy KiCAD entries of last resync reply over own entries, after resync diff was applied to data model (diff
+        leaves out BOOKKEEPING_KEYS). Added entries are the reply entries themselves.
+        """
+        for key, entries in reply.get("entries").items():
+            for entry in entries:
+                local_entry = self.entry(key, entry["kiid"])
+                if local_entry is not None and local_entry is not entry:
+                    local_entry.clear()
+                    local_entry.update(entry)
+
+    def entry(self, key: str, kiid: str) -> dict | None:
+        """ Return data model entry by KIID (without searching the list). """
+        section = self.sections.get(key)
+        return section.items.get(kiid) if section else None
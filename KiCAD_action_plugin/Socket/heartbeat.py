@@ -0,0 +1,76 @@
+"""
+    Module contains heartbeat messages and round trip time statistics.
+    Same module is used on KiCAD and FreeCAD side.
+
+    Both sides send PING frame with own timestamp every heartbeat_interval seconds, peer replies right away (from
+    socket thread, not main thread) with PONG carrying the same timestamp. Round trip time is therefore network and
+    socket latency only, without scan/update time. Connection is closed if nothing is received from peer for
+    liveness_timeout seconds.
+"""
+import collections
+import json
+import time
+
+# Number of round trip samples kept for statistics
+RTT_WINDOW = 50
+
+
+def ping_body() -> bytes:
+    """ Return body of PING frame: timestamp of sender. """
+    return json.dumps({"t": time.monotonic()}).encode("ascii")
+
+
+def rtt_from_pong(data_raw) -> float:
+    """ Return round trip time in seconds from body of PONG frame (echoed PING body). """
+    return time.monotonic() - json.loads(data_raw)["t"]
+
+
+class Liveness:
+    """
+    Time when bytes were last received from peer (also during a long frame). Peer is considered dead if nothing is
+    received for timeout seconds, handlers check it before sending every heartbeat.
+    :param timeout: float (seconds, 0 disables the check)
+    :param clock: function returning monotonic time in seconds
+    """
+
+    def __init__(self, timeout: float, clock=time.monotonic):
+        self.timeout = timeout
+        self._clock = clock
+        self.last_received = clock()
+
+    def received(self):
+        self.last_received = self._clock()
+
+    @property
+    def silent(self) -> float:
+        """ Seconds since bytes were last received. """
+        return self._clock() - self.last_received
+
+    @property
+    def expired(self) -> bool:
+        return 0 < self.timeout < self.silent
+
+
+class RttStats:
+    """ Rolling round trip time statistics of last RTT_WINDOW heartbeats. """
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen=RTT_WINDOW)
+
+    def add(self, rtt: float):
+        self.samples.append(rtt)
+
+    @property
+    def last(self) -> float:
+        return self.samples[-1] if self.samples else 0.0
+
+    @property
+    def mean(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def summary(self) -> str:
+        """ Return short text for GUI and logs. """
+        if not self.samples:
+            return "RTT: no samples"
+        return (f"RTT: {self.last * 1000:.2f} ms (min {min(self.samples) * 1000:.2f}, mean {self.mean * 1000:.2f}, "
+                f"max {max(self.samples) * 1000:.2f} ms)")
@@ -0,0 +1,230 @@
+"""
+    Module contains incremental JSON decoder for large frame bodies. Same module is used on KiCAD and FreeCAD side.
+
+    FrameParser normally receives whole body, decompresses it to bytes, decodes bytes to str and handler parses str to
+    dictionary, so a big data model is held in memory three times. Large json bodies are instead fed to this decoder
+    chunk by chunk as they arrive from socket (after incremental decompression and utf-8 decoding). Objects and arrays
+    up to STREAM_DEPTH levels deep (e.g. top level -> "footprints" list, or REP top level -> "diff" -> "footprints" ->
+    "changed" list) are built incrementally. Elements of arrays (single footprint, drawing or change) are entries: they
+    are parsed with json as soon as they are complete and passed to on_entry callback.
+    Only the unparsed rest of the text (about one entry) and the result are kept in memory.
+
+    Complete entries of received piece are parsed with single json call where possible ("[" + entries + "]"): json
+    shares dictionary keys only within one call, and one call per entry would be about twice as slow. Batch can only
+    be parsed if it ends exactly at end of an entry, otherwise entries are parsed one by one.
+"""
+import codecs
+import json
+import re
+
+from Socket.compression import decompressor
+
+# Containers on first levels are built incrementally (outside of arrays), values below are parsed at once
+STREAM_DEPTH = 4
+
+_WHITESPACE = " \t\n\r"
+# Rest of text after a number that may still be part of it (e.g. "1." or "1e" at end of piece)
+_NUMBER_CONTINUATION = re.compile(r"[0-9.eE+\-]*\Z")
+_decoder = json.JSONDecoder()
+
+# Separators between objects in array (default json.dumps separators and compact)
+_OBJECT_SEPARATORS = ("}, {", "},{")
+# Minimal length of text worth parsing as batch
+_BATCH_LENGTH = 4096
+
+# Parser states
+_KEY_OR_END, _KEY, _COLON, _VALUE_OR_END, _VALUE, _COMMA_OR_END = range(6)
+
+
+class _Container:
+    """ Object or array which is being built: value, key path from root and parser state. """
+
+    __slots__ = ("value", "path", "state", "key")
+
+    def __init__(self, value, path: tuple):
+        self.value = value
+        self.path = path
+        self.state = _KEY_OR_END if isinstance(value, dict) else _VALUE_OR_END
+        self.key = None
+
+
+class JsonStreamDecoder:
+    """
+    Incremental JSON decoder: feed text in arbitrary pieces, result is returned by close().
+    :param on_entry: function(path: tuple, entry) or None, called for every completed element of an array
+                     (path is tuple of keys to the array, e.g. ("footprints",)), before it is added to result
+    :param depth: int (number of container levels which are built incrementally)
+    """
+
+    def __init__(self, on_entry=None, depth: int = STREAM_DEPTH):
+        self.on_entry = on_entry
+        self.depth = depth
+        self._text = ""
+        self._position = 0
+        # Pending value is not retried until text grows to this length (avoids reparsing large entry on every piece)
+        self._retry_length = 0
+        self._stack = []
+        self._result = None
+        self._done = False
+
+    def feed(self, text: str):
+        self._text = self._text[self._position:] + text if self._position else self._text + text
+        self._retry_length -= self._position
+        self._position = 0
+        if len(self._text) >= self._retry_length:
+            self._parse(final=False)
+
+    def close(self):
+        """ Parse rest of text and return decoded value. Raises ValueError if document is incomplete. """
+        self._parse(final=True)
+        if not self._done:
+            raise ValueError(f"Incomplete JSON document ({len(self._text) - self._position} characters pending)")
+        return self._result
+
+    def _parse(self, final: bool):
+        text = self._text
+        while True:
+            position = self._skip_whitespace(text, self._position)
+            self._position = position
+            if position >= len(text):
+                return
+            if self._done:
+                raise ValueError(f"Extra data at position {position}")
+            char = text[position]
+
+            if not self._stack:
+                if not self._parse_value(text, position, final):
+                    return
+                continue
+
+            container = self._stack[-1]
+            state = container.state
+            if state in (_KEY_OR_END, _VALUE_OR_END, _COMMA_OR_END) and char in "}]":
+                self._close_container(char)
+            elif state == _COMMA_OR_END:
+                if char != ",":
+                    raise ValueError(f"Expecting ',' at position {position}")
+                container.state = _KEY if isinstance(container.value, dict) else _VALUE
+                self._position = position + 1
+            elif state in (_KEY_OR_END, _KEY):
+                if char != '"':
+                    raise ValueError(f"Expecting property name at position {position}")
+                try:
+                    container.key, end = _decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    self._wait(position)
+                    return
+                container.state = _COLON
+                self._position = end
+            elif state == _COLON:
+                if char != ":":
+                    raise ValueError(f"Expecting ':' at position {position}")
+                container.state = _VALUE
+                self._position = position + 1
+            elif not self._parse_value(text, position, final):
+                return
+
+    def _parse_value(self, text: str, position: int, final: bool) -> bool:
+        """ Start container or parse complete value at position. Returns False if more text is needed. """
+        char = text[position]
+        parent = self._stack[-1] if self._stack else None
+        if char in "{[" and len(self._stack) < self.depth and (parent is None or isinstance(parent.value, dict)):
+            path = () if parent is None else parent.path + (parent.key,)
+            self._stack.append(_Container({} if char == "{" else [], path))
+            self._position = position + 1
+            return True
+        # Entries of array
+        if (char == "{" and parent is not None and isinstance(parent.value, list)
+                and len(text) - position >= _BATCH_LENGTH and self._parse_batch(text, position)):
+            return True
+        try:
+            value, end = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            self._wait(position)
+            return False
+        # Number at end of text can continue in next piece (also when piece ends after its "." or exponent)
+        if not final and type(value) in (int, float) and _NUMBER_CONTINUATION.match(text, end):
+            self._wait(position)
+            return False
+        self._position = end
+        self._add(value)
+        return True
+
+    def _parse_batch(self, text: str, position: int) -> bool:
+        """ Parse complete objects from position to last separator between objects with one json call. """
+        end = max(text.rfind(separator, position) for separator in _OBJECT_SEPARATORS)
+        if end < 0:
+            return False
+        try:
+            entries = json.loads("[" + text[position:end + 1] + "]")
+        except json.JSONDecodeError:
+            # Separator was inside of an entry (e.g. list of 3d models)
+            return False
+        for entry in entries:
+            self._add(entry)
+        # Continue after last entry, separator is parsed in next state
+        self._position = end + 1
+        return True
+
+    def _close_container(self, char: str):
+        container = self._stack[-1]
+        if (char == "}") != isinstance(container.value, dict):
+            raise ValueError(f"Unexpected '{char}' at position {self._position}")
+        self._stack.pop()
+        self._position += 1
+        self._add(container.value)
+
+    def _add(self, value):
+        """ Attach completed value to parent container (or make it result). """
+        if not self._stack:
+            self._result = value
+            self._done = True
+            return
+        parent = self._stack[-1]
+        if isinstance(parent.value, dict):
+            parent.value[parent.key] = value
+        else:
+            if self.on_entry is not None:
+                self.on_entry(parent.path, value)
+            parent.value.append(value)
+        parent.state = _COMMA_OR_END
+
+    def _wait(self, position: int):
+        """ Value starting at position is incomplete: retry when pending text has doubled. """
+        self._retry_length = len(self._text) + (len(self._text) - position)
+
+    @staticmethod
+    def _skip_whitespace(text: str, position: int) -> int:
+        while position < len(text) and text[position] in _WHITESPACE:
+            position += 1
+        return position
+
+
+class BodyStream:
+    """
+    Decode compressed json body from consecutive chunks: decompress, decode text and parse incrementally.
+    :param codec_id: int (codec ID from frame header)
+    :param encoding: str
+    :param on_entry: function(path, entry) or None (see JsonStreamDecoder)
+    """
+
+    def __init__(self, codec_id: int, encoding: str, on_entry=None):
+        self._decompress = decompressor(codec_id)
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._json_decoder = JsonStreamDecoder(on_entry)
+        # Number of decompressed bytes (for transfer statistics)
+        self.length = 0
+
+    def feed(self, chunk):
+        data = self._decompress(chunk)
+        self.length += len(data)
+        self._json_decoder.feed(self._text_decoder.decode(data))
+
+    def close(self):
+        """ Return decoded body. """
+        self._json_decoder.feed(self._text_decoder.decode(b"", final=True))
+        return self._json_decoder.close()
@@ -0,0 +1,160 @@
+"""
+    Module contains FrameWriter thread, which sends all outgoing frames of one connection.
+    Callers (e.g. wx main thread) only put encoded frames into a bounded queue, so a large PCB message never blocks
+    the GUI. Frames which are queued at the same time are sent together with one scatter-gather call.
+    Control frames (see framing.PRIORITY_TYPES) have their own queue and are sent before queued data messages. A large
+    message is queued as fragments (see framing.fragment_frame) and every batch is limited to MAX_BATCH_BYTES, so a
+    control frame waits for at most one batch instead of the whole message.
+    Frames are recorded to capture (if any) after they are sent, in the order they were sent in.
+"""
+import collections
+import logging
+import socket
+import threading
+
+from Socket.capture import SENT, inline_bulk
+
+logger_writer = logging.getLogger("WRITER")
+
+# Maximum number of buffers passed to one sendmsg call (IOV_MAX is at least 1024 on Linux and macOS)
+MAX_BUFFERS = 512
+# Data frames sent in one batch (at least one frame), control frames queued meanwhile are sent before next batch
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class FrameWriter(threading.Thread):
+    """
+    Send frames from queues until stop is called. Queued control frames are sent before stopping (e.g. disconnect
+    message), queued data messages are dropped.
+    :param connection_socket: socket.socket object (blocking, receiving is done by another thread)
+    :param max_queue: int (maximum number of queued messages, enqueue fails when queue is full)
+    :param on_error: function(exception), called in writer thread if sending fails
+    :param capture: CaptureWriter object or None (records sent frames)
+    """
+
+    def __init__(self, connection_socket, max_queue: int = 256, on_error=None, capture=None):
+        super().__init__(name="FreeSyncWriter", daemon=True)
+        self._socket = connection_socket
+        self._max_queue = max_queue
+        self._on_error = on_error
+        self._capture = capture
+        self._condition = threading.Condition()
+        # Data messages (each a deque of its frames, more than one if fragmented) and control frames
+        self._messages = collections.deque()
+        self._priority = collections.deque()
+        self._stopping = False
+        self._bytes_pending = 0
+        self._failed = False
+        # Frames are small compared to round trip time, don't wait for more data before sending (Nagle's algorithm)
+        if connection_socket.family in (socket.AF_INET, socket.AF_INET6):
+            connection_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    @property
+    def queue_depth(self) -> int:
+        """ Number of messages waiting to be sent. """
+        return len(self._messages) + len(self._priority)
+
+    @property
+    def bytes_pending(self) -> int:
+        """ Number of bytes queued but not sent yet. """
+        return self._bytes_pending
+
+    def enqueue(self, header: bytes, body: bytes, priority: bool = False) -> bool:
+        """
+        Queue frame for sending, never blocks.
+        :param priority: bool (control frame, sent before queued data messages)
+        :return: bool (False if queue is full or writer has failed, frame is dropped)
+        """
+        return self.enqueue_frames([(header, body)], priority)
+
+    def enqueue_frames(self, frames: list, priority: bool = False) -> bool:
+        """
+        Queue frames of one message (e.g. fragments), they are sent in order. Never blocks.
+        :param frames: list of tuples (header, body)
+        :param priority: bool (control frames, sent before queued data messages)
+        :return: bool (False if queue is full or writer has failed, message is dropped)
+        """
+        if self._failed:
+            return False
+        with self._condition:
+            queue = self._priority if priority else self._messages
+            if self._stopping or len(queue) >= self._max_queue:
+                return False
+            if priority:
+                queue.extend(frames)
+            else:
+                queue.append(collections.deque(frames))
+            self._bytes_pending += sum(len(header) + len(body) for header, body in frames)
+            self._condition.notify()
+        return True
+
+    def stop(self, timeout: float = None):
+        """ Send queued control frames, drop queued data messages, then stop thread (waits for thread to finish). """
+        with self._condition:
+            self._stopping = True
+            self._bytes_pending -= sum(len(header) + len(body)
+                                       for frames in self._messages for header, body in frames)
+            self._messages.clear()
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not (self._priority or self._messages or self._stopping):
+                    self._condition.wait()
+                buffers = self._next_batch()
+            if not buffers:
+                # Stopping and nothing left to send
+                return
+
+            if not self._failed:
+                frames = []
+                if self._capture is not None:
+                    # Payload of bulk frames is copied before sending, peer removes its file after reading
+                    frames = [inline_bulk(header, body) for header, body in zip(buffers[0::2], buffers[1::2])]
+                try:
+                    self._send_buffers(buffers)
+                except OSError as e:
+                    # Following frames are dropped, reader thread notices closed connection
+                    logger_writer.error(f"Sending failed: {e}")
+                    self._failed = True
+                    if self._on_error:
+                        self._on_error(e)
+                else:
+                    for header, body in frames:
+                        self._capture.record(SENT, header, body)
+            with self._condition:
+                self._bytes_pending -= sum(len(buffer) for buffer in buffers)
+
+    def _next_batch(self) -> list:
+        """ Take control frames and then data frames (up to MAX_BATCH_BYTES) from queues, return their buffers. """
+        buffers = []
+        while self._priority and len(buffers) < MAX_BUFFERS:
+            buffers.extend(self._priority.popleft())
+        batch_bytes = 0
+        while self._messages and len(buffers) < MAX_BUFFERS and batch_bytes < MAX_BATCH_BYTES:
+            frames = self._messages[0]
+            header, body = frames.popleft()
+            buffers += (header, body)
+            batch_bytes += len(header) + len(body)
+            if not frames:
+                self._messages.popleft()
+        return buffers
+
+    def _send_buffers(self, buffers: list):
+        """ Send all buffers, with sendmsg (one system call for several buffers) where available. """
+        if not hasattr(self._socket, "sendmsg"):
+            # Windows: joining is cheaper than a system call per buffer
+            self._socket.sendall(b"".join(buffers))
+            return
+        views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+        while views:
+            sent = self._socket.sendmsg(views)
+            # Short write: drop fully sent buffers, keep rest of partially sent one
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views and sent:
+                views[0] = views[0][sent:]
@@ -0,0 +1,59 @@
+"""
+    Tests of modules which don't need KiCAD or FreeCAD, run from repository root: python -m pytest tests
+    Shared Socket modules are imported from KiCAD plugin (same modules are used on FreeCAD side).
+"""
+import os
+import random
+import sys
+import uuid
+
+import pytest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KiCAD_action_plugin"))
+
+
+def make_pcb(footprint_count: int, drawing_count: int = 100, seed: int = 0) -> dict:
+    """ Return data model with same structure as PcbScanner.get_pcb output (same seed gives same data model). """
+    rng = random.Random(seed)
+
+    def kiid() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128)))
+
+    def point() -> list:
+        return [rng.randint(0, 200000000), rng.randint(0, 150000000)]
+
+    drawings = [{"shape": "Line", "start": point(), "end": point(), "hash": f"{rng.getrandbits(128):032x}",
+                 "ID": i + 1, "kiid": kiid()}
+                for i in range(drawing_count)]
+    footprints = []
+    for i in range(footprint_count):
+        footprint = {"id": "Resistor_SMD:R_0603_1608Metric", "ref": f"R{i + 1}", "pos": point(),
+                     "rot": rng.choice([0.0, 90.0, 180.0, -90.0]), "layer": rng.choice(["Top", "Bot"])}
+        # Through hole pads come before models (same key order as scanner)
+        if i % 10 == 0:
+            footprint["pads_pth"] = [{"pos_delta": [0, 0], "hole_size": [3200000, 3200000], "hash": rng.getrandbits(63),
+                                      "kiid": kiid()}]
+        footprint["3d_models"] = [{"model_id": "000",
+                                   "filename": "/Resistor_SMD.3dshapes/R_0603_1608Metric",
+                                   "absolute_path": "/usr/share/kicad/3dmodels/Resistor_SMD.3dshapes/"
+                                                    "R_0603_1608Metric.wrl",
+                                   "offset": [0.0, 0.0, 0.0], "scale": [1.0, 1.0, 1.0], "rot": [0.0, 0.0, 0.0]}]
+        footprint.update({"hash": f"{rng.getrandbits(128):032x}", "ID": i + 1, "kiid": kiid()})
+        footprints.append(footprint)
+    return {"general": {"pcb_name": f"test_{footprint_count}", "pcb_id": "ab12", "kiid": kiid(),
+                        "thickness": 1600000, "file_directory": "/tmp"},
+            "drawings": drawings,
+            "footprints": footprints}
+
+
+@pytest.fixture(scope="session")
+def pcb() -> dict:
+    # About 8 MB as json
+    return make_pcb(10000)
+
+
+@pytest.fixture
+def small_pcb() -> dict:
+    """ Fresh data model of a small board (test may modify it). """
+    return make_pcb(200, drawing_count=20)
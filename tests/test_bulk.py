@@ -0,0 +1,22 @@
+"""
+    Payload files of one connection are removed when it closes, files of other connections are kept.
+"""
+import os
+
+from Socket.bulk import bulk_directory, new_bulk_prefix, read_bulk, remove_bulk_files, write_bulk
+
+
+def test_only_files_of_closed_connection_are_removed():
+    closed, connected = new_bulk_prefix(), new_bulk_prefix()
+    assert closed != connected
+    written = write_bulk(b"closed", prefix=closed)
+    kept = write_bulk(b"connected", prefix=connected)
+    try:
+        remove_bulk_files(closed)
+
+        assert not os.path.exists(os.path.join(bulk_directory(), written["name"]))
+        with read_bulk(kept) as view:
+            assert bytes(view) == b"connected"
+    finally:
+        remove_bulk_files(closed)
+        remove_bulk_files(connected)
@@ -0,0 +1,75 @@
+"""
+    Sent frames are recorded in the order they are sent in (control frames overtake queued data). Bulk frames are
+    recorded with their payload, so they can be decoded after receiver removed payload file.
+"""
+import concurrent.futures
+import json
+import socket
+import time
+
+from Socket.bulk import read_bulk
+from Socket.capture import RECEIVED, SENT, CaptureWriter, decode_capture, read_capture
+from Socket.framing import BULK_FLAG, HEADER, encode_frame
+from Socket.writer import FrameWriter
+
+
+def _receive_all(connection_socket) -> bytes:
+    data = bytearray()
+    while chunk := connection_socket.recv(65536):
+        data += chunk
+    return bytes(data)
+
+
+def test_sent_frames_are_recorded_in_wire_order(tmp_path):
+    path = str(tmp_path / "writer.fscap")
+    capture = CaptureWriter(path)
+    sender, receiver = socket.socketpair()
+    writer = FrameWriter(sender, capture=capture)
+    # Queued before writer runs: PING is sent ahead of both data messages
+    writer.enqueue(*encode_frame("DIF", b'{"footprints": {}}', request_id=1))
+    writer.enqueue(*encode_frame("PCB", b"[" + b"0," * 100000 + b"0]", request_id=2))
+    writer.enqueue(*encode_frame("PING", b"1"), priority=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        wire = executor.submit(_receive_all, receiver)
+        writer.start()
+        # Queued data messages are dropped by stop, wait until they are sent
+        deadline = time.monotonic() + 5
+        while writer.bytes_pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.stop(timeout=5)
+        sender.close()
+        wire = wire.result(timeout=5)
+    receiver.close()
+    capture.close()
+    records = [frame for _, _, frame in read_capture(path)]
+    assert b"".join(records) == wire
+    assert [frame[:6].rstrip(b"\0") for frame in records] == [b"PING", b"DIF", b"PCB"]
+
+
+def test_bulk_frame_is_recorded_with_payload(tmp_path):
+    path = str(tmp_path / "bulk.fscap")
+    capture = CaptureWriter(path)
+    data = json.dumps({"footprints": [{"ref": f"R{i}"} for i in range(1000)]}).encode()
+    header, body = encode_frame("PCB", data, bulk_threshold=1024, bulk_prefix="test")
+    assert HEADER.unpack(header)[2] & BULK_FLAG
+
+    capture.record(RECEIVED, header, body)
+    # Receiver removes payload file after reading it
+    with read_bulk(json.loads(body)) as view:
+        assert bytes(view) == data
+    capture.close()
+
+    assert [frame[1:] for frame in decode_capture(path)] == [("PCB", 0, data.decode())]
+
+
+def test_bulk_frame_without_payload_is_skipped(tmp_path):
+    path = str(tmp_path / "missing.fscap")
+    capture = CaptureWriter(path)
+    header, body = encode_frame("PCB", b"[" + b"0," * 1000 + b"0]", bulk_threshold=1024, bulk_prefix="test")
+    with read_bulk(json.loads(body)):
+        pass
+    capture.record(SENT, header, body)
+    capture.record(SENT, *encode_frame("PCBEND", b""))
+    capture.close()
+
+    assert [frame[1] for frame in decode_capture(path, direction=SENT)] == ["PCBEND"]
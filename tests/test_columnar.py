@@ -0,0 +1,116 @@
+"""
+    Columnar payload decodes to exactly the data model that was encoded (same keys, key order and int/float types as
+    json.loads of plain json payload), so FcPartDrawer gets the same dictionaries with either payload format.
+"""
+import copy
+import json
+
+import pytest
+
+from Socket.columnar import decode_pcb, encode_pcb
+
+
+def _drawings() -> list:
+    """ Drawing of every shape, with UUID KIIDs and md5 hashes. """
+    kiid = "0e4bd8a2-5a3c-4f55-9c1e-{:012x}"
+    md5 = "{:032x}"
+    return [{"shape": "Line", "start": [0, 0], "end": [100000000, -5], "hash": md5.format(1), "ID": 1,
+             "kiid": kiid.format(1)},
+            {"shape": "Rect", "points": [[0, 0], [10, 0], [10, 10], [0, 10]], "hash": md5.format(2), "ID": 2,
+             "kiid": kiid.format(2)},
+            {"shape": "Polygon", "points": [[1, 2], [3, 4], [5, 6]], "hash": md5.format(3), "ID": 3,
+             "kiid": kiid.format(3)},
+            {"shape": "Circle", "center": [2 ** 40, -2 ** 40], "radius": 1500000, "hash": md5.format(4), "ID": 4,
+             "kiid": kiid.format(4)},
+            {"shape": "Arc", "points": [[0, 0], [5, 5], [10, 0]], "hash": md5.format(5), "ID": 5,
+             "kiid": kiid.format(5)}]
+
+
+def _with_pads(footprint: dict, pads: list) -> dict:
+    """ Return footprint with "pads_pth" in place where scanner puts it (before "3d_models"). """
+    footprint = {key: value for key, value in footprint.items() if key != "pads_pth"}
+    keys = list(footprint)
+    position = keys.index("3d_models")
+    return dict([(key, footprint[key]) for key in keys[:position]] + [("pads_pth", pads)]
+                + [(key, footprint[key]) for key in keys[position:]])
+
+
+def _with_overflow(pcb: dict) -> dict:
+    """ Entries which don't fit into columns are kept as json at their index. """
+    footprints, drawings = pcb["footprints"], pcb["drawings"]
+    # Unexpected key, float coordinates, unknown layer
+    footprints[3] = dict(footprints[3], extra={"note": "kept"})
+    footprints[4]["pos"] = [1.5, 2.5]
+    footprints[5]["layer"] = "In1.Cu"
+    # Unknown shape, extra key, missing key
+    drawings[1] = {"shape": "Bezier", "points": [[0, 0], [1, 1], [2, 2], [3, 3]], "hash": "h", "ID": 2, "kiid": "k"}
+    drawings[2] = dict(drawings[2], width=150000)
+    del drawings[3]["hash"]
+    return pcb
+
+
+def _with_unusual_values(pcb: dict) -> dict:
+    """ Values stored through string table instead of raw bytes, nullable and empty columns. """
+    footprints, drawings = pcb["footprints"], pcb["drawings"]
+    # Unresolved model path, footprint without models and with several models
+    footprints[0]["3d_models"][0]["absolute_path"] = None
+    footprints[1]["3d_models"] = []
+    footprints[2]["3d_models"] = footprints[2]["3d_models"] + [dict(footprints[2]["3d_models"][0], model_id="001",
+                                                                    offset=[0.5, -0.25, 1e-3])]
+    # Footprint with empty pad list (differs from footprint without "pads_pth" key) and with several pads
+    footprints[6] = _with_pads(footprints[6], [])
+    footprints[7] = _with_pads(footprints[7], [dict(pad, kiid=f"pad-{i}")
+                                               for i, pad in enumerate(footprints[0]["pads_pth"] * 3)])
+    footprints[8]["ref"] = "Ω1 ünïcode"
+    # KIIDs of entries drawn in FreeCAD before KiCAD assigned them, hashes that are not md5
+    footprints[9]["kiid"] = "fc-footprint-9"
+    for i, drawing in enumerate(drawings):
+        drawing["kiid"] = f"fc-drawing-{i}"
+        drawing["hash"] = str(i)
+    return pcb
+
+
+def _empty_sections(pcb: dict) -> dict:
+    pcb["footprints"] = []
+    pcb["drawings"] = []
+    return pcb
+
+
+def _only_overflow(pcb: dict) -> dict:
+    pcb["footprints"] = [{"kiid": "a"}, {"kiid": "b", "pos": None}]
+    pcb["drawings"] = [{"shape": "Spline"}]
+    return pcb
+
+
+def _extra_sections(pcb: dict) -> dict:
+    """ Unknown sections and key order are kept. """
+    return {"vias": [{"kiid": "v1", "center": [0, 0]}], "footprints": pcb["footprints"], "general": pcb["general"],
+            "version": 3}
+
+
+@pytest.mark.parametrize("variant", [lambda pcb: pcb, _with_overflow, _with_unusual_values, _empty_sections,
+                                     _only_overflow, _extra_sections],
+                         ids=["plain", "overflow", "unusual_values", "empty_sections", "only_overflow",
+                              "extra_sections"])
+def test_round_trip_equals_plain_model(small_pcb, variant):
+    small_pcb["drawings"][:5] = _drawings()
+    pcb = variant(small_pcb)
+    plain = json.loads(json.dumps(pcb))
+
+    decoded = decode_pcb(encode_pcb(copy.deepcopy(pcb)))
+
+    assert decoded == plain
+    # Same key order and same int / float types as json payload
+    assert json.dumps(decoded) == json.dumps(plain)
+
+
+def test_decoded_entries_do_not_share_lists(small_pcb):
+    # Entries are edited in place by updaters, so equal vectors must not be the same list
+    decoded = decode_pcb(encode_pcb(small_pcb))
+    first, second = decoded["footprints"][0]["3d_models"][0], decoded["footprints"][1]["3d_models"][0]
+    first["offset"][0] = 1.0
+    assert second["offset"] == [0.0, 0.0, 0.0]
+
+
+def test_decode_from_memoryview(small_pcb):
+    assert decode_pcb(memoryview(encode_pcb(small_pcb))) == small_pcb
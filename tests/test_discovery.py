@@ -0,0 +1,71 @@
+"""
+    Port search finds server which replies to handshake, on any address of host. Frames which server sends right after
+    its handshake reply are left in socket for connection.
+"""
+import json
+import socket
+import threading
+import types
+
+import pytest
+
+from Socket.discovery import discover_server
+from Socket.framing import MAX_HELLO_LENGTH, FrameReader, client_hello, encode_frame
+
+CONFIG = types.SimpleNamespace(format="utf-8", compression=["none"], columnar_payload=False, pcb_chunk_size=0,
+                               bulk_threshold=0, fragment_size=0)
+
+
+@pytest.fixture
+def server():
+    """ Server on 127.0.0.1 which sends handshake reply and PING frame in one write, yields its port. """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    # Test fails instead of hanging if client never connects
+    listener.settimeout(5)
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection:
+            msg_type, _, _ = FrameReader(connection, encoding="utf-8", max_length=MAX_HELLO_LENGTH).read_frame()
+            assert msg_type == "HELO"
+            reply = b"".join(encode_frame("HELO", json.dumps({"codec": "none"}).encode()))
+            connection.sendall(reply + b"".join(encode_frame("PING", b"12345")))
+            # Keep connection open until client closes it (reset if PING wasn't read)
+            try:
+                connection.recv(1)
+            except ConnectionResetError:
+                pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield listener.getsockname()[1]
+    thread.join(timeout=5)
+    listener.close()
+
+
+def _discover(port: int, host: str = "127.0.0.1"):
+    return discover_server(host=host, ports=range(port, port + 1), hello=client_hello(CONFIG), timeout=5)
+
+
+def test_frames_after_handshake_reply_stay_in_socket(server):
+    connection_socket, params, port = _discover(server)
+    with connection_socket:
+        assert (params["codec"], port) == ("none", server)
+        connection_socket.settimeout(5)
+        assert FrameReader(connection_socket, encoding="utf-8").read_frame() == ("PING", 0, "12345")
+
+
+def test_every_address_of_host_is_probed(server, monkeypatch):
+    # Host resolves to an address where nothing listens first (same as "localhost" resolving to ::1 first)
+    resolve = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 0, "", ("127.0.0.2", port))] + resolve("127.0.0.1", port, *args,
+                                                                                           **kwargs)
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    connection_socket, _, port = _discover(server, host="board-host")
+    with connection_socket:
+        assert connection_socket.getpeername() == ("127.0.0.1", server)
@@ -0,0 +1,108 @@
+"""
+    Maintained fingerprint equals fingerprint built from scratch after diffs are applied to data model, and resync
+    exchange (BoardSync.on_resync_reply / apply_resync) transfers only divergent entries.
+"""
+import copy
+import json
+import random
+
+from Socket.fingerprint import ModelFingerprint
+
+# Property changed in entries of every section
+CHANGED_PROPERTY = {"footprints": "pos", "drawings": "start"}
+
+
+def _apply(pcb: dict, diff: dict):
+    """ Apply diff to data model the way scanners and updaters do (entries are changed in place). """
+    for key, section_diff in diff.items():
+        entries = pcb[key]
+        for change in section_diff.get("changed", []):
+            for kiid, properties in change.items():
+                next(entry for entry in entries if entry["kiid"] == kiid).update(properties)
+        removed = set(section_diff.get("removed", []))
+        entries[:] = [entry for entry in entries if entry["kiid"] not in removed]
+        entries.extend(section_diff.get("added", []))
+
+
+def _random_diff(rng: random.Random, pcb: dict, removed: dict) -> dict:
+    """ Change, remove and add (also re-add previously removed) entries of every section. """
+    diff = {}
+    for key, name in CHANGED_PROPERTY.items():
+        entries = rng.sample(pcb[key], 5)
+        added = [removed[key].pop(rng.randrange(len(removed[key])))] if removed[key] and rng.random() < 0.5 else []
+        added.append(dict(copy.deepcopy(entries[0]), kiid=f"{key}-{rng.getrandbits(64):x}"))
+        removed[key].extend(entries[3:4])
+        diff[key] = {"changed": [{entry["kiid"]: {name: [rng.randint(0, 10 ** 8), rng.randint(0, 10 ** 8)]}}
+                                 for entry in entries[:3]],
+                     "removed": [entry["kiid"] for entry in entries[3:4]],
+                     "added": added}
+    return diff
+
+
+def test_maintained_root_equals_rebuilt_root(small_pcb):
+    rng = random.Random(1)
+    fingerprint = ModelFingerprint()
+    fingerprint.root(small_pcb)
+    removed = {key: [] for key in CHANGED_PROPERTY}
+
+    for round_number in range(40):
+        # Several diffs can be applied between two checks
+        for _ in range(rng.randint(1, 3)):
+            diff = _random_diff(rng, small_pcb, removed)
+            _apply(small_pcb, diff)
+            fingerprint.touch(diff)
+        if round_number % 10 == 0:
+            small_pcb["general"]["thickness"] += 1
+
+        assert fingerprint.root(small_pcb) == ModelFingerprint().root(small_pcb), f"round {round_number}"
+
+
+def test_root_does_not_depend_on_entry_order(small_pcb):
+    reordered = copy.deepcopy(small_pcb)
+    reordered["footprints"].reverse()
+    assert ModelFingerprint().root(reordered) == ModelFingerprint().root(small_pcb)
+
+
+def _resync(fc_pcb: dict, fc_fingerprint: ModelFingerprint, kc_pcb: dict, kc_fingerprint: ModelFingerprint) -> list:
+    """
+    Drive resync exchange as BoardSync.on_resync_reply / apply_resync do (messages pass through json), return
+    replies of KiCAD side.
+    """
+    replies = []
+    request = {"level": "sections"}
+    while request:
+        reply = json.loads(json.dumps(kc_fingerprint.resync_reply(kc_pcb, json.loads(json.dumps(request)))))
+        replies.append(reply)
+        request = fc_fingerprint.resync_request(fc_pcb, reply)
+
+    diff = fc_fingerprint.resync_diff(replies[-1])
+    _apply(fc_pcb, diff)
+    fc_fingerprint.copy_entries(replies[-1])
+    fc_fingerprint.touch(diff)
+    return replies
+
+
+def test_resync_transfers_only_divergent_entries(small_pcb):
+    fc_pcb = copy.deepcopy(small_pcb)
+    kc_pcb = small_pcb
+    rotated, removed = kc_pcb["footprints"][5], kc_pcb["footprints"].pop(7)
+    rotated["rot"] += 90.0
+    added = dict(copy.deepcopy(rotated), kiid="added-footprint", ref="R999")
+    kc_pcb["footprints"].append(added)
+    kc_fingerprint, fc_fingerprint = ModelFingerprint(), ModelFingerprint()
+    assert fc_fingerprint.root(fc_pcb) != kc_fingerprint.root(kc_pcb)
+
+    replies = _resync(fc_pcb, fc_fingerprint, kc_pcb, kc_fingerprint)
+
+    assert [reply["level"] for reply in replies] == ["sections", "buckets", "leaves", "entries"]
+    # Only divergent section, buckets and entries were requested
+    assert list(replies[1]["buckets"]) == ["footprints"]
+    assert len(replies[2]["buckets"]["footprints"]) <= 3
+    entries = replies[-1]["entries"]
+    assert sorted(entry["kiid"] for entry in entries["footprints"]) == sorted([rotated["kiid"], added["kiid"]])
+    assert replies[-1]["removed"] == {"footprints": [removed["kiid"]]}
+
+    assert fc_fingerprint.root(fc_pcb) == replies[-1]["hash"] == kc_fingerprint.root(kc_pcb)
+    assert ModelFingerprint().root(fc_pcb) == replies[-1]["hash"]
+    assert sorted(fc_pcb["footprints"], key=lambda entry: entry["kiid"]) == sorted(
+        kc_pcb["footprints"], key=lambda entry: entry["kiid"])
@@ -0,0 +1,116 @@
+"""
+    Frames sent over socket pair are received by FrameReader intact, also when socket returns them in small pieces.
+    Frames longer than parser accepts are rejected from header, before receive buffer is grown.
+"""
+import itertools
+import json
+import socket
+import threading
+import types
+
+import pytest
+
+from Socket.columnar import encode_pcb
+from Socket.framing import (HEADER, MAX_HELLO_LENGTH, FrameParser, FrameReader, FrameTooLargeError, encode_frame,
+                            fragment_frame, server_handshake)
+
+
+class _ShortReads:
+    """ Socket which returns at most given number of bytes per recv_into call (sizes are repeated). """
+
+    def __init__(self, connection_socket, sizes):
+        self._socket = connection_socket
+        self._sizes = itertools.cycle(sizes)
+
+    def recv_into(self, buffer):
+        return self._socket.recv_into(memoryview(buffer)[:next(self._sizes)])
+
+
+def _send(connection_socket, frames: list):
+    for header, body in frames:
+        connection_socket.sendall(header + bytes(body))
+
+
+def _transfer(frames: list, read_sizes=None) -> list:
+    """ Send frames from a thread, return frames read by FrameReader. """
+    sender, receiver = socket.socketpair()
+    thread = threading.Thread(target=_send, args=(sender, frames))
+    thread.start()
+    try:
+        connection = _ShortReads(receiver, read_sizes) if read_sizes else receiver
+        reader = FrameReader(connection, encoding="utf-8", buffer_size=1024)
+        return [reader.read_frame() for _ in frames]
+    finally:
+        thread.join()
+        sender.close()
+        receiver.close()
+
+
+def _decoded(data):
+    """ Large json bodies are decoded by reader already, small ones are strings. """
+    return data if isinstance(data, dict) else json.loads(data)
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+@pytest.mark.parametrize("read_sizes", [None, (7, 5, 4, 100003, 13, 65536)], ids=["whole", "split"])
+def test_large_frames_arrive_intact(pcb, codec, read_sizes):
+    pcb_json = json.dumps(pcb).encode("utf-8")
+    assert len(pcb_json) > 4 * 1024 * 1024
+    frames = [encode_frame("PCB", pcb_json, codec=codec, request_id=1),
+              encode_frame("PCBEND", b"", request_id=1),
+              encode_frame("PCB", encode_pcb(pcb), codec=codec, payload_format="columnar", request_id=2),
+              encode_frame("DIF", b'{"footprints": {}}', codec=codec, request_id=3)]
+
+    received = _transfer(frames, read_sizes)
+
+    assert [frame[:2] for frame in received] == [("PCB", 1), ("PCBEND", 1), ("PCB", 2), ("DIF", 3)]
+    assert _decoded(received[0][2]) == pcb
+    assert received[1][2] == ""
+    assert received[2][2] == pcb
+    assert _decoded(received[3][2]) == {"footprints": {}}
+
+
+def _feed(parser: FrameParser, data: bytes):
+    """ Feed bytes to parser in pieces it asks for, return frames. """
+    frames = []
+    while data:
+        buffer = parser.get_buffer()
+        received = min(len(buffer), len(data))
+        buffer[:received] = data[:received]
+        data = data[received:]
+        frame = parser.buffer_updated(received)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+def test_garbage_before_handshake_is_rejected():
+    # Header of "GET / HTTP/1.1" announces about 775 MB body
+    sender, receiver = socket.socketpair()
+    try:
+        sender.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        with pytest.raises(FrameTooLargeError):
+            server_handshake(receiver, types.SimpleNamespace(format="utf-8"))
+    finally:
+        sender.close()
+        receiver.close()
+
+
+def test_too_long_frame_is_rejected_from_header():
+    parser = FrameParser("utf-8", buffer_size=1024, max_length=MAX_HELLO_LENGTH)
+    header, _ = encode_frame("HELO", b"x" * (MAX_HELLO_LENGTH + 1))
+
+    with pytest.raises(FrameTooLargeError):
+        _feed(parser, header)
+    # Body was not reserved, parser waits for next header
+    assert len(parser.get_buffer()) == HEADER.size
+
+    assert _feed(parser, b"".join(encode_frame("HELO", b'{"codecs": []}'))) == [("HELO", 0, '{"codecs": []}')]
+
+
+def test_too_long_fragmented_message_is_rejected():
+    parser = FrameParser("utf-8", max_length=1000)
+    header, body = encode_frame("PCB", b"[" + b"0," * 1000 + b"0]")
+
+    with pytest.raises(FrameTooLargeError):
+        _feed(parser, b"".join(bytes(header) + bytes(body) for header, body in fragment_frame(header, body, 300)))
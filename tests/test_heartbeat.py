@@ -0,0 +1,61 @@
+"""
+    Peer is considered dead only after liveness timeout passes without receiving anything, every received chunk
+    restarts the timeout. Round trip time is measured from timestamp echoed in PONG body.
+"""
+import time
+
+from Socket.heartbeat import RTT_WINDOW, Liveness, RttStats, ping_body, rtt_from_pong
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_liveness_expires_after_timeout_without_received_bytes():
+    clock = _Clock()
+    liveness = Liveness(timeout=10.0, clock=clock)
+    clock.now += 10.0
+    assert not liveness.expired
+    clock.now += 0.5
+    assert liveness.expired
+    assert liveness.silent == 10.5
+
+
+def test_received_bytes_restart_liveness_timeout():
+    clock = _Clock()
+    liveness = Liveness(timeout=10.0, clock=clock)
+    for _ in range(5):
+        clock.now += 8.0
+        liveness.received()
+    clock.now += 8.0
+    assert not liveness.expired
+    assert liveness.silent == 8.0
+
+
+def test_zero_timeout_never_expires():
+    clock = _Clock()
+    liveness = Liveness(timeout=0, clock=clock)
+    clock.now += 1e6
+    assert not liveness.expired
+
+
+def test_round_trip_time_from_echoed_ping():
+    body = ping_body()
+    time.sleep(0.01)
+    # Peer echoes PING body in PONG
+    rtt = rtt_from_pong(body.decode("ascii"))
+    assert 0.01 <= rtt < 1.0
+
+
+def test_rtt_statistics_keep_last_window():
+    stats = RttStats()
+    assert stats.summary() == "RTT: no samples"
+    for i in range(RTT_WINDOW + 10):
+        stats.add(i / 1000)
+    assert len(stats.samples) == RTT_WINDOW
+    assert stats.last == (RTT_WINDOW + 9) / 1000
+    assert min(stats.samples) == 10 / 1000
@@ -0,0 +1,42 @@
+"""
+    Document fed to JsonStreamDecoder in pieces is decoded same as with json.loads, wherever the pieces are split.
+"""
+import json
+
+import pytest
+
+from Socket.jsonstream import JsonStreamDecoder
+
+
+def _document(footprints: int) -> str:
+    """ Numbers of every form (sign, fraction, exponent) directly in streamed containers and inside entries. """
+    return json.dumps({
+        "general": {"thickness": 1.6, "origin": -0.5, "scale": 1e-06, "count": 12, "big": -2.5e+20, "flag": True},
+        "values": [1.5, -2, 3e10, 0.125, 7, -1.25e-3, None, False],
+        "footprints": [{"kiid": f"kiid-{i}", "pos": [12.5 + i, -3.25e2], "rot": 90.0, "nr": i}
+                       for i in range(footprints)],
+        "last": 6.0221e23,
+    })
+
+
+def _decode(pieces: list):
+    entries = []
+    decoder = JsonStreamDecoder(on_entry=lambda path, entry: entries.append(path))
+    for piece in pieces:
+        decoder.feed(piece)
+    return decoder.close(), entries
+
+
+@pytest.mark.parametrize("footprints", [2, 100], ids=["entries", "batches"])
+def test_document_split_at_every_offset(footprints):
+    text = _document(footprints)
+    expected, expected_entries = _decode([text])
+    assert expected == json.loads(text)
+
+    for offset in range(len(text) + 1):
+        assert _decode([text[:offset], text[offset:]]) == (expected, expected_entries), f"split at {offset}"
+
+
+def test_document_in_single_characters():
+    text = _document(2)
+    assert _decode(list(text))[0] == json.loads(text)
@@ -0,0 +1,157 @@
+"""
+    KiidIndex stays consistent with data model lists when entries are appended, removed and appended again: every
+    lookup returns the same entry as searching the list would.
+    BoardIndex walks board once per section, drawings added and deleted by updater are registered in it.
+"""
+import collections
+
+from API_scripts.kiid_index import BoardIndex, KiidIndex
+
+
+class _Uuid:
+
+    def __init__(self, kiid: str):
+        self._kiid = kiid
+
+    def AsString(self) -> str:
+        return self._kiid
+
+
+class _Item:
+
+    def __init__(self, kiid: str):
+        self.m_Uuid = _Uuid(kiid)
+
+
+class _Board:
+    """ Stand-in for pcbnew.BOARD which counts board walks. """
+
+    def __init__(self, footprints: int, drawings: int):
+        self.footprints = [_Item(f"fp-{i}") for i in range(footprints)]
+        self.drawings = [_Item(f"drw-{i}") for i in range(drawings)]
+        self.walks = collections.Counter()
+
+    def GetFootprints(self):
+        self.walks["footprints"] += 1
+        return self.footprints
+
+    def GetDrawings(self):
+        self.walks["drawings"] += 1
+        return self.drawings
+
+
+def _assert_consistent(index: KiidIndex, pcb: dict):
+    for key in ("footprints", "drawings"):
+        for entry in pcb[key]:
+            assert index.get(key, entry["kiid"]) is next(item for item in pcb[key] if item["kiid"] == entry["kiid"])
+
+
+def test_lookup_returns_entries_of_data_model(small_pcb):
+    index = KiidIndex(small_pcb)
+    _assert_consistent(index, small_pcb)
+    assert index.get("footprints", "missing") is None
+    assert index.get("vias", small_pcb["footprints"][0]["kiid"]) is None
+    assert index.pcb is small_pcb
+
+
+def test_add_remove_and_re_add(small_pcb):
+    index = KiidIndex(small_pcb)
+    footprint = small_pcb["footprints"][10]
+    kiid = footprint["kiid"]
+
+    index.remove("footprints", footprint)
+    assert footprint not in small_pcb["footprints"]
+    assert index.get("footprints", kiid) is None and not index.contains("footprints", kiid)
+
+    # Re-added entry (e.g. undo in KiCAD) is a new dictionary with same KIID
+    re_added = dict(footprint, ID=len(small_pcb["footprints"]) + 1)
+    index.append("footprints", re_added)
+    assert small_pcb["footprints"][-1] is re_added
+    assert index.get("footprints", kiid) is re_added
+    _assert_consistent(index, small_pcb)
+
+
+def test_append_to_new_section():
+    pcb = {"general": {}, "vias": []}
+    index = KiidIndex(pcb)
+    via = {"kiid": "via-1", "hash": ""}
+    index.append("vias", via)
+    assert index.get("vias", "via-1") is via
+    assert pcb["vias"] == [via]
+
+
+def test_first_of_duplicate_entries_wins(small_pcb):
+    first = small_pcb["drawings"][0]
+    duplicate = dict(first, ID=99)
+    small_pcb["drawings"].append(duplicate)
+    index = KiidIndex(small_pcb)
+    assert index.get("drawings", first["kiid"]) is first
+
+    # Removing the duplicate keeps the first entry indexed
+    index.remove("drawings", duplicate)
+    assert index.get("drawings", first["kiid"]) is first
+    index.remove("drawings", first)
+    assert index.get("drawings", first["kiid"]) is None
+
+
+def test_index_is_reused_only_for_its_data_model(small_pcb):
+    index = KiidIndex(small_pcb)
+    assert KiidIndex.of(small_pcb, index) is index
+    # Data model was replaced (e.g. board scanned again): index is built for new one
+    other = KiidIndex.of(dict(small_pcb), index)
+    assert other is not index
+    assert KiidIndex.of(small_pcb) is not index
+
+
+def test_board_is_walked_once_per_section():
+    brd = _Board(footprints=100, drawings=20)
+    board_index = BoardIndex(brd)
+    for i in range(100):
+        assert board_index.footprint(f"fp-{i}") is brd.footprints[i]
+    for i in range(20):
+        assert board_index.drawing(f"drw-{i}") is brd.drawings[i]
+    assert board_index.footprint("drw-0") is None
+    assert brd.walks == {"footprints": 1, "drawings": 1}
+
+
+def test_added_and_deleted_drawings_are_registered():
+    brd = _Board(footprints=0, drawings=5)
+    board_index = BoardIndex(brd)
+    assert board_index.drawing("drw-1") is brd.drawings[1]
+
+    # Updater deletes drawing from board and adds new one, KiCAD assigns its UUID
+    deleted = brd.drawings.pop(1)
+    board_index.remove_drawing("drw-1")
+    added = _Item("drw-new")
+    brd.drawings.append(added)
+    board_index.add_drawing(added)
+    assert board_index.drawing("drw-1") is None
+    assert board_index.drawing("drw-new") is added
+
+    # Deleted drawing restored with same UUID
+    brd.drawings.append(deleted)
+    board_index.add_drawing(deleted)
+    assert board_index.drawing("drw-1") is deleted
+    assert brd.walks == {"drawings": 1}
+
+
+def test_drawings_registered_before_first_lookup_are_found_by_walk():
+    brd = _Board(footprints=0, drawings=2)
+    board_index = BoardIndex(brd)
+    added = _Item("drw-new")
+    brd.drawings.append(added)
+    deleted = brd.drawings.pop(0)
+    # Section isn't built yet, it is built from board (which is already edited) on first lookup
+    board_index.add_drawing(added)
+    board_index.remove_drawing(deleted.m_Uuid.AsString())
+    assert board_index.drawing("drw-new") is added
+    assert board_index.drawing("drw-0") is None
+    assert board_index.drawing("drw-1") is brd.drawings[0]
+
+
+def test_board_index_is_reused_only_for_its_board():
+    brd = _Board(footprints=1, drawings=1)
+    board_index = BoardIndex(brd)
+    assert BoardIndex.of(brd, board_index) is board_index
+    assert BoardIndex.of(_Board(footprints=1, drawings=1), board_index) is not board_index
+    assert BoardIndex.of(brd).brd is brd
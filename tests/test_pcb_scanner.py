@@ -0,0 +1,68 @@
+"""
+    PcbScanner finds items deleted on board with a KIID set (also consecutive ones, which were skipped when entries
+    were removed from the list being iterated) and finds them again as added when they are restored. Data model and
+    its KiidIndex stay consistent. Board is the stand-in of Benchmarks/scan_calls.py.
+"""
+# Registers pcbnew stand-in (if pcbnew can't be imported), so it is imported before scanner
+from Benchmarks.scan_calls import CALLS, _Board
+
+from API_scripts.kiid_index import KiidIndex
+from API_scripts.pcb_scanner import PcbScanner, ScanContext
+
+
+def _kiids(entries: list) -> list:
+    return [entry["kiid"] for entry in entries]
+
+
+def test_remove_missing_keeps_order_and_list(small_pcb):
+    index = KiidIndex(small_pcb)
+    footprints = small_pcb["footprints"]
+    kept = set(_kiids(footprints[::2]))
+    missing = _kiids(footprints[1::2])
+
+    assert index.remove_missing("footprints", kept) == missing
+    # Same list object, data model dictionary keeps referencing it
+    assert footprints is small_pcb["footprints"]
+    assert set(_kiids(footprints)) == kept
+    assert all(index.get("footprints", kiid) is None for kiid in missing)
+    assert index.remove_missing("footprints", kept) == []
+
+
+def test_deleted_and_restored_items_are_detected(small_pcb):
+    brd = _Board(small_pcb)
+    pcb = PcbScanner.get_pcb(brd)
+    index = KiidIndex(pcb)
+    # Consecutive footprints and an Edge.Cuts drawing are deleted on board
+    deleted_footprints = brd._footprints[3:6]
+    del brd._footprints[3:6]
+    deleted_drawing = brd._drawings.pop(0)
+    deleted = [footprint.m_Uuid.AsString() for footprint in deleted_footprints]
+
+    diff = PcbScanner.get_diff(brd, pcb, {}, index)
+    assert diff == {"footprints": {"removed": deleted},
+                    "drawings": {"removed": [deleted_drawing.m_Uuid.AsString()]}}
+    assert not set(deleted) & set(_kiids(pcb["footprints"]))
+    assert all(index.get("footprints", kiid) is None for kiid in deleted)
+
+    # Undo in KiCAD: same KIIDs are back on board
+    brd._footprints.extend(deleted_footprints)
+    brd._drawings.append(deleted_drawing)
+    diff = PcbScanner.get_diff(brd, pcb, {}, index)
+    assert _kiids(diff["footprints"]["added"]) == deleted
+    assert _kiids(diff["drawings"]["added"]) == [deleted_drawing.m_Uuid.AsString()]
+    for kiid in deleted:
+        assert index.get("footprints", kiid) is next(entry for entry in pcb["footprints"] if entry["kiid"] == kiid)
+
+    assert PcbScanner.get_diff(brd, pcb, {}, index) == {}
+
+
+def test_board_settings_are_read_once_per_scan(small_pcb):
+    brd = _Board(small_pcb)
+    pcb = PcbScanner.get_pcb(brd)
+    CALLS.clear()
+    PcbScanner.get_diff(brd, pcb, {})
+    assert CALLS["GetDesignSettings"] == 1
+
+    context = ScanContext(brd)
+    assert ScanContext.of(brd, context) is context
+    assert ScanContext.of(_Board(small_pcb), context) is not context
@@ -0,0 +1,60 @@
+"""
+    Sessions are recorded with both sides connected in one process (stand-in board and document), then each capture is
+    replayed through sync logic of its side: every message sent during replay is same as in capture.
+"""
+import pytest
+
+from Benchmarks import replay
+from Benchmarks.replay import FREECAD, KICAD, LoopbackSession, capture_side, replay_freecad, replay_kicad
+from Socket.capture import CaptureWriter
+
+
+def _record(tmp_path, pcb: dict, pcb_chunk_size: int) -> LoopbackSession:
+    session = LoopbackSession(pcb,
+                              kc_capture=CaptureWriter(str(tmp_path / "kicad.fscap")),
+                              fc_capture=CaptureWriter(str(tmp_path / "freecad.fscap")),
+                              pcb_chunk_size=pcb_chunk_size)
+    footprints = [footprint.get("kiid") for footprint in pcb.get("footprints")]
+    drawing = dict(pcb.get("drawings")[0], start=[0, 0], kiid="added-in-fc_0", ID=len(pcb.get("drawings")) + 1)
+    # Board is drawn
+    session.sync()
+    # Footprint moved on both sides (KiCAD wins), drawing added in FreeCAD gets KIID from KiCAD
+    session.board.edit({"footprints": {"changed": [{footprints[0]: {"pos": [100, 200]}}]}})
+    session.document.edit({"footprints": {"changed": [{footprints[0]: {"pos": [300, 400]}},
+                                                      {footprints[1]: {"rot": 45.0}}]},
+                           "drawings": {"added": [drawing]}})
+    session.sync()
+    # Drawing removed in KiCAD
+    session.board.edit({"drawings": {"removed": [pcb.get("drawings")[1].get("kiid")]}})
+    session.sync()
+    # Nothing changed: KiCAD replies with hash only
+    session.sync()
+    return session
+
+
+@pytest.mark.parametrize("pcb_chunk_size", [0, 64])
+def test_replayed_captures_send_recorded_messages(tmp_path, small_pcb, pcb_chunk_size):
+    session = _record(tmp_path, small_pcb, pcb_chunk_size)
+    assert not session.fc_sync.busy
+    assert session.fc_sync.version == session.kc_sync.version == 2
+    fc_sync, kc_sync = session.fc_sync, session.kc_sync
+    assert fc_sync.fingerprint.root(fc_sync.pcb) == kc_sync.fingerprint.root(kc_sync.pcb)
+    session.close()
+
+    board = ["PCB"] if not pcb_chunk_size else ["PCBGEN"] + ["PCBFPS"] * 4 + ["PCBEND"]
+    sent = {KICAD: board + ["SES", "DIF", "REP", "DIF", "REP", "REP"],
+            FREECAD: ["REQPCB", "REQSES", "REQDIF", "DIF", "REQDIF", "DIF", "REQDIF"]}
+    for side, replay_side in ((KICAD, replay_kicad), (FREECAD, replay_freecad)):
+        path = str(tmp_path / f"{side}.fscap")
+        assert capture_side(path) == side
+        result = replay_side(path)
+        assert result.mismatches == []
+        assert [message[0] for message in result.sent] == sent[side]
+
+
+def test_replay_reports_diverging_messages(tmp_path, small_pcb, monkeypatch):
+    _record(tmp_path, small_pcb, 0).close()
+    # Document changes of capture are not made on replay: merged diff differs from recorded one
+    monkeypatch.setattr(replay, "local_changes", lambda merged, kc_diff: {})
+    result = replay.replay_freecad(str(tmp_path / "freecad.fscap"))
+    assert [expected[:2] for _, expected, _ in result.mismatches][:1] == [("DIF", 4)]
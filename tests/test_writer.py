@@ -0,0 +1,123 @@
+"""
+    FrameWriter sends every byte of queued frames also when socket accepts only part of the buffers per call. Control
+    frames overtake queued data messages, also between batches of fragments of a large message. Enqueue never blocks:
+    it fails when queue is full or sending has failed.
+"""
+import socket
+import time
+
+from Socket.framing import FRAGMENT_FLAG, HEADER, encode_frame, fragment_frame, frame_type
+from Socket.writer import MAX_BATCH_BYTES, FrameWriter
+
+
+class _ShortWrites:
+    """ Socket which accepts at most limit bytes per sendmsg call, on_send is called before every call. """
+    family = socket.AF_UNIX
+
+    def __init__(self, limit: int, on_send=None):
+        self.limit = limit
+        self.on_send = on_send
+        self.data = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        if self.on_send:
+            self.on_send(self.calls)
+        self.calls += 1
+        accepted = b"".join(bytes(buffer) for buffer in buffers)[:self.limit]
+        self.data += accepted
+        return len(accepted)
+
+
+def _frame_types(data: bytes) -> list:
+    """ Types of frames in sent bytes, fragments are marked with +. """
+    types, offset = [], 0
+    while offset < len(data):
+        header = HEADER.unpack_from(data, offset)
+        types.append(frame_type(data[offset:offset + HEADER.size]) + ("+" if header[2] & FRAGMENT_FLAG else ""))
+        offset += HEADER.size + header[4]
+    return types
+
+
+def _send_all(writer: FrameWriter):
+    """ Start writer, wait until queued frames are sent, stop it (stop drops queued data messages). """
+    writer.start()
+    deadline = time.monotonic() + 5
+    while writer.bytes_pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+    writer.stop(timeout=5)
+
+
+def test_short_writes_send_every_byte():
+    fake_socket = _ShortWrites(limit=7)
+    writer = FrameWriter(fake_socket)
+    frames = [encode_frame("DIF", b'{"footprints": {}}', request_id=1),
+              encode_frame("PCB", b"[" + b"0," * 1000 + b"0]", request_id=2),
+              encode_frame("PCBEND", b"", request_id=2)]
+    for header, body in frames:
+        writer.enqueue(header, body)
+    _send_all(writer)
+
+    assert bytes(fake_socket.data) == b"".join(header + body for header, body in frames)
+    assert fake_socket.calls > len(fake_socket.data) // 7
+    assert writer.bytes_pending == 0 and writer.queue_depth == 0
+
+
+def test_control_frame_is_sent_before_queued_data():
+    fake_socket = _ShortWrites(limit=1 << 20)
+    writer = FrameWriter(fake_socket)
+    writer.enqueue(*encode_frame("DIF", b"{}", request_id=1))
+    writer.enqueue(*encode_frame("REP", b"{}", request_id=1))
+    writer.enqueue(*encode_frame("PING", b"1"), priority=True)
+    _send_all(writer)
+
+    assert _frame_types(fake_socket.data) == ["PING", "DIF", "REP"]
+
+
+def test_control_frame_waits_for_one_batch_of_fragments():
+    fragment_size = 64 * 1024
+    header, body = encode_frame("PCB", bytes(4 * MAX_BATCH_BYTES), request_id=1)
+    fragments = fragment_frame(header, body, fragment_size)
+    writer = None
+
+    def on_send(call: int):
+        # Heartbeat is queued while first batch is being sent
+        if call == 0:
+            writer.enqueue(*encode_frame("PING", b"1"), priority=True)
+
+    fake_socket = _ShortWrites(limit=1 << 30, on_send=on_send)
+    writer = FrameWriter(fake_socket)
+    writer.enqueue_frames(fragments)
+    _send_all(writer)
+
+    types = _frame_types(fake_socket.data)
+    assert len(types) == len(fragments) + 1
+    assert types.index("PING") == MAX_BATCH_BYTES // fragment_size
+
+
+def test_enqueue_fails_when_queue_is_full():
+    writer = FrameWriter(_ShortWrites(limit=1 << 20), max_queue=2)
+    frame = encode_frame("DIF", b"{}")
+    assert writer.enqueue(*frame)
+    assert writer.enqueue(*frame)
+    assert not writer.enqueue(*frame)
+    # Control frames have their own queue
+    assert writer.enqueue(*encode_frame("PING", b"1"), priority=True)
+    assert writer.queue_depth == 3
+    writer.stop()
+
+
+def test_send_error_is_reported_and_later_frames_are_dropped():
+    errors = []
+
+    class _Closed(_ShortWrites):
+        def sendmsg(self, buffers):
+            raise BrokenPipeError("peer closed connection")
+
+    writer = FrameWriter(_Closed(limit=0), on_error=errors.append)
+    writer.enqueue(*encode_frame("DIF", b"{}"))
+    _send_all(writer)
+
+    assert [type(error) for error in errors] == [BrokenPipeError]
+    assert not writer.enqueue(*encode_frame("PING", b"1"), priority=True)
+    assert writer.bytes_pending == 0